@@ -0,0 +1,31 @@
+import argparse  # Command line interface
+from beatdetector.library import analyzeLibrary, findTracks  # Process pool batch analysis with resumable progress
+
+
+# ===========================================================================
+# Function: Prints one finished track
+# Input:    Progress entry of the track
+# Return:   None
+def printEntry(entry):
+    if entry["status"] == "ok":
+        print(f"{entry['track']}: {entry['audio_seconds']:.0f} s of audio in {entry['elapsed']:.2f} s "
+              f"(bass {entry['bass']}, clap {entry['clap']}, hihat {entry['hihat']})")
+    else:
+        print(f"{entry['track']}: FAILED {entry['error']}")
+
+
+# ===========================================================================
+# Start program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute beat timelines for a whole music library")
+    parser.add_argument("source", help="Folder of .wav files (searched recursively) or a manifest with one path per line")
+    parser.add_argument("--out", default="Timelines", help="Folder for the .npz timelines and the progress log")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    tracks = findTracks(args.source)
+    summary = analyzeLibrary(tracks, args.out, args.workers, on_entry=printEntry)
+
+    print(f"{summary['ok']} analysed, {summary['failed']} failed, {summary['skipped']} already done of {summary['total']} tracks")
+    print(f"{summary['elapsed']:.1f} s total, {summary['tracks_per_minute']:.1f} tracks/min, "
+          f"{summary['audio_hours_per_minute']:.2f} audio hours/min")
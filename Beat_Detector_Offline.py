@@ -0,0 +1,27 @@
+import argparse  # Command line interface
+import time  # For measuring how much faster than real time the analysis is
+from beatdetector import analyzeWav, saveTimeline  # Offline (batched, memory mapped) detection into a beat timeline
+from beatdetector.timeline import BEAT_TYPES
+
+
+# ===========================================================================
+# Start program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect bass, claps and hihats in a 16 bit .wav file faster than real time")
+    parser.add_argument("wav", help="Path of the .wav file")
+    parser.add_argument("--out", help="Save the beat timeline to this .npz file")
+    parser.add_argument("--channel", type=int, default=0, help="Channel to analyse (0 = left, like the live loop)")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    timeline = analyzeWav(args.wav, args.channel)
+    elapsed = time.perf_counter() - start_time
+
+    audio_seconds = timeline.total_chunks * timeline.chunk_size / timeline.rate
+    print(f"Analysed {audio_seconds:.1f} s of audio in {elapsed:.3f} s ({audio_seconds / elapsed:.0f}x real time)")
+    for beat_type in BEAT_TYPES:
+        print(f"{beat_type}: {len(getattr(timeline, beat_type))}")
+
+    if args.out:
+        saveTimeline(args.out, timeline)
+        print(f"Saved timeline to {args.out}")
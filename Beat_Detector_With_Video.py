@@ -1,11 +1,14 @@
 import numpy as np  # Use numpy for as many calculations as possible bc FAST!
 import pyaudio  # To get audio data from mic
+from beatdetector import Detector  # Shared detection engine (FFT, sub band thresholds, bass/clap/hihat gating)
+from beatdetector import CaptureRing  # PyAudio callback capture into a preallocated ring buffer
+from beatdetector import makeLiveStats  # Opt-in stage timings, set BEATDETECTOR_STATS=<seconds> for a periodic summary
+from beatdetector import SpillArray  # Recorded chunks go to memory mapped files so RAM stays flat for long recordings
+from beatdetector.video import muxFftVideo  # Renders the FFT frames on every core and muxes them with the audio in one ffmpeg pass
+from beatdetector.video import writeFftVideo, writeWav  # Silent movie (matplotlib + OpenCV) and .wav when there is no ffmpeg
 import time  # For testing how long the processing takes
-import matplotlib.pyplot as plt  # For visualization of FFT
-import os  # Doing ffmpeg commands and making folders
-import cv2 as cv  # Making a movie out of a bunch of frames
-import shutil  # Deleting folders with stuff in them
-import wave  # Convert audio data to .wav format
+import os  # Making folders
+import shutil  # Deleting folders with stuff in them, finding ffmpeg
 
 
 # Set the parameters for the audio recording
@@ -21,48 +24,32 @@ HIHAT_RANGE_LOW     = 32
 
 TOTAL_SUB_BANDS     = 39  # Each sub band is a range of 5 * frequency resolution. it is ~230Hz wide and there are 39 of these
 
+RENDER_WORKERS      = None  # Processes rendering the video frames, None = one per core
 
-# ===========================================================================
-# Function: Gets both left and right channel audio but just returns left for now
-# Input:    Audio data from both channels
-# Return:   Left channel audio data
-def getSoundAmplitudeBuffer(stream):
-    data = stream.read(CHUNK_SIZE)
+SPILL_FOLDER        = "Recording"  # Memory mapped sound, amplitudes and thresholds of every chunk
 
-    # Convert data to numpy array (CHUNK_SIZE, CHANNELS)
-    audio_data = np.frombuffer(data, dtype=np.int16).reshape(-1, 2)
 
-    # Separate audio data for left and right channels
-    amplitudes_left = audio_data[:, 0]
+# ===========================================================================
+# Function: Waits for the next chunk from the capture ring and returns left channel data
+# Input:    Capture ring the PyAudio callback fills with both channels
+# Return:   Left channel audio data (a view into the ring, only valid until the next call)
+def getSoundAmplitudeBuffer(capture):
+    sound_amplitude_buffer = capture.readChunk(channel=0)
+    while sound_amplitude_buffer is None:
+        print("No audio from the mic, still waiting...")
+        sound_amplitude_buffer = capture.readChunk(channel=0)
 
-    # Combine
-    sound_amplitude_buffer = np.array(amplitudes_left)
     return sound_amplitude_buffer
 
 
 # ===========================================================================
-# Function: Takes the FFT of the audio data for 1 CHUNK_SIZE
-# Input:    Sound Amplitude Buffer from getSoundAmplitudeBuffer
-# Return:   Real amplitude values, associated frequency values
-def takeFFT(audio_data, sample_rate):
-    # Apply Hanning window to audio data
-    window = np.hanning(len(audio_data))
-    audio_data = audio_data * window
-    
-    # Calculate the FFT of the audio data
-    amplitudes = np.fft.rfft(audio_data)
-    
-    # Calculate the frequency values for each point in the FFT
-    freq_values = np.fft.rfftfreq(len(audio_data), d=1/sample_rate)
-
-    # Filter the frequency data and frequency values to only show frequencies between 20Hz and 5000Hz
-    mask = (freq_values >= 30) & (freq_values <= 9010)
-    freq_values = freq_values[mask]
-    amplitudes = amplitudes[mask]
-    
-    
-    # Return the real part of the FFT, the associated frequency values,
-    return np.real(freq_values), amplitudes
+# Function: Prints the capture ring counters (dropped audio shows up here)
+# Input:    Capture ring
+# Return:   None
+def printCaptureStats(capture):
+    stats = capture.getStats()
+    print(f"Capture: {stats['overruns']} overruns ({stats['frames_dropped']} frames dropped), "
+          f"{stats['input_overflows']} input overflows, {stats['underruns']} underruns")
 
 
 # ===========================================================================
@@ -80,30 +67,6 @@ def envelopeFollowFFT(audio_data_fft):
     return mag
 
 
-# ===========================================================================
-# Function: Calculates the energy of each sub band
-# Input:    FFT'd audio data
-# Return:   List of energy for each sub band
-def getSubBandInstantEnergyofChunk(audio_data_fft):
-    instant_energy = []
-    for i in range(TOTAL_SUB_BANDS):
-        instant_energy.append(np.mean(np.power(np.abs(audio_data_fft[int(len(audio_data_fft) / TOTAL_SUB_BANDS) * i : int(len(audio_data_fft) / TOTAL_SUB_BANDS) * (i + 1)]), 3)))
-
-    # Return the instant energy values
-    return instant_energy
-
-
-# ===========================================================================
-# Function: Shifts the energy history list right to slot in the new instant energy at the end
-# Input:    Energy history list and the instant energy
-# Return:   Updated energy history list
-def appendNewEnergy(energy_history, instant_energy):
-    energy_history.pop(0)
-    energy_history.append(instant_energy)
-
-    return energy_history
-
-
 # ===========================================================================
 # Function: Determine the time taken for a single chunk to be read and processed
 # Input:    Start time, end time, number of chunks processed
@@ -115,85 +78,6 @@ def getTimeTaken(start_time, end_time, chunks_processed):
     return time_taken
 
 
-# ===========================================================================
-# Function:  Checks if a beat has occurred and prints which sub band caused the beat
-# Algorithm: First normalize by dividing by max energy (from instant energy or energy history)
-#            Then check if the instant energy is greater than a certain threshold based on variance 
-# Input:     Instant energy and the energy history
-# Return:    True if a beat occurred, otherwise False
-def checkBeatInChunk(instant_energy_sub_bands, energy_history_sub_bands):
-    # Declare variables for function use
-    max_energy_sub_bands = []
-    sub_band_thresholds = []
-    avg_energies = []
-    norm_avg_energies = []
-    conditions_f = []
-    sub_band_beat = [False for i in range(TOTAL_SUB_BANDS)]
-    norm_instant_energy_sub_bands = [0 for i in range(len(instant_energy_sub_bands))]
-    norm_energy_history_sub_bands = [[0 for i in range(len(instant_energy_sub_bands))] for j in range(len(energy_history_sub_bands))]
-
-    for i in range(TOTAL_SUB_BANDS):
-        # Calculate the max energy for each sub band and normalize the history and Instant energy
-        max_energy_sub_bands.append(np.max([history[i] for history in energy_history_sub_bands]))
-        for j in range(len(energy_history_sub_bands)):
-            norm_energy_history_sub_bands[j][i] = energy_history_sub_bands[j][i] / max_energy_sub_bands[i]
-        norm_instant_energy_sub_bands[i] = instant_energy_sub_bands[i] / max_energy_sub_bands[i]
-
-        # Calculate the threshold for each sub band and the average energy for each sub band
-        sub_band_thresholds.append(-15 * np.var([history[i] for history in norm_energy_history_sub_bands]) + 1.40)
-        avg_energies.append(np.mean([history[i] for history in energy_history_sub_bands]))
-        norm_avg_energies.append(np.mean([history[i] for history in norm_energy_history_sub_bands]))
-        conditions_f.append(sub_band_thresholds[i] * avg_energies[i] / 1.15)
-
-        # Check if the instant energy is greater than the threshold
-        if norm_instant_energy_sub_bands[i] > sub_band_thresholds[i] * norm_avg_energies[i] / 1.15 or norm_instant_energy_sub_bands[i] > 0.15 * max_energy_sub_bands[i]:
-            sub_band_beat[i] = True
-
-    # Return the conditions and sub band beat
-    return conditions_f, sub_band_beat
-
-
-# ===========================================================================
-# Function:  Simply averages the energies from sub bands clap low to clap high which is the clap energy range 
-# Input:     Instant energy for all sub bands
-# Return:    Average energy in the clap low to clap high sub band region
-def getClapEnergy(instant_energy):
-    return (1.2 * instant_energy[CLAP_RANGE_LOW]
-            + 1.3 * instant_energy[CLAP_RANGE_LOW + 1]
-            + 1.5 * instant_energy[CLAP_RANGE_LOW + 2]
-            + 1.4 * instant_energy[CLAP_RANGE_LOW + 5] 
-            + 1.6 * instant_energy[CLAP_RANGE_LOW + 6] 
-            + 1.4 * instant_energy[CLAP_RANGE_LOW + 9] 
-            + 1.6 * instant_energy[CLAP_RANGE_LOW + 10]) / 10
-
-
-# ===========================================================================
-# Function:  Simply averages the energies from sub bands hihat low to hihat high which is the hihat energy range 
-# Input:     Instant energy for all sub bands
-# Return:    Average energy in the clap low to clap high sub band region
-def getHiHatEnergy(instant_energy):
-    return (1.3 * instant_energy[HIHAT_RANGE_LOW]
-            + 1.7 * instant_energy[HIHAT_RANGE_LOW + 1]
-            + 1.4 * instant_energy[HIHAT_RANGE_LOW + 2]
-            + 1.2 * instant_energy[HIHAT_RANGE_LOW + 3]
-            + 1.4 * instant_energy[HIHAT_RANGE_LOW + 4]) / 7
-
-
-# ===========================================================================
-# Function:  Confirms if the current detected beat is within an acceptable range of previous beats 
-# Input:     Energy of the current detected beat and the energy history of previusly detected beats
-# Return:    True if the history is less than 20 beats or the detected beat exceeds the threshold and False if not
-def compareBeat(current_detected_beat, detected_beat_history):
-    max_detected_beat = np.max(detected_beat_history)
-    norm_detected_beat_history = detected_beat_history / max_detected_beat
-    avg_detected_beat = np.mean(detected_beat_history) / max_detected_beat
-    if current_detected_beat / max_detected_beat > avg_detected_beat * np.var(norm_detected_beat_history) * 0.64:
-        detected_beat_history = appendNewEnergy(detected_beat_history, current_detected_beat)
-        return True
-    else:
-        return False
-    
-
 # ===========================================================================
 # Function: Simple function to make a folder with specified name
 # Input:    Name of folder to make
@@ -209,230 +93,102 @@ def makeFolder(folder_name):
 
 
 # ===========================================================================
-# Function: Make plots of fft data which serve as frames for the video. Saves to a folder called "Frames_FFT" and frames are ordered by number
-# Input:    Total chunks processed, all frequency values, all amplitude values, type of plot (FFT or raw audio data)
+# Function: Make a movie of the FFT (blue) and the thresholds (orange) of every chunk with the recorded audio
+#           Frames and audio are piped into one ffmpeg process that writes the final movie in a single pass
+#           Without ffmpeg the silent movie and a .wav of the audio are written instead
+# Input:    FPS of the movie, name of the output movie, frequency values, all amplitude values, all thresholds, audio data
 # Return:   None
-def makePlotsWithThreshold(chunks_processed, all_x_values, all_y_values, all_conditions, type):
-    if type == 'FFT':
-        makeFolder("Frames_FFT")
-
-        all_conditions_as_y = [[0 for i in range(int(len(all_x_values[0]) / TOTAL_SUB_BANDS) * len(all_conditions[0]))] for j in range(len(all_conditions))]
-        for i in range(len(all_conditions)):
-            for j in range(len(all_conditions[0])):
-                for k in range(int(len(all_x_values[0]) / TOTAL_SUB_BANDS)):
-                    all_conditions_as_y[i][int(len(all_x_values[0]) / TOTAL_SUB_BANDS) * j + k] = all_conditions[i][j]
-
-        for i in range(chunks_processed):
-            # Plot the frequency data
-            plt.plot(all_x_values[i], all_y_values[i])
-            plt.plot(all_x_values[i], all_conditions_as_y[i], color='orange')
-            plt.xlabel(f"Frequency (Hz) {i}")
-            plt.ylabel(f"Amplitude {i}")
-            plt.ylim([0, 1e13])
-            plt.xlim([4000, 9000])
-            plt.savefig(f"Frames_FFT/frame_{(i+1):04d}.png")
-            plt.close()
-    elif type == 'Audio':
-        makeFolder("Frames_Audio")
-
-        for i in range(chunks_processed):
-            # Plot the Raw Audio Data
-            plt.plot(all_x_values[i], all_y_values[i])
-            plt.xlabel(f"Time (s) {i}")
-            plt.ylabel(f"Amplitude {i}")
-            plt.ylim([-9000, 9000])
-            plt.savefig(f"Frames_Audio/frame_{(i+1):04d}.png")
-            plt.close()
-
-
-# ===========================================================================
-# Function: Make a movie out of the frames in the specified folder
-# Input:    FPS of the movie, path to the folder with the frames, name of the output movie, audio data
-# Return:   None
-def makeMovie(fps, path, output_name, audio_data):
-    frame_files = os.listdir(path)  # Get the list of frame files in the specified path
-    frame_path = os.path.join(path, frame_files[0])  # Get the path of the first frame
-
-    # Read the first frame to get its size and properties
-    frame = cv.imread(frame_path)
-    height, width, channels = frame.shape
-
-    # Define the video writer with the given output name, codec, FPS, and size
-    fourcc = cv.VideoWriter_fourcc(*'mp4v')
+def makeMovie(fps, output_name, freq_values, all_real_amp_data, all_conditions, audio_data):
     output_path = os.path.join("Videos", output_name)
-    video_writer = cv.VideoWriter(output_path, fourcc, fps, (width, height))
-
-    # Iterate through each frame file and add it to the video
-    for file_name in frame_files:
-        frame_path = os.path.join(path, file_name)
-        frame = cv.imread(frame_path)
-        video_writer.write(frame)
-
-    video_writer.release()  # Release the video writer
-
-    # Save the audio to a WAV file
-    p = pyaudio.PyAudio()
-    audio_file = "audio.wav"
-    audio_path = os.path.join("Videos", audio_file)
-
-    wf = wave.open(audio_path, "wb")
-    wf.setnchannels(1)
-    wf.setsampwidth(p.get_sample_size(FORMAT))
-    wf.setframerate(RATE)
-    wf.writeframes(b"".join(audio_data))
-    wf.close()
-    
-    os.system(f"ffmpeg -i Videos/{output_name} -i Videos/{audio_file} -c:v copy -c:a aac -map 0:v -map 1:a Videos/{output_name}_with_audio.mp4")
-
+    band_width = int(len(freq_values) / TOTAL_SUB_BANDS)
 
-# ===========================================================================
-# Function: Given an array of booleans return true if input num are true
-# Input:    The array of Booleans and the input num required
-# Return:   True if at least input num elements are true else false
-def checkTrueValues(arr, input_num):
-    true_count = 0
-
-    for value in arr:
-        if value:
-            true_count += 1
-            if true_count >= input_num:
-                return True
+    if shutil.which("ffmpeg") is None:
+        print("ffmpeg not found, writing the movie without audio and the audio to audio.wav")
+        writeFftVideo(output_path, fps, freq_values, all_real_amp_data, all_conditions, band_width, RENDER_WORKERS)
+        writeWav(os.path.join("Videos", "audio.wav"), audio_data, RATE)
+        return
 
-    return False
+    muxFftVideo(output_path, fps, freq_values, all_real_amp_data, all_conditions, band_width, audio_data, RATE, RENDER_WORKERS)
 
 
 # ===========================================================================
-# Start program
-
-# Create an instance of the PyAudio class and Open a stream to record audio from your microphone
-audio = pyaudio.PyAudio()
-stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE)
-print("Recording started...")
-
-# Initialize a counter for the number of chunks processed, list to store audio_data, instant energy values, and history of energies for ~ 1s of data
-chunks_processed = 0
-sound_amplitude_buffer = np.array([0 for samples in range(CHUNK_SIZE)], dtype=object)
-instant_energy_sub_bands = []
-energy_history_sub_bands = []
-sub_band_beat = []
-beat_history = []  # Currently only tracks bass and clap
-for i in range(3):
-    beat_history.append([])
-
-bass_chunk = 0
-clap_energy = 0
-clap_chunk = 0
-hihat_energy = 0
-hihat_chunk = 0
-
-final_detection = [False, False, False]
-
-# Initialize lists to store all the data for plotting purposes
-all_freq_values = []
-all_real_amp_data = []
-all_conditions = []
-all_sound = []
-conditions = []
-
-
-time_sum = 0
-
-# Record audio for HISTORY_SECONDS to fill energy history
-while chunks_processed < (HISTORY_SECONDS * int(RATE / CHUNK_SIZE)):
-    start_time = time.time() * 1000 # Record the start time in milliseconds
-
-    # Do processing
-    sound_amplitude_buffer = getSoundAmplitudeBuffer(stream)
-    freq_values, real_amp_data = takeFFT(sound_amplitude_buffer, RATE)
-    instant_energy_sub_bands = getSubBandInstantEnergyofChunk(real_amp_data)
-    energy_history_sub_bands.append(instant_energy_sub_bands)
-    chunks_processed += 1
-
-    end_time = time.time() * 1000 # Record the end time in milliseconds
-    time_sum += getTimeTaken(start_time, end_time, chunks_processed)
-
-# Continue recording audio until the RECORD_SECONDS is fulfilled
-while chunks_processed < ((RECORD_SECONDS)* int(RATE / CHUNK_SIZE)):
-    start_time = time.time() * 1000 # Record the start time in milliseconds
-    
-    # Do processing
-    sound_amplitude_buffer = getSoundAmplitudeBuffer(stream)
-    all_sound.append(sound_amplitude_buffer)
-    freq_values, real_amp_data = takeFFT(sound_amplitude_buffer, RATE)
-    instant_energy_sub_bands = getSubBandInstantEnergyofChunk(real_amp_data)
-    conditions, sub_band_beat = checkBeatInChunk(instant_energy_sub_bands, energy_history_sub_bands)
-    all_conditions.append(conditions)
-
-    
-    # Checks Bass
-    if (sub_band_beat[0]):
-        if chunks_processed - bass_chunk > 8:
-            if len(beat_history[0]) >= 4:
-                if (compareBeat(instant_energy_sub_bands[0], beat_history[0])):
-                    # print(f"Bass {chunks_processed} Energy {instant_energy_sub_bands[0]:.2e}")
-                    final_detection[0] = True
-                    bass_chunk = chunks_processed
-            else:
-                beat_history[0].append(instant_energy_sub_bands[0])
-
-
-    # Checks Clap
-    clap_energy = getClapEnergy(instant_energy_sub_bands)
-    if (sub_band_beat[CLAP_RANGE_LOW] and sub_band_beat[CLAP_RANGE_LOW + 1] and sub_band_beat[CLAP_RANGE_LOW + 2] and sub_band_beat[CLAP_RANGE_LOW + 5] and sub_band_beat[CLAP_RANGE_LOW + 6] and sub_band_beat[CLAP_RANGE_LOW + 9] and sub_band_beat[CLAP_RANGE_LOW + 10]):
-        if chunks_processed - clap_chunk >= 4:
-            if len(beat_history[1]) >= 3:
-                if (compareBeat(clap_energy * 1.6, beat_history[1])):
-                    # print(f"Gap: {chunks_processed - clap_chunk} Clap {chunks_processed} Energy {clap_energy:.2e}")
-                    final_detection[1] = True 
-                    clap_chunk = chunks_processed
-            else:
-                beat_history[1].append(clap_energy)
+# Start program (guarded, the render workers import this file on platforms that spawn processes)
+if __name__ == "__main__":
+    # Create an instance of the PyAudio class and Open a callback stream that records your microphone into the capture ring
+    # (the callback keeps capturing while this thread is busy, so slow chunks or GUI stalls do not drop audio)
+    capture = CaptureRing(CHUNK_SIZE, CHANNELS, RATE)
+    audio = pyaudio.PyAudio()
+    stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE,
+                        stream_callback=capture.callback)
+    stream.start_stream()
+    print("Recording started...")
+
+    # Create the detector, it keeps the energy history and beat histories for ~ 1s of data and the thresholds for plotting
+    stats = makeLiveStats(RATE, CHUNK_SIZE, capture)
+    detector = Detector(RATE, CHUNK_SIZE, HISTORY_SECONDS, CLAP_RANGE_LOW, HIHAT_RANGE_LOW, TOTAL_SUB_BANDS, track_conditions=True, stats=stats)
+    freq_values = detector.fft_front_end.freq_values
+
+    # Spill files for all the data for plotting purposes, one fixed size row per chunk
+    # The frequency axis is the same for every chunk so it is saved once
+    makeFolder(SPILL_FOLDER)
+    np.save(os.path.join(SPILL_FOLDER, "freq_values.npy"), freq_values)
+    all_real_amp_data = SpillArray(os.path.join(SPILL_FOLDER, "amplitudes.f64"), len(freq_values), np.float64)
+    all_conditions = SpillArray(os.path.join(SPILL_FOLDER, "conditions.f64"), TOTAL_SUB_BANDS, np.float64)
+    all_sound = SpillArray(os.path.join(SPILL_FOLDER, "sound.i16"), CHUNK_SIZE, np.int16)
+
+
+    time_sum = 0
+
+    # Record audio for HISTORY_SECONDS to fill energy history
+    while not detector.isWarmedUp():
+        start_time = time.time() * 1000 # Record the start time in milliseconds
+
+        # Do processing
+        detector.process(getSoundAmplitudeBuffer(capture))
+
+        end_time = time.time() * 1000 # Record the end time in milliseconds
+        time_sum += getTimeTaken(start_time, end_time, detector.chunks_processed)
+
+    # Continue recording audio until the RECORD_SECONDS is fulfilled
+    while detector.chunks_processed < ((RECORD_SECONDS)* int(RATE / CHUNK_SIZE)):
+        start_time = time.time() * 1000 # Record the start time in milliseconds
     
-
-    # Check HiHat
-    hihat_energy = getHiHatEnergy(instant_energy_sub_bands)
-    if (checkTrueValues([sub_band_beat[HIHAT_RANGE_LOW], sub_band_beat[HIHAT_RANGE_LOW + 1], sub_band_beat[HIHAT_RANGE_LOW + 2], sub_band_beat[HIHAT_RANGE_LOW + 3], sub_band_beat[HIHAT_RANGE_LOW + 4]], 1)):
-        if chunks_processed - hihat_chunk > 4:
-            if len(beat_history[2]) >= 5:
-                if (compareBeat(hihat_energy, beat_history[2])):
-                    print(f"Gap:{chunks_processed - hihat_chunk} HiHat {chunks_processed} Energy {hihat_energy:.2e}")
-                    final_detection[2] = True
-                    hihat_chunk = chunks_processed
-            else:
-                beat_history[2].append(hihat_energy)
-
-    
-    # Check HiHat
-    hihat_energy = getHiHatEnergy(instant_energy_sub_bands)
-    if (checkTrueValues([sub_band_beat[HIHAT_RANGE_LOW], sub_band_beat[HIHAT_RANGE_LOW + 1], sub_band_beat[HIHAT_RANGE_LOW + 2], sub_band_beat[HIHAT_RANGE_LOW + 3], sub_band_beat[HIHAT_RANGE_LOW + 4]], 1)):
-        if chunks_processed - hihat_chunk > 3:
-            if len(beat_history[2]) >= 5:
-                if (compareBeat(hihat_energy, beat_history[2])):
-                    print(f"Gap:{chunks_processed - hihat_chunk} HiHat {chunks_processed} Energy {hihat_energy:.2e}")
-                    hihat_chunk = chunks_processed
-            else:
-                beat_history[2].append(hihat_energy)
-
-
-    energy_history_sub_bands = appendNewEnergy(energy_history_sub_bands, instant_energy_sub_bands)
-    real_amp_data = envelopeFollowFFT(real_amp_data)
-    all_freq_values.append(freq_values)
-    all_real_amp_data.append(real_amp_data)
-
-    chunks_processed += 1
-
-    end_time = time.time() * 1000 # Record the end time in milliseconds
-    time_sum += getTimeTaken(start_time, end_time, chunks_processed)
-
-
-print(f"Averge time for {round(CHUNK_SIZE / RATE * 1000, 2)} ms process: {time_sum/(chunks_processed):.2f} ms")
-print("Recording stopped.")
-
-makePlotsWithThreshold(chunks_processed - (HISTORY_SECONDS * int(RATE / CHUNK_SIZE)), all_freq_values, all_real_amp_data, all_conditions, 'FFT')
-makeFolder("Videos")
-makeMovie(RATE / CHUNK_SIZE, 'Frames_FFT', 'FFT_video.mp4', all_sound)
-
-# Close the audio stream
-stream.stop_stream()
-stream.close()
-audio.terminate()
\ No newline at end of file
+        # Do processing
+        sound_amplitude_buffer = getSoundAmplitudeBuffer(capture)
+        if stats is not None:
+            stats.beginChunk()
+        all_sound.append(sound_amplitude_buffer)  # Copied into the spill file, the ring reuses the chunk
+        hihat_chunk = detector.hihat_chunk
+        final_detection = detector.process(sound_amplitude_buffer)
+        all_conditions.append(detector.conditions)
+
+        if final_detection.hihat:
+            print(f"Gap:{final_detection.chunk - hihat_chunk} HiHat {final_detection.chunk} Energy {detector.hihat_energy:.2e}")
+
+        real_amp_data = envelopeFollowFFT(detector.spectrum)
+        all_real_amp_data.append(real_amp_data)
+        if stats is not None:
+            stats.endChunk()
+
+        end_time = time.time() * 1000 # Record the end time in milliseconds
+        time_sum += getTimeTaken(start_time, end_time, detector.chunks_processed)
+
+
+    print(f"Averge time for {round(CHUNK_SIZE / RATE * 1000, 2)} ms process: {time_sum/(detector.chunks_processed):.2f} ms")
+    print("Recording stopped.")
+
+    # Close the audio stream before rendering, so the callback is not still filling the ring (and counting overruns)
+    # and no audio thread is running when the render workers start
+    stream.stop_stream()
+    printCaptureStats(capture)
+    if stats is not None:
+        stats.printTotals()
+    stream.close()
+    audio.terminate()
+
+    # Render straight from the spill files, nothing is read into RAM up front and the workers map the same files
+    makeFolder("Videos")
+    makeMovie(RATE / CHUNK_SIZE, 'FFT_video.mp4', freq_values, all_real_amp_data.array(), all_conditions.array(), all_sound.array())
+    all_real_amp_data.close()
+    all_conditions.close()
+    all_sound.close()
\ No newline at end of file
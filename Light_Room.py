@@ -1,6 +1,13 @@
 import numpy as np  # Use numpy for as many calculations as possible bc FAST!
 import pyaudio  # To get audio data from mic
+from beatdetector import StereoDetector, STEREO_MODES  # Shared detection engine, on the left channel or stereo (mono, mid/side, both channels)
+from beatdetector import CaptureRing  # PyAudio callback capture into a preallocated ring buffer
+from beatdetector import makeLiveStats  # Opt-in stage timings, set BEATDETECTOR_STATS=<seconds> for a periodic summary
+from beatdetector import getTimelineEvents, loadTimeline  # Precomputed beat timelines (Beat_Detector_Offline.py)
+from beatdetector import FlashEngine  # Non-blocking flash/fade scheduler on Tk's after() timer
 import tkinter as tk
+import threading
+import argparse
 import time
 
 
@@ -17,330 +24,235 @@ HIHAT_RANGE_LOW     = 27
 
 TOTAL_SUB_BANDS     = 39  # Each sub band is a range of 5 * frequency resolution. it is ~230Hz wide and there are 39 of these
 
+PLAYBACK_LATE       = 0.05  # Timeline beats later than this (e.g. after a stall) are skipped rather than flashed
 
-# ===========================================================================
-# Function: Gets both channel audio data and returns left channel data
-# Input:    Audio data from both channels
-# Return:   Left channel audio data
-def getSoundAmplitudeBuffer(stream):
-    data = stream.read(CHUNK_SIZE)
+# Flash colors and how fast they fade (color is multiplied by the decay every ~13ms redraw, like the C++ GUI)
+BASS_COLOR          = "#00FF00"
+CLAP_COLOR          = "#0000FF"
+HIHAT_COLOR         = "#FF0000"
+BASS_DECAY          = 0.82
+CLAP_DECAY          = 0.92
+HIHAT_DECAY         = 0.45
+HIHAT_MIN_FRAMES    = 4  # A hihat only cuts off a bass/clap fade that has been running this many redraws
 
-    # Convert data to numpy array
-    audio_data = np.frombuffer(data, dtype=np.int16).reshape(-1, 2)
 
-    # Separate audio data for left and right channels
-    amplitudes_left = audio_data[:, 0]
+# ===========================================================================
+# Function: Waits for the next chunk from the capture ring and returns it
+# Input:    Capture ring the PyAudio callback fills with both channels, channel to return (None = all channels)
+# Return:   Audio data of the channel(s) (a view into the ring, only valid until the next call)
+def getSoundAmplitudeBuffer(capture, channel=0):
+    sound_amplitude_buffer = capture.readChunk(channel=channel)
+    while sound_amplitude_buffer is None:
+        print("No audio from the mic, still waiting...")
+        sound_amplitude_buffer = capture.readChunk(channel=channel)
 
-    # Combine
-    sound_amplitude_buffer = np.array(amplitudes_left)
     return sound_amplitude_buffer
 
 
 # ===========================================================================
-# Function: Takes the FFT of the audio data for 1 CHUNK_SIZE
-# Input:    Sound Amplitude Buffer from getSoundAmplitudeBuffer
-# Return:   Real amplitude values, associated frequency values
-def takeFFT(audio_data, sample_rate):
-    # Apply Hanning window to audio data
-    window = np.hanning(len(audio_data))
-    audio_data = audio_data * window
-    
-    # Calculate the FFT of the audio data
-    amplitudes = np.fft.rfft(audio_data)
-    
-    # Calculate the frequency values for each point in the FFT
-    freq_values = np.fft.rfftfreq(len(audio_data), d=1/sample_rate)
-
-    # Filter the frequency data and frequency values to only show frequencies between 20Hz and 5000Hz
-    mask = (freq_values >= 30) & (freq_values <= 9010)
-    amplitudes = amplitudes[mask]
-    
-    # Return amplitudes
-    return amplitudes
+# Function: Prints the capture ring counters (dropped audio shows up here)
+# Input:    Capture ring
+# Return:   None
+def printCaptureStats(capture):
+    stats = capture.getStats()
+    print(f"Capture: {stats['overruns']} overruns ({stats['frames_dropped']} frames dropped), "
+          f"{stats['input_overflows']} input overflows, {stats['underruns']} underruns")
 
 
 # ===========================================================================
-# Function: Calculates the energy of each sub band
-# Input:    FFT'd audio data
-# Return:   List of energy for each sub band
-def getSubBandInstantEnergyofChunk(audio_data_fft):
-    instant_energy = []
-    for i in range(TOTAL_SUB_BANDS):
-        instant_energy.append(np.mean(np.power(np.abs(audio_data_fft[int(len(audio_data_fft) / TOTAL_SUB_BANDS) * i : int(len(audio_data_fft) / TOTAL_SUB_BANDS) * (i + 1)]), 3)))
-
-    # Return the instant energy values
-    return instant_energy
+# Function: Change window color (called by the flash engine on the Tk thread)
+# Input:    The color to be changed to, the color the current flash started at
+# Return:   None
+def changeColor(color, flash_color):
+    window.configure(bg=color)
 
 
 # ===========================================================================
-# Function: Shifts the energy history list right to slot in the new instant energy at the end
-# Input:    Energy history list and the instant energy
-# Return:   Updated energy history list
-def appendNewEnergy(energy_history, instant_energy):
-    energy_history.pop(0)
-    energy_history.append(instant_energy)
-
-    return energy_history
+# Function: Change the colors in a certain pattern when bass is detected
+# Input:    Flash engine of the window
+# Return:   None
+def bassScheme(lights):
+    lights.flash(BASS_COLOR, BASS_DECAY)
 
 
 # ===========================================================================
-# Function:  Checks if a beat has occurred and prints which sub band caused the beat
-# Algorithm: First normalize by dividing by max energy (from instant energy or energy history)
-#            Then check if the instant energy is greater than a certain threshold based on variance 
-# Input:     Instant energy and the energy history
-# Return:    True if a beat occurred, otherwise False
-def checkBeatSubBand(instant_energy_sub_bands, energy_history_sub_bands):
-    # Declare variables for function use
-    max_energy_sub_bands = []
-    sub_band_thresholds = []
-    avg_energies = []
-    norm_avg_energies = []
-    sub_band_beat = [False for i in range(TOTAL_SUB_BANDS)]
-    norm_instant_energy_sub_bands = [0 for i in range(len(instant_energy_sub_bands))]
-    norm_energy_history_sub_bands = [[0 for i in range(len(instant_energy_sub_bands))] for j in range(len(energy_history_sub_bands))]
-
-    for i in range(TOTAL_SUB_BANDS):
-        # Calculate the max energy for each sub band and normalize the history and Instant energy
-        max_energy_sub_bands.append(np.max([history[i] for history in energy_history_sub_bands]))
-        for j in range(len(energy_history_sub_bands)):
-            norm_energy_history_sub_bands[j][i] = energy_history_sub_bands[j][i] / max_energy_sub_bands[i]
-        norm_instant_energy_sub_bands[i] = instant_energy_sub_bands[i] / max_energy_sub_bands[i]
-
-        # Calculate the average energy and the threshold for each sub band
-        sub_band_thresholds.append(-15 * np.var([history[i] for history in norm_energy_history_sub_bands]) + 1.40)
-        avg_energies.append(np.mean([history[i] for history in energy_history_sub_bands]))
-        norm_avg_energies.append(np.mean([history[i] for history in norm_energy_history_sub_bands]))
-
-        # Check if the instant energy is greater than the threshold
-        if norm_instant_energy_sub_bands[i] > sub_band_thresholds[i] * norm_avg_energies[i] / 1.15 or norm_instant_energy_sub_bands[i] > 0.15:
-            sub_band_beat[i] = True
-
-    # Return the sub band beat array
-    return sub_band_beat
+# Function: Change the colors in a certain pattern when claps are detected
+# Input:    Flash engine of the window
+# Return:   None
+def clapScheme(lights):
+    lights.flash(CLAP_COLOR, CLAP_DECAY)
 
 
 # ===========================================================================
-# Function:  Simply averages the energies from sub bands clap low to clap high which is the clap energy range 
-# Input:     Instant energy for all sub bands
-# Return:    Average energy in the clap low to clap high sub band region
-def getClapEnergy(instant_energy):
-    return (1.2 * instant_energy[CLAP_RANGE_LOW]
-            + 1.3 * instant_energy[CLAP_RANGE_LOW + 1]
-            + 1.5 * instant_energy[CLAP_RANGE_LOW + 2]
-            + 1.4 * instant_energy[CLAP_RANGE_LOW + 5] 
-            + 1.6 * instant_energy[CLAP_RANGE_LOW + 6] 
-            + 1.4 * instant_energy[CLAP_RANGE_LOW + 9] 
-            + 1.6 * instant_energy[CLAP_RANGE_LOW + 10]) / 10
+# Function: Change the colors in a certain pattern when hihats is detected
+# Input:    Flash engine of the window
+# Return:   None
+def hihatScheme(lights):
+    lights.flash(HIHAT_COLOR, HIHAT_DECAY, HIHAT_MIN_FRAMES)
 
 
 # ===========================================================================
-# Function:  Simply averages the energies from sub bands hihat low to hihat high which is the hihat energy range 
-# Input:     Instant energy for all sub bands
-# Return:    Average energy in the clap low to clap high sub band region
-def getHiHatEnergy(instant_energy):
-    return (1.3 * instant_energy[HIHAT_RANGE_LOW]
-            + 1.7 * instant_energy[HIHAT_RANGE_LOW + 1]
-            + 1.4 * instant_energy[HIHAT_RANGE_LOW + 2]
-            + 1.2 * instant_energy[HIHAT_RANGE_LOW + 3]
-            + 1.4 * instant_energy[HIHAT_RANGE_LOW + 4]) / 7
+# Function: Flash colors based on the final detection (same for live detection and timeline playback)
+#           Only queues a fade and returns, the flash engine draws it. Claps win over bass, bass over hihats.
+# Input:    Flash engine of the window, the final detection (BeatEvents)
+# Return:   None
+def flashColors(lights, final_detection):
+    if final_detection.clap:
+        clapScheme(lights)
+    elif final_detection.bass:
+        bassScheme(lights)
+    elif final_detection.hihat:
+        hihatScheme(lights)
 
 
 # ===========================================================================
-# Function:  Confirms if the current detected beat is within an acceptable range of previous beats 
-# Input:     Energy of the current detected beat and the energy history of previusly detected beats
-# Return:    True if the history is less than 20 beats or the detected beat exceeds the threshold and False if not
-def confirmBeat(current_detected_beat, detected_beat_history):
-    max_detected_beat = np.max(detected_beat_history)
-    norm_detected_beat_history = detected_beat_history / max_detected_beat
-    avg_detected_beat = np.mean(detected_beat_history) / max_detected_beat
-    if current_detected_beat / max_detected_beat > avg_detected_beat * np.var(norm_detected_beat_history) * 0.64:
-        detected_beat_history = appendNewEnergy(detected_beat_history, current_detected_beat)
-        return True
-    else:
-        return False
+# Function: Loads the precomputed timeline for playback mode
+# Input:    Path of the .npz timeline (or None)
+# Return:   BeatTimeline, or None to fall back to live detection
+def loadPlaybackTimeline(path):
+    if path is None:
+        return None
 
+    try:
+        timeline = loadTimeline(path)
+    except (OSError, KeyError, ValueError) as error:
+        print(f"Could not load timeline {path} ({error}), falling back to live detection")
+        return None
 
-# ===========================================================================
-# Function: Change window color
-# Input:    The color to be changed to
-# Return:   None
-def changeColor(color):
-    window.configure(bg=color)
-    window.update()
+    if timeline.rate != RATE or timeline.chunk_size != CHUNK_SIZE:
+        print(f"Timeline {path} was made at {timeline.rate}Hz / {timeline.chunk_size} samples per chunk, "
+              f"expected {RATE}Hz / {CHUNK_SIZE}, falling back to live detection")
+        return None
 
-
-# ===========================================================================
-# Function: Change the colors in a certain pattern when bass is detected
-# Input:    None
-# Return:   None
-def bassScheme():
-    changeColor("#00FF00")
-    time.sleep(0.045)
+    return timeline
 
 
 # ===========================================================================
-# Function: Change the colors in a certain pattern when claps are detected
-# Input:    None
+# Function: Plays back a precomputed timeline from a timer, no audio or DSP at all
+#           Every tick looks up the song position on the clock, so slow ticks or flashes never make it drift.
+#           Events that are already more than PLAYBACK_LATE seconds late are dropped instead of flashed.
+# Input:    BeatTimeline and the position in the song (seconds) when Start was clicked
 # Return:   None
-def clapScheme():
-    changeColor("#0000FF")
-    time.sleep(0.065)
+def playTimeline(timeline, start_position):
+    events = getTimelineEvents(timeline)
+    seconds_per_chunk = timeline.chunk_size / timeline.rate
+    start_time = time.perf_counter() - start_position
+    next_event = int(np.searchsorted([event.chunk for event in events], start_position / seconds_per_chunk))
+    print(f"Playing back {len(events) - next_event} beats from {start_position:.2f}s")
 
+    def tick():
+        nonlocal next_event
+        position = time.perf_counter() - start_time
 
-# ===========================================================================
-# Function: Change the colors in a certain pattern when hihats is detected
-# Input:    None
-# Return:   None
-def hihatScheme():
-    changeColor("#FF0000")
-    time.sleep(0.030)
-
+        # Fire the latest due event, skip any that are stale
+        due = None
+        while next_event < len(events) and events[next_event].chunk * seconds_per_chunk <= position:
+            if position - events[next_event].chunk * seconds_per_chunk <= PLAYBACK_LATE:
+                due = events[next_event]
+            next_event += 1
+        if due is not None:
+            flashColors(lights, due)
 
-# ===========================================================================
-# Function: Given an array of booleans return true if input num are true
-# Input:    The array of Booleans and the input num required
-# Return:   True if at least input num elements are true else false
-def checkTrueValues(arr, input_num):
-    true_count = 0
+        if next_event >= len(events):
+            print("Playback finished.")
+            return
 
-    for value in arr:
-        if value:
-            true_count += 1
-            if true_count >= input_num:
-                return True
+        # Sleep in the Tk event loop until the next beat is due
+        delay = events[next_event].chunk * seconds_per_chunk - (time.perf_counter() - start_time)
+        window.after(max(0, int(delay * 1000)), tick)
 
-    return False
+    tick()
 
 
 # ===========================================================================
-# Function: Flash colors based on the final detection
-# Input:    The final detection array
+# Function: Start the light show, plays back the timeline if one was given, otherwise live detection
+#           Live detection runs on its own thread (like the C++ version) so the Tk event loop stays free to draw
+# Input:    None
 # Return:   None
-def flashColors(final_detection):
-    if (final_detection[0] and not final_detection[1] and final_detection[2]):
-        bassScheme()
-    elif (not final_detection[0] and final_detection[1] and final_detection[2]):
-        clapScheme()
-    elif (final_detection[0] and final_detection[1] and final_detection[2]):
-        clapScheme()
-    elif (not final_detection[0] and not final_detection[1] and final_detection[2]):
-        hihatScheme()
+def click():
+    start_button.configure(state=tk.DISABLED)
+    lights.start()
+    if playback_timeline is not None:
+        playTimeline(playback_timeline, args.start)
+    else:
+        threading.Thread(target=detectLive, daemon=True).start()
 
 
 # ===========================================================================
-# Function: Start the recording, calculations, and lights of the program
+# Function: Start the recording and calculations of the program, queues a flash for every beat
 # Input:    None
 # Return:   None
-def click():
-    # Create an instance of the PyAudio class and Open a stream to record audio from your microphone
+def detectLive():
+    # Create an instance of the PyAudio class and Open a callback stream that records your microphone into the capture ring
+    # (the callback keeps capturing while this thread is busy, so slow chunks or GUI stalls do not drop audio)
+    capture = CaptureRing(CHUNK_SIZE, CHANNELS, RATE)
     audio = pyaudio.PyAudio()
-    stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE)
+    stream = audio.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE,
+                        stream_callback=capture.callback)
+    stream.start_stream()
     print("Recording started...")
 
-    # Initialize a counter for the number of chunks processed, list to store audio_data, instant energy values, and history of energies for ~ 1s of data
-    chunks_processed = 0
-    sound_amplitude_buffer = np.array([0 for samples in range(CHUNK_SIZE)], dtype=object)
-    instant_energy_sub_bands = []
-    energy_history_sub_bands = []
-    sub_band_beat = []
-    beat_history = []  # Currently only tracks bass and clap
-    for i in range(3):
-        beat_history.append([])
-
-    bass_chunk = 0
-    clap_energy = 0
-    clap_chunk = 0
-    hihat_energy = 0
-    hihat_chunk = 0
-
-    final_detection = [False, False, False]
-
-    time_sum = 0
+    # Create the detector, it keeps the energy history and beat histories for ~ 1s of data
+    # (--stereo picks what it analyses out of both channels, the default is the left channel only)
+    stats = makeLiveStats(RATE, CHUNK_SIZE, capture)
+    detector = StereoDetector(args.stereo, RATE, CHUNK_SIZE, HISTORY_SECONDS, CLAP_RANGE_LOW, HIHAT_RANGE_LOW, TOTAL_SUB_BANDS, stats=stats)
 
     # Record audio for HISTORY_SECONDS to fill energy history
-    while chunks_processed < (HISTORY_SECONDS * int(RATE / CHUNK_SIZE)):
-        # Do processing
-        sound_amplitude_buffer = getSoundAmplitudeBuffer(stream)
-        real_amp_data = takeFFT(sound_amplitude_buffer, RATE)
-        instant_energy_sub_bands = getSubBandInstantEnergyofChunk(real_amp_data)
-        energy_history_sub_bands.append(instant_energy_sub_bands)
-        chunks_processed += 1
+    while not detector.isWarmedUp():
+        detector.process(getSoundAmplitudeBuffer(capture, channel=None))
 
 
     # Continue recording audio until the RECORD_SECONDS is fulfilled
-    while chunks_processed < ((RECORD_SECONDS)* int(RATE / CHUNK_SIZE)):
-        final_detection = [False, False, False]
-        
-        # Do processing
-        sound_amplitude_buffer = getSoundAmplitudeBuffer(stream)
-        real_amp_data = takeFFT(sound_amplitude_buffer, RATE)
-        instant_energy_sub_bands = getSubBandInstantEnergyofChunk(real_amp_data)
-        sub_band_beat = checkBeatSubBand(instant_energy_sub_bands, energy_history_sub_bands)
-
-        # Checks Bass
-        if (sub_band_beat[0]):
-            if chunks_processed - bass_chunk > 8:
-                if len(beat_history[0]) >= 4:
-                    if (confirmBeat(instant_energy_sub_bands[0], beat_history[0])):
-                        # print(f"Bass {chunks_processed} Energy {instant_energy_sub_bands[0]:.2e}")
-                        final_detection[0] = True
-                        bass_chunk = chunks_processed
-                        bassScheme()    
-                else:
-                    beat_history[0].append(instant_energy_sub_bands[0])
-    
-
-        # Checks Clap
-        clap_energy = getClapEnergy(instant_energy_sub_bands)
-        if (sub_band_beat[CLAP_RANGE_LOW] and sub_band_beat[CLAP_RANGE_LOW + 1] and sub_band_beat[CLAP_RANGE_LOW + 2] and sub_band_beat[CLAP_RANGE_LOW + 5] and sub_band_beat[CLAP_RANGE_LOW + 6] and sub_band_beat[CLAP_RANGE_LOW + 9] and sub_band_beat[CLAP_RANGE_LOW + 10]):
-            if chunks_processed - clap_chunk >= 4:
-                if len(beat_history[1]) >= 3:
-                    if (confirmBeat(clap_energy * 1.6, beat_history[1])):
-                        # print(f"Gap: {chunks_processed - clap_chunk} Clap {chunks_processed} Energy {clap_energy:.2e}")
-                        final_detection[1] = True 
-                        clapScheme()
-                        clap_chunk = chunks_processed
-                else:
-                    beat_history[1].append(clap_energy)
-        
-        # Check HiHat
-        hihat_energy = getHiHatEnergy(instant_energy_sub_bands)
-        if (checkTrueValues([sub_band_beat[HIHAT_RANGE_LOW], sub_band_beat[HIHAT_RANGE_LOW + 1], sub_band_beat[HIHAT_RANGE_LOW + 2], sub_band_beat[HIHAT_RANGE_LOW + 3], sub_band_beat[HIHAT_RANGE_LOW + 4]], 1)):
-            if chunks_processed - hihat_chunk > 3:
-                if len(beat_history[2]) >= 5:
-                    if (confirmBeat(hihat_energy, beat_history[2])):
-                        print(f"Gap:{chunks_processed - hihat_chunk} HiHat {chunks_processed} Energy {hihat_energy:.2e}")
-                        final_detection[2] = True
-                        hihat_chunk = chunks_processed
-                else:
-                    beat_history[2].append(hihat_energy)
-        
-
-        flashColors(final_detection)
-        changeColor("#000000")
-
-
-        energy_history_sub_bands = appendNewEnergy(energy_history_sub_bands, instant_energy_sub_bands)
-        chunks_processed += 1
+    while detector.chunks_processed < ((RECORD_SECONDS)* int(RATE / CHUNK_SIZE)):
+        hihat_chunk = detector.hihat_chunk
+        sound_amplitude_buffer = getSoundAmplitudeBuffer(capture, channel=None)
+        if stats is not None:
+            stats.beginChunk()
+        final_detection = detector.process(sound_amplitude_buffer)
+
+        if final_detection.hihat:
+            print(f"Gap:{final_detection.chunk - hihat_chunk} HiHat {final_detection.chunk} Energy {detector.hihat_energy:.2e}")
+
+        flashColors(lights, final_detection)
+        if stats is not None:
+            stats.endChunk()
 
 
     print("Recording stopped.")
 
     # Close the audio stream
     stream.stop_stream()
+    printCaptureStats(capture)
+    if stats is not None:
+        stats.printTotals()
     stream.close()
     audio.terminate()
 
 
-# Create the window
-window = tk.Tk()
-window.title("Light Room")
-window.geometry("500x500")
-window.configure(bg="black")
-
-# Create button to start stream
-start_button = tk.Button(window, text="Start", command=click)
-start_button.pack()
-
-# Run the window
-window.mainloop()
\ No newline at end of file
+# ===========================================================================
+# Start program (guarded, Light_Rooms.py imports the settings and flash schemes from this file)
+if __name__ == "__main__":
+    # Playback mode: --timeline song.npz (from Beat_Detector_Offline.py) --start <seconds into the song when Start is clicked>
+    parser = argparse.ArgumentParser(description="Light Room, live beat detection or precomputed timeline playback")
+    parser.add_argument("--timeline", help="Precomputed beat timeline (.npz) to play back instead of live detection")
+    parser.add_argument("--start", type=float, default=0.0, help="Position in the song (seconds) when Start is clicked")
+    parser.add_argument("--stereo", choices=STEREO_MODES, default="left",
+                        help="Live detection on the left channel, L+R (mono), mid and side, or both channels (a beat in either counts)")
+    args = parser.parse_args()
+    playback_timeline = loadPlaybackTimeline(args.timeline)
+
+    # Create the window
+    window = tk.Tk()
+    window.title("Light Room")
+    window.geometry("500x500")
+    window.configure(bg="black")
+
+    # Flash engine redraws the window every ~13ms from the Tk event loop
+    lights = FlashEngine(window, changeColor)
+
+    # Create button to start stream
+    start_button = tk.Button(window, text="Start", command=click)
+    start_button.pack()
+
+    # Run the window
+    window.mainloop()
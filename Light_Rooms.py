@@ -0,0 +1,143 @@
+import pyaudio  # To get audio data from mics
+from Light_Room import FORMAT, CHANNELS, RECORD_SECONDS, RATE, CHUNK_SIZE, HISTORY_SECONDS  # Same settings as one room
+from Light_Room import CLAP_RANGE_LOW, HIHAT_RANGE_LOW, TOTAL_SUB_BANDS
+from Light_Room import flashColors  # Same flash schemes as one room, queued on the flash engine of each room
+from beatdetector import MultiDetector  # Batched detection engine, one FFT/threshold pass for every room
+from beatdetector import CaptureRing, MultiCapture  # PyAudio callback capture rings, read in lockstep
+from beatdetector import makeLiveStats  # Opt-in stage timings, set BEATDETECTOR_STATS=<seconds> for a periodic summary
+from beatdetector import FlashEngine  # Non-blocking flash/fade scheduler on Tk's after() timer
+import tkinter as tk
+import threading
+import argparse
+
+
+# ===========================================================================
+# Function: Prints the input devices PyAudio can open, to pick the --devices indexes from
+# Input:    PyAudio instance
+# Return:   None
+def printInputDevices(audio):
+    for index in range(audio.get_device_count()):
+        info = audio.get_device_info_by_index(index)
+        if info["maxInputChannels"] >= CHANNELS:
+            print(f"{index}: {info['name']}")
+
+
+# ===========================================================================
+# Function: Waits for the next chunk of every room and returns the left channels stacked
+# Input:    MultiCapture over the capture ring of every room
+# Return:   (rooms x CHUNK_SIZE) audio data (only valid until the next call), rooms without audio are in capture.live
+def getSoundAmplitudeBuffers(capture):
+    sound_amplitude_buffers = capture.readChunks(channel=0)
+    while sound_amplitude_buffers is None:
+        print("No audio from any mic, still waiting...")
+        sound_amplitude_buffers = capture.readChunks(channel=0)
+
+    return sound_amplitude_buffers
+
+
+# ===========================================================================
+# Function: Prints the capture ring counters of every room (dropped audio shows up here)
+# Input:    Capture rings and their device indexes
+# Return:   None
+def printCaptureStats(rings, devices):
+    for ring, device in zip(rings, devices):
+        stats = ring.getStats()
+        print(f"Capture {device}: {stats['overruns']} overruns ({stats['frames_dropped']} frames dropped), "
+              f"{stats['input_overflows']} input overflows, {stats['underruns']} underruns, "
+              f"{stats['frames_skipped']} stale frames skipped")
+
+
+# ===========================================================================
+# Function: Start the recording of every room and the calculations, queues a flash in a room for every beat in it
+#           All rooms share one detector thread: their chunks are stacked and go through one batched FFT,
+#           sub band energy and threshold pass, then every room's events go to its own window
+# Input:    None
+# Return:   None
+def detectLive():
+    # Open a callback stream per device that records into its own capture ring
+    audio = pyaudio.PyAudio()
+    rings = [CaptureRing(CHUNK_SIZE, CHANNELS, RATE) for _ in args.devices]
+    streams = [audio.open(format=FORMAT, channels=CHANNELS, rate=RATE, input=True, frames_per_buffer=CHUNK_SIZE,
+                          input_device_index=device, stream_callback=ring.callback)
+               for device, ring in zip(args.devices, rings)]
+    for stream in streams:
+        stream.start_stream()
+    capture = MultiCapture(rings)
+    print(f"Recording started on {len(streams)} devices...")
+
+    # Create the detector, it keeps the energy history and beat histories of every room for ~ 1s of data
+    stats = makeLiveStats(RATE, CHUNK_SIZE, capture)
+    detector = MultiDetector(len(rings), RATE, CHUNK_SIZE, HISTORY_SECONDS, CLAP_RANGE_LOW, HIHAT_RANGE_LOW, TOTAL_SUB_BANDS, stats=stats)
+
+    # Record audio for HISTORY_SECONDS to fill energy history
+    while not detector.isWarmedUp():
+        detector.process(getSoundAmplitudeBuffers(capture), capture.live)
+
+
+    # Continue recording audio until the RECORD_SECONDS is fulfilled
+    while detector.chunks_processed < ((RECORD_SECONDS)* int(RATE / CHUNK_SIZE)):
+        sound_amplitude_buffers = getSoundAmplitudeBuffers(capture)
+        if stats is not None:
+            stats.beginChunk()
+        final_detections = detector.process(sound_amplitude_buffers, capture.live)
+
+        for lights, final_detection in zip(rooms, final_detections):
+            flashColors(lights, final_detection)
+        if stats is not None:
+            stats.endChunk()
+
+
+    print("Recording stopped.")
+
+    # Close the audio streams
+    for stream in streams:
+        stream.stop_stream()
+    printCaptureStats(rings, args.devices)
+    if stats is not None:
+        stats.printTotals()
+    for stream in streams:
+        stream.close()
+    audio.terminate()
+
+
+# ===========================================================================
+# Function: Start the light show in every room, live detection runs on its own thread so the Tk event loop stays free to draw
+# Input:    None
+# Return:   None
+def click():
+    start_button.configure(state=tk.DISABLED)
+    for lights in rooms:
+        lights.start()
+    threading.Thread(target=detectLive, daemon=True).start()
+
+
+# One window per input device (e.g. one mic per room): --devices 1 3 4, --list to print the device indexes
+parser = argparse.ArgumentParser(description="Light Room for several rooms, one process and one batched detector for every input device")
+parser.add_argument("--devices", type=int, nargs="+", help="PyAudio input device index of every room")
+parser.add_argument("--list", action="store_true", help="Print the input devices and exit")
+args = parser.parse_args()
+
+if args.list or not args.devices:
+    audio = pyaudio.PyAudio()
+    printInputDevices(audio)
+    audio.terminate()
+    if args.list:
+        raise SystemExit
+    parser.error("--devices is required to start, pick the indexes from the list above")
+
+# Create a window per room (the first is the Tk root with the Start button), each with its own flash engine
+window = tk.Tk()
+rooms = []
+for room, device in enumerate(args.devices):
+    room_window = window if room == 0 else tk.Toplevel(window)
+    room_window.title(f"Light Room (device {device})")
+    room_window.geometry("500x500")
+    room_window.configure(bg="black")
+    rooms.append(FlashEngine(room_window, lambda color, flash_color, room_window=room_window: room_window.configure(bg=color)))
+
+# Create button to start every stream
+start_button = tk.Button(window, text="Start", command=click)
+start_button.pack()
+
+# Run the windows
+window.mainloop()
@@ -0,0 +1,15 @@
+# Shared DSP engine for the beat detector scripts (Beat_Detector_*.py, Light_Room.py, Lyric_Room.py)
+from beatdetector.bands import SubBandEnergy, getBandBinCount, makeSubBandEdges
+from beatdetector.history import EnergyHistory
+from beatdetector.threshold import BeatThreshold, checkSubBandBeat
+from beatdetector.fft import FFTFrontEnd
+from beatdetector.detector import BeatEvents, BeatGate, Detector, MultiDetector, compareBeat, getClapEnergy, getHiHatEnergy, mergeEvents
+from beatdetector.offline import analyzeWav, openWav
+from beatdetector.timeline import BeatTimeline, getBeatTimes, getTimelineEvents, loadTimeline, makeTimeline, saveTimeline
+from beatdetector.capture import CaptureRing, MultiCapture
+from beatdetector.lights import FlashEngine
+from beatdetector.stats import LiveStats, makeLiveStats
+from beatdetector.spill import SpillArray, openSpill
+from beatdetector.lyrics import CachedLyrics, LyricTimeline, LyricsCache, LyricsPrefetcher, getLyricIndex, makeWordTimeline, parseLyrics, raceProviders, removeBrackets, timeWords
+from beatdetector.nowplaying import NowPlayingPoller, PlaybackState, getProgressMs, getUpcomingTracks
+from beatdetector.stereo import STEREO_MODES, StereoDetector
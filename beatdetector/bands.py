@@ -0,0 +1,86 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+# ===========================================================================
+# Function: Counts how many FFT bins fall inside the analysed frequency range (same mask takeFFT uses)
+# Input:    Sample rate, chunk size, lowest and highest frequency kept
+# Return:   Number of FFT bins between low_freq and high_freq
+def getBandBinCount(rate, chunk_size, low_freq=30, high_freq=9010):
+    freq_values = np.fft.rfftfreq(chunk_size, d=1/rate)
+    return int(np.count_nonzero((freq_values >= low_freq) & (freq_values <= high_freq)))
+
+
+# ===========================================================================
+# Function: Builds the band edge table for equal width sub bands
+#           Same split as the old loop: int(bins / sub bands) bins per band, leftover bins at the top are ignored
+# Input:    Number of FFT bins and the number of sub bands
+# Return:   Array of total_sub_bands + 1 bin edges
+def makeSubBandEdges(num_bins, total_sub_bands):
+    band_width = int(num_bins / total_sub_bands)
+    if band_width < 1:
+        raise ValueError(f"Cannot split {num_bins} FFT bins into {total_sub_bands} sub bands")
+
+    return np.arange(total_sub_bands + 1, dtype=np.intp) * band_width
+
+
+# ===========================================================================
+# Class:    Vectorized sub band energy engine
+#           Takes one magnitude pass over the spectrum (|X|^3) and then averages every band in a single call,
+#           either with a reshape (equal width bands) or np.add.reduceat (arbitrary band edges)
+# Input:    Band edge table, band i covers bins band_edges[i] to band_edges[i + 1]
+class SubBandEnergy:
+    def __init__(self, band_edges):
+        band_edges = np.asarray(band_edges, dtype=np.intp)
+        if band_edges.ndim != 1 or len(band_edges) < 2:
+            raise ValueError("band_edges needs at least two edges")
+        if band_edges[0] < 0 or np.any(np.diff(band_edges) <= 0):
+            raise ValueError("band_edges must be non-negative and strictly increasing")
+
+        self.band_edges = band_edges
+        self.total_sub_bands = len(band_edges) - 1
+
+        band_widths = np.diff(band_edges)
+        self._low_bin = int(band_edges[0])
+        self._high_bin = int(band_edges[-1])
+        self._band_starts = band_edges[:-1] - self._low_bin
+        self._band_widths = band_widths.astype(np.float64)
+        self._band_width = int(band_widths[0]) if np.all(band_widths == band_widths[0]) else None
+
+        # Scratch buffer for |X|^3, reused as long as the input shape and precision stay the same
+        self._magnitude = None
+
+    # =======================================================================
+    # Function: Calculates the energy of each sub band (mean of |X|^3 over the bins of the band)
+    # Input:    FFT'd audio data (1D, or 2D with one spectrum per row), optional output array
+    # Return:   Contiguous float array of energies, one per sub band (per row)
+    def compute(self, audio_data_fft, out=None):
+        spectrum = audio_data_fft[..., self._low_bin:self._high_bin]
+        if spectrum.shape[-1] != self._high_bin - self._low_bin:
+            raise ValueError(f"Spectrum has {audio_data_fft.shape[-1]} bins but the band edges need {self._high_bin}")
+
+        magnitude = self._getMagnitudeBuffer(spectrum)
+        np.abs(spectrum, out=magnitude)
+        np.power(magnitude, 3, out=magnitude)
+
+        if out is None:
+            out = np.empty(spectrum.shape[:-1] + (self.total_sub_bands,), dtype=magnitude.dtype)
+
+        if self._band_width is not None:
+            bands = magnitude.reshape(magnitude.shape[:-1] + (self.total_sub_bands, self._band_width))
+            np.mean(bands, axis=-1, out=out)
+        else:
+            np.add.reduceat(magnitude, self._band_starts, axis=-1, out=out)
+            np.divide(out, self._band_widths, out=out)
+
+        return out
+
+    # =======================================================================
+    # Function: Returns the |X|^3 scratch buffer, only reallocating when the spectrum shape or precision changes
+    # Input:    The band range of the spectrum
+    # Return:   Float buffer with the same shape as the spectrum
+    def _getMagnitudeBuffer(self, spectrum):
+        dtype = np.float32 if spectrum.dtype == np.complex64 else np.float64
+        if self._magnitude is None or self._magnitude.shape != spectrum.shape or self._magnitude.dtype != dtype:
+            self._magnitude = np.empty(spectrum.shape, dtype=dtype)
+
+        return self._magnitude
@@ -0,0 +1,180 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+import time  # For timing each stage
+import tracemalloc  # For counting the bytes allocated per call (numpy reports its buffers to tracemalloc)
+
+from beatdetector.bands import SubBandEnergy, getBandBinCount, makeSubBandEdges
+from beatdetector.fft import FFT_HAS_OUT, FFTFrontEnd
+from beatdetector.history import EnergyHistory
+from beatdetector.threshold import BeatThreshold, checkSubBandBeat
+
+
+# Same parameters as the scripts
+RATE                = 94618
+CHUNK_SIZE          = 2048
+TOTAL_SUB_BANDS     = 39
+
+REPEATS             = 2000
+HISTORY_SECONDS     = [1, 10, 60]
+
+
+# ===========================================================================
+# Function: The old per band loop, kept here as the reference for the micro-benchmark
+# Input:    FFT'd audio data
+# Return:   List of energy for each sub band
+def getSubBandInstantEnergyofChunkLoop(audio_data_fft):
+    instant_energy = []
+    for i in range(TOTAL_SUB_BANDS):
+        instant_energy.append(np.mean(np.power(np.abs(audio_data_fft[int(len(audio_data_fft) / TOTAL_SUB_BANDS) * i : int(len(audio_data_fft) / TOTAL_SUB_BANDS) * (i + 1)]), 3)))
+
+    return instant_energy
+
+
+# ===========================================================================
+# Function: The old takeFFT, kept here as the reference for the FFT front end benchmark
+# Input:    Sound Amplitude Buffer, sample rate
+# Return:   Complex amplitudes between 30Hz and 9010Hz
+def takeFFTUncached(audio_data, sample_rate=RATE):
+    window = np.hanning(len(audio_data))
+    audio_data = audio_data * window
+    amplitudes = np.fft.rfft(audio_data)
+    freq_values = np.fft.rfftfreq(len(audio_data), d=1/sample_rate)
+    mask = (freq_values >= 30) & (freq_values <= 9010)
+
+    return amplitudes[mask]
+
+
+# ===========================================================================
+# Function: Measures how many bytes a function allocates per call (freed or not)
+# Input:    Function to measure, its argument, number of repeats
+# Return:   Average bytes allocated per call
+def measureAllocations(function, argument, repeats):
+    function(argument)  # Warm up so one-off buffers are not counted
+    tracemalloc.start()
+    allocated = 0
+    for i in range(repeats):
+        tracemalloc.reset_peak()
+        current, peak = tracemalloc.get_traced_memory()
+        function(argument)
+        allocated += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return allocated / repeats
+
+
+# ===========================================================================
+# Function: Times a function over a number of repeats
+# Input:    Function to time, its argument, number of repeats
+# Return:   Average time per call in ms
+def timeCall(function, argument, repeats):
+    function(argument)  # Warm up
+    start_time = time.perf_counter()
+    for i in range(repeats):
+        function(argument)
+    end_time = time.perf_counter()
+
+    return (end_time - start_time) * 1000 / repeats
+
+
+# ===========================================================================
+# Function: Micro-benchmark of the band energy engine against the old loop and the chunk budget
+# Input:    Number of repeats
+# Return:   Dictionary with the average ms per chunk of each version and the chunk budget
+def benchmarkSubBandEnergy(repeats=REPEATS):
+    rng = np.random.default_rng(0)
+    num_bins = getBandBinCount(RATE, CHUNK_SIZE)
+    audio_data_fft = (rng.normal(size=num_bins) + 1j * rng.normal(size=num_bins)) * 1e5
+
+    sub_band_energy = SubBandEnergy(makeSubBandEdges(num_bins, TOTAL_SUB_BANDS))
+    out = np.empty(TOTAL_SUB_BANDS)
+
+    # Both versions have to agree before the timings mean anything
+    if not np.allclose(sub_band_energy.compute(audio_data_fft), getSubBandInstantEnergyofChunkLoop(audio_data_fft), rtol=1e-12):
+        raise AssertionError("Vectorized band energies do not match the per band loop")
+
+    return {
+        "budget_ms": CHUNK_SIZE / RATE * 1000,
+        "loop_ms": timeCall(getSubBandInstantEnergyofChunkLoop, audio_data_fft, repeats),
+        "vectorized_ms": timeCall(sub_band_energy.compute, audio_data_fft, repeats),
+        "vectorized_out_ms": timeCall(lambda data: sub_band_energy.compute(data, out=out), audio_data_fft, repeats),
+    }
+
+
+# ===========================================================================
+# Function: Benchmarks the cached FFT front end against the old takeFFT (time and bytes allocated per chunk)
+# Input:    Number of repeats
+# Return:   Dictionary with the average ms and bytes per chunk of each version
+def benchmarkFFTFrontEnd(repeats=REPEATS):
+    rng = np.random.default_rng(0)
+    audio_data = rng.integers(-32768, 32767, (CHUNK_SIZE, 2), dtype=np.int16)[:, 0]
+
+    fft_front_end = FFTFrontEnd(RATE, CHUNK_SIZE)
+    fft_front_end_32 = FFTFrontEnd(RATE, CHUNK_SIZE, dtype=np.float32)
+    if not np.array_equal(fft_front_end.process(audio_data), takeFFTUncached(audio_data)):
+        raise AssertionError("FFT front end does not match takeFFT")
+    if not np.allclose(fft_front_end_32.process(audio_data), takeFFTUncached(audio_data), rtol=1e-4, atol=1e-2 * CHUNK_SIZE):
+        raise AssertionError("float32 FFT front end does not match takeFFT")
+
+    results = {}
+    for name, function in [("uncached", takeFFTUncached), ("front_end", fft_front_end.process), ("front_end_32", fft_front_end_32.process)]:
+        results[f"{name}_ms"] = timeCall(function, audio_data, repeats)
+        results[f"{name}_bytes"] = measureAllocations(function, audio_data, repeats // 10)
+
+    # With out= both front ends should only allocate numpy's call overhead, never a chunk sized temporary
+    if FFT_HAS_OUT:
+        for name in ["front_end", "front_end_32"]:
+            if results[f"{name}_bytes"] >= CHUNK_SIZE * np.dtype(np.float32).itemsize:
+                raise AssertionError(f"FFT front end ({name}) allocates {results[f'{name}_bytes']:.0f} bytes per chunk")
+
+    return results
+
+
+# ===========================================================================
+# Function: Benchmarks the incremental beat threshold against the exact per band rule for one history length
+# Input:    History length in seconds and number of repeats
+# Return:   Dictionary with the average ms per chunk of each version
+def benchmarkBeatThreshold(history_seconds, repeats=REPEATS):
+    rng = np.random.default_rng(0)
+    history_len = history_seconds * int(RATE / CHUNK_SIZE)
+    energies = rng.lognormal(40, 2, (history_len + repeats, TOTAL_SUB_BANDS))
+
+    energy_history = EnergyHistory(history_len, TOTAL_SUB_BANDS)
+    beat_threshold = BeatThreshold(energy_history)
+    for instant_energy in energies[:history_len]:
+        beat_threshold.push(instant_energy)
+
+    # Exact rule, O(history) per sub band
+    start_time = time.perf_counter()
+    exact_repeats = max(1, repeats // 20)
+    for instant_energy in energies[history_len:history_len + exact_repeats]:
+        window = energy_history.window()
+        for i in range(TOTAL_SUB_BANDS):
+            checkSubBandBeat(instant_energy[i], window[:, i])
+    exact_ms = (time.perf_counter() - start_time) * 1000 / exact_repeats
+
+    # Incremental statistics, check + push like the main loop
+    start_time = time.perf_counter()
+    for instant_energy in energies[history_len:]:
+        beat_threshold.check(instant_energy)
+        beat_threshold.push(instant_energy)
+    incremental_ms = (time.perf_counter() - start_time) * 1000 / repeats
+
+    return {"history_len": history_len, "exact_ms": exact_ms, "incremental_ms": incremental_ms}
+
+
+# ===========================================================================
+# Start program
+if __name__ == "__main__":
+    results = benchmarkSubBandEnergy()
+    print(f"Chunk budget:              {results['budget_ms']:.3f} ms")
+    print(f"Per band loop:             {results['loop_ms']:.4f} ms ({results['loop_ms'] / results['budget_ms'] * 100:.2f}% of budget)")
+    print(f"Vectorized:                {results['vectorized_ms']:.4f} ms ({results['vectorized_ms'] / results['budget_ms'] * 100:.2f}% of budget)")
+    print(f"Vectorized (preallocated): {results['vectorized_out_ms']:.4f} ms ({results['vectorized_out_ms'] / results['budget_ms'] * 100:.2f}% of budget)")
+
+    results = benchmarkFFTFrontEnd()
+    print(f"takeFFT (uncached):        {results['uncached_ms']:.4f} ms, {results['uncached_bytes']:.0f} bytes allocated per chunk")
+    print(f"FFTFrontEnd:               {results['front_end_ms']:.4f} ms, {results['front_end_bytes']:.0f} bytes allocated per chunk")
+    print(f"FFTFrontEnd (float32):     {results['front_end_32_ms']:.4f} ms, {results['front_end_32_bytes']:.0f} bytes allocated per chunk")
+
+    for history_seconds in HISTORY_SECONDS:
+        results = benchmarkBeatThreshold(history_seconds)
+        print(f"Beat threshold, {history_seconds:>2} s history ({results['history_len']} chunks): exact {results['exact_ms']:.4f} ms, incremental {results['incremental_ms']:.4f} ms")
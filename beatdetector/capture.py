@@ -0,0 +1,196 @@
+import threading  # The PortAudio callback runs on its own thread
+import time  # Time spent waiting for audio
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+# PortAudio values (same as pyaudio.paContinue / pyaudio.paInputOverflow) so this module does not need pyaudio
+PA_CONTINUE         = 0
+PA_INPUT_OVERFLOW   = 0x2
+
+RING_SECONDS        = 4  # Audio the ring can hold before the reader has to catch up (GUI stalls shorter than this lose nothing)
+DEAD_AFTER_MISSES   = 3  # Reads in a row a stream of a MultiCapture has to miss before it stops being waited for
+
+
+# ===========================================================================
+# Class:    Capture ring buffer for PyAudio callback mode
+#           The PortAudio thread copies every block of interleaved samples into a preallocated (frames x channels)
+#           int16 ring, the detector thread reads CHUNK_SIZE frames at a time as zero-copy views of one channel.
+#           The ring is a whole number of chunks long so a chunk never wraps. A chunk handed to the reader is only
+#           released on its next read, so the callback can never overwrite data that is still being processed.
+#           - overruns:        blocks dropped because the ring was full (the reader fell RING_SECONDS behind)
+#           - input_overflows: blocks PortAudio itself flagged as overflowed (the callback was too late)
+#           - underruns:       reads that gave up waiting because no audio arrived (stream stalled or stopped)
+#           - frames_skipped:  stale frames thrown away by skipBacklog (a stream coming back after a stall)
+# Input:    Chunk size, number of interleaved channels, sample rate and seconds of audio to buffer
+class CaptureRing:
+    def __init__(self, chunk_size, channels=2, rate=94618, ring_seconds=RING_SECONDS):
+        self.chunk_size = chunk_size
+        self.channels = channels
+        self.capacity_chunks = max(2, int(np.ceil(ring_seconds * rate / chunk_size)))
+        self.capacity = self.capacity_chunks * chunk_size
+        self._buffer = np.zeros((self.capacity, channels), dtype=np.int16)
+
+        # Frame counters only ever grow: the callback owns written, the reader owns read
+        self.frames_written = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.overruns = 0
+        self.input_overflows = 0
+        self.underruns = 0
+        self.frames_skipped = 0
+        self.wait_seconds = 0.0  # Time the reader spent blocked waiting for audio
+        self._holding = False
+        self._data_ready = threading.Condition()
+
+    # =======================================================================
+    # Function: PyAudio stream callback, pass as stream_callback to audio.open(...)
+    # Input:    Interleaved int16 bytes, frames in the block, timing info, PortAudio status flags
+    # Return:   (None, PA_CONTINUE) so the stream keeps running
+    def callback(self, in_data, frame_count, time_info, status_flags):
+        if status_flags & PA_INPUT_OVERFLOW:
+            self.input_overflows += 1
+
+        samples = np.frombuffer(in_data, dtype=np.int16).reshape(-1, self.channels)  # View of the bytes, no copy
+        frame_count = len(samples)
+
+        if self.frames_written + frame_count - self.frames_read > self.capacity:
+            self.overruns += 1
+            self.frames_dropped += frame_count
+            return (None, PA_CONTINUE)
+
+        start = self.frames_written % self.capacity
+        first = min(frame_count, self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:frame_count - first] = samples[first:]
+
+        with self._data_ready:
+            self.frames_written += frame_count
+            self._data_ready.notify()
+
+        return (None, PA_CONTINUE)
+
+    # =======================================================================
+    # Function: Number of frames captured but not read yet
+    # Input:    None
+    # Return:   Frame count
+    def available(self):
+        return self.frames_written - self.frames_read - (self.chunk_size if self._holding else 0)
+
+    # =======================================================================
+    # Function: Waits for the next chunk and returns it as a view into the ring (no copy)
+    # Input:    Channel to return (0 = left) or None for all channels, seconds to wait before giving up
+    # Return:   (chunk_size,) or (chunk_size x channels) int16 view, valid until the next readChunk call,
+    #           or None if no chunk arrived within the timeout (counted as an underrun)
+    def readChunk(self, channel=0, timeout=1.0):
+        # Release the chunk handed out last time, the callback may now reuse it
+        if self._holding:
+            self.frames_read += self.chunk_size
+            self._holding = False
+
+        if self.frames_written - self.frames_read < self.chunk_size:
+            wait_start = time.perf_counter()
+            with self._data_ready:
+                ready = self._data_ready.wait_for(lambda: self.frames_written - self.frames_read >= self.chunk_size, timeout)
+            self.wait_seconds += time.perf_counter() - wait_start
+            if not ready:
+                self.underruns += 1
+                return None
+
+        start = self.frames_read % self.capacity
+        self._holding = True
+        chunk = self._buffer[start:start + self.chunk_size]
+
+        return chunk if channel is None else chunk[:, channel]
+
+    # =======================================================================
+    # Function: Throws away every whole chunk waiting in the ring except the newest one, so the next read is current
+    # Input:    None
+    # Return:   Number of frames skipped
+    def skipBacklog(self):
+        if self._holding:
+            self.frames_read += self.chunk_size
+            self._holding = False
+
+        skip = ((self.frames_written - self.frames_read) // self.chunk_size - 1) * self.chunk_size
+        if skip <= 0:
+            return 0
+
+        self.frames_read += skip
+        self.frames_skipped += skip
+        return skip
+
+    # =======================================================================
+    # Function: Capture health counters for printing at the end of a run
+    # Input:    None
+    # Return:   Dict of counters
+    def getStats(self):
+        return {"frames_written": self.frames_written, "frames_dropped": self.frames_dropped, "overruns": self.overruns,
+                "input_overflows": self.input_overflows, "underruns": self.underruns, "frames_skipped": self.frames_skipped, "backlog_frames": self.available(),
+                "wait_seconds": self.wait_seconds}
+
+
+# ===========================================================================
+# Class:    Several capture rings (one per input stream) read in lockstep
+#           Every read waits for the next chunk of each ring and copies the channel into one row of a preallocated
+#           (streams x chunk_size) int16 array, so all streams go through one batched FFT (MultiDetector).
+#           Every stream shares one deadline per read, so a device slightly out of phase with the others is waited for.
+#           A stream that gives nothing by the deadline gets a silent row and is marked missing in live, pass live
+#           as the valid mask of MultiDetector.process so the silence never reaches its energy history.
+#           A stream that misses dead_after reads in a row is dead: it is polled without waiting (one poll per read,
+#           so an unplugged device does not stall the others) until it delivers again, its stale backlog is then
+#           skipped so it comes back in step with the others.
+# Input:    List of CaptureRings with the same chunk size, missed reads in a row before a stream counts as dead
+class MultiCapture:
+    def __init__(self, rings, dead_after=DEAD_AFTER_MISSES):
+        if len({ring.chunk_size for ring in rings}) != 1:
+            raise ValueError("All capture rings need the same chunk size")
+
+        self.rings = rings
+        self.chunk_size = rings[0].chunk_size
+        self.dead_after = dead_after
+        self._chunks = np.zeros((len(rings), self.chunk_size), dtype=np.int16)
+        self.live = np.zeros(len(rings), dtype=bool)  # Streams that delivered a chunk on the last read
+        self.misses = np.zeros(len(rings), dtype=np.int64)  # Reads in a row each stream has missed
+
+    # =======================================================================
+    # Function: Waits for the next chunk of every stream and stacks them
+    # Input:    Channel to take from every stream, seconds to wait for the live streams in total
+    # Return:   (streams x chunk_size) int16 array (overwritten by the next call, rows of missing streams are zero),
+    #           or None if no stream delivered a chunk within the timeout
+    def readChunks(self, channel=0, timeout=1.0):
+        # Wait for every stream that is not dead, or for all of them if they all are (start up or a full stall)
+        dead = self.misses >= self.dead_after
+        waiting = ~dead if not dead.all() else np.ones(len(self.rings), dtype=bool)
+
+        deadline = time.perf_counter() + timeout
+        for row, ring in enumerate(self.rings):
+            if waiting[row]:
+                chunk = ring.readChunk(channel, max(0.0, deadline - time.perf_counter()))
+            elif ring.available() >= self.chunk_size:
+                # A dead stream is back, drop what piled up so it is in step with the others
+                ring.skipBacklog()
+                chunk = ring.readChunk(channel, 0.0)
+            else:
+                chunk = None
+
+            self.live[row] = chunk is not None
+            if chunk is None:
+                self.misses[row] += 1
+                self._chunks[row] = 0
+            else:
+                self.misses[row] = 0
+                self._chunks[row] = chunk
+
+        return self._chunks if self.live.any() else None
+
+    # =======================================================================
+    # Function: Capture health counters of all streams added up (backlog is the largest one)
+    # Input:    None
+    # Return:   Dict of counters
+    def getStats(self):
+        streams = [ring.getStats() for ring in self.rings]
+        stats = {key: sum(stream[key] for stream in streams) for key in streams[0]}
+        stats["backlog_frames"] = max(stream["backlog_frames"] for stream in streams)
+
+        return stats
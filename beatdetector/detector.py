@@ -0,0 +1,462 @@
+from collections import namedtuple
+
+import time  # Stage timings for the optional live stats
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector.bands import SubBandEnergy, makeSubBandEdges
+from beatdetector.fft import FFTFrontEnd
+from beatdetector.history import EnergyHistory
+from beatdetector.threshold import BeatThreshold
+
+
+# Default parameters for the audio processing
+RATE                = 94618  # int(43008 * 2.2)
+CHUNK_SIZE          = 2048
+HISTORY_SECONDS     = 1
+
+CLAP_RANGE_LOW      = 11
+HIHAT_RANGE_LOW     = 27
+
+TOTAL_SUB_BANDS     = 39  # Each sub band is a range of 5 * frequency resolution. it is ~230Hz wide and there are 39 of these
+
+# Sub bands (offset from the range low) that all have to beat for a clap / any of which can beat for a hihat
+CLAP_BANDS          = [0, 1, 2, 5, 6, 9, 10]
+HIHAT_BANDS         = [0, 1, 2, 3, 4]
+
+
+# Result of processing one chunk. Indexes 0, 1, 2 are bass, clap, hihat like the old final_detection list
+BeatEvents = namedtuple("BeatEvents", ["bass", "clap", "hihat", "chunk"])
+
+
+# ===========================================================================
+# Function: Shifts the energy history list right to slot in the new instant energy at the end
+# Input:    Energy history list and the instant energy
+# Return:   Updated energy history list
+def appendNewEnergy(energy_history, instant_energy):
+    energy_history.pop(0)
+    energy_history.append(instant_energy)
+
+    return energy_history
+
+
+# ===========================================================================
+# Function:  Simply averages the energies from sub bands clap low to clap high which is the clap energy range
+# Input:     Instant energy for all sub bands, first clap sub band
+# Return:    Average energy in the clap low to clap high sub band region
+def getClapEnergy(instant_energy, clap_range_low=CLAP_RANGE_LOW):
+    return (1.2 * instant_energy[clap_range_low]
+            + 1.3 * instant_energy[clap_range_low + 1]
+            + 1.5 * instant_energy[clap_range_low + 2]
+            + 1.4 * instant_energy[clap_range_low + 5]
+            + 1.6 * instant_energy[clap_range_low + 6]
+            + 1.4 * instant_energy[clap_range_low + 9]
+            + 1.6 * instant_energy[clap_range_low + 10]) / 10
+
+
+# ===========================================================================
+# Function:  Simply averages the energies from sub bands hihat low to hihat high which is the hihat energy range
+# Input:     Instant energy for all sub bands, first hihat sub band
+# Return:    Average energy in the hihat low to hihat high sub band region
+def getHiHatEnergy(instant_energy, hihat_range_low=HIHAT_RANGE_LOW):
+    return (1.3 * instant_energy[hihat_range_low]
+            + 1.7 * instant_energy[hihat_range_low + 1]
+            + 1.4 * instant_energy[hihat_range_low + 2]
+            + 1.2 * instant_energy[hihat_range_low + 3]
+            + 1.4 * instant_energy[hihat_range_low + 4]) / 7
+
+
+# ===========================================================================
+# Function:  Confirms if the current detected beat is within an acceptable range of previous beats
+# Input:     Energy of the current detected beat and the energy history of previusly detected beats
+# Return:    True if the detected beat exceeds the threshold (and slots it into the history) and False if not
+def compareBeat(current_detected_beat, detected_beat_history):
+    history = np.asarray(detected_beat_history)  # One conversion of the list instead of one per numpy call
+    max_detected_beat = np.max(history)
+    norm_detected_beat_history = history / max_detected_beat
+    avg_detected_beat = np.mean(history) / max_detected_beat
+    if current_detected_beat / max_detected_beat > avg_detected_beat * np.var(norm_detected_beat_history) * 0.64:
+        appendNewEnergy(detected_beat_history, current_detected_beat)
+        return True
+    else:
+        return False
+
+
+# ===========================================================================
+# Function: Given an array of booleans return true if input num are true
+# Input:    The array of Booleans and the input num required
+# Return:   True if at least input num elements are true else false
+def checkTrueValues(arr, input_num):
+    true_count = 0
+
+    for value in arr:
+        if value:
+            true_count += 1
+            if true_count >= input_num:
+                return True
+
+    return False
+
+
+# ===========================================================================
+# Class:    Bass/clap/hihat gating state of one signal, the last stage of the pipeline
+#           Keeps the energies of previously detected beats and the chunk of the last beat of each kind.
+#           Detector is one of these plus the FFT and thresholds, MultiDetector keeps one per row.
+# Input:    First clap and hihat sub bands
+class BeatGate:
+    def __init__(self, clap_range_low=CLAP_RANGE_LOW, hihat_range_low=HIHAT_RANGE_LOW):
+        self.clap_range_low = clap_range_low
+        self.hihat_range_low = hihat_range_low
+
+        self.beat_history = [[], [], []]  # Energies of previously detected bass, clap and hihat
+        self.bass_chunk = 0
+        self.clap_chunk = 0
+        self.hihat_chunk = 0
+
+        # Energies of the last chunk, for front ends that print them
+        self.clap_energy = 0
+        self.hihat_energy = 0
+
+    # =======================================================================
+    # Function: Decides which of bass, clap and hihat happened given the sub band beats
+    # Input:    Instant energy and boolean sub band beats of the current chunk, the chunk number
+    # Return:   BeatEvents for the chunk
+    def decide(self, instant_energy, sub_band_beat, chunk):
+        bass = False
+        clap = False
+        hihat = False
+
+        # Checks Bass
+        if (sub_band_beat[0]):
+            if chunk - self.bass_chunk > 8:
+                if len(self.beat_history[0]) >= 4:
+                    if (compareBeat(instant_energy[0], self.beat_history[0])):
+                        bass = True
+                        self.bass_chunk = chunk
+                else:
+                    self.beat_history[0].append(instant_energy[0])
+
+        # Checks Clap
+        self.clap_energy = getClapEnergy(instant_energy, self.clap_range_low)
+        if (checkTrueValues([sub_band_beat[self.clap_range_low + band] for band in CLAP_BANDS], len(CLAP_BANDS))):
+            if chunk - self.clap_chunk >= 4:
+                if len(self.beat_history[1]) >= 3:
+                    if (compareBeat(self.clap_energy * 1.6, self.beat_history[1])):
+                        clap = True
+                        self.clap_chunk = chunk
+                else:
+                    self.beat_history[1].append(self.clap_energy)
+
+        # Check HiHat
+        self.hihat_energy = getHiHatEnergy(instant_energy, self.hihat_range_low)
+        if (checkTrueValues([sub_band_beat[self.hihat_range_low + band] for band in HIHAT_BANDS], 1)):
+            if chunk - self.hihat_chunk > 3:
+                if len(self.beat_history[2]) >= 5:
+                    if (compareBeat(self.hihat_energy, self.beat_history[2])):
+                        hihat = True
+                        self.hihat_chunk = chunk
+                else:
+                    self.beat_history[2].append(self.hihat_energy)
+
+        return BeatEvents(bass, clap, hihat, chunk)
+
+
+# ===========================================================================
+# Class:    Streaming beat detector, the pipeline every script shares
+#           takeFFT -> sub band energies -> adaptive sub band thresholds -> bass/clap/hihat gating (BeatGate)
+#           The first history_seconds of chunks only fill the energy history and never report beats.
+# Input:    Audio parameters, first clap and hihat sub bands, FFT precision,
+#           track_conditions to keep the un-normalized thresholds of every chunk (for plotting),
+#           LiveStats to record the latency of every stage into (None = off, no timing at all)
+class Detector(BeatGate):
+    def __init__(self, rate=RATE, chunk_size=CHUNK_SIZE, history_seconds=HISTORY_SECONDS,
+                 clap_range_low=CLAP_RANGE_LOW, hihat_range_low=HIHAT_RANGE_LOW, total_sub_bands=TOTAL_SUB_BANDS,
+                 dtype=np.float64, track_conditions=False, stats=None):
+        BeatGate.__init__(self, clap_range_low, hihat_range_low)
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.total_sub_bands = total_sub_bands
+        self.track_conditions = track_conditions
+        self.stats = stats
+
+        self.fft_front_end = FFTFrontEnd(rate, chunk_size, dtype=dtype)
+        self.sub_band_energy = SubBandEnergy(makeSubBandEdges(self.fft_front_end.num_bins, total_sub_bands))
+        self.history_len = history_seconds * int(rate / chunk_size)
+        self.energy_history = EnergyHistory(self.history_len, total_sub_bands)
+        self.beat_threshold = BeatThreshold(self.energy_history)
+
+        self.chunks_processed = 0
+
+        # Results of the last chunk, for front ends that plot or print them
+        self.spectrum = None
+        self.instant_energy = np.zeros(total_sub_bands)
+        self.sub_band_beat = np.zeros(total_sub_bands, dtype=bool)
+        self.conditions = None
+
+    # =======================================================================
+    # Function: Checks if the energy history has been filled and beats can be reported
+    # Input:    None
+    # Return:   True once history_seconds of chunks have been processed
+    def isWarmedUp(self):
+        return self.energy_history.isFull()
+
+    # =======================================================================
+    # Function: Runs one chunk of audio through the whole pipeline
+    # Input:    CHUNK_SIZE samples of one channel (int16 or float, any strides)
+    # Return:   BeatEvents for the chunk
+    def process(self, chunk):
+        if self.stats is not None:
+            return self._processTimed(chunk)
+
+        self.spectrum = self.fft_front_end.process(chunk)
+        self.sub_band_energy.compute(self.spectrum, out=self.instant_energy)
+
+        return self.processEnergy(self.instant_energy)
+
+    # =======================================================================
+    # Function: Same as process, recording how long each stage took into the live stats
+    # Input:    CHUNK_SIZE samples of one channel
+    # Return:   BeatEvents for the chunk
+    def _processTimed(self, chunk):
+        start_time = time.perf_counter()
+        self.spectrum = self.fft_front_end.process(chunk)
+        fft_time = time.perf_counter()
+        self.sub_band_energy.compute(self.spectrum, out=self.instant_energy)
+        energy_time = time.perf_counter()
+        self.stats.record("fft", fft_time - start_time)
+        self.stats.record("energy", energy_time - fft_time)
+
+        if not self.isWarmedUp():
+            return self.processEnergy(self.instant_energy)
+
+        if self.track_conditions:
+            self.conditions = self.beat_threshold.getConditions()
+        self.sub_band_beat = self.beat_threshold.check(self.instant_energy)
+        threshold_time = time.perf_counter()
+        events = self.decide(self.instant_energy, self.sub_band_beat, self.chunks_processed)
+        gating_time = time.perf_counter()
+        self.beat_threshold.push(self.instant_energy)
+        self.chunks_processed += 1
+        end_time = time.perf_counter()
+
+        self.stats.record("threshold", threshold_time - energy_time)
+        self.stats.record("gating", gating_time - threshold_time)
+        self.stats.record("push", end_time - gating_time)
+
+        return events
+
+    # =======================================================================
+    # Function: Runs the threshold and gating stages on precomputed sub band energies (offline/batched front ends)
+    # Input:    Instant energy for all sub bands
+    # Return:   BeatEvents for the chunk
+    def processEnergy(self, instant_energy):
+        chunk = self.chunks_processed
+        if not self.isWarmedUp():
+            self.beat_threshold.push(instant_energy)
+            self.chunks_processed += 1
+            return BeatEvents(False, False, False, chunk)
+
+        if self.track_conditions:
+            self.conditions = self.beat_threshold.getConditions()
+        self.sub_band_beat = self.beat_threshold.check(instant_energy)
+        events = self.decide(instant_energy, self.sub_band_beat, chunk)
+
+        self.beat_threshold.push(instant_energy)
+        self.chunks_processed += 1
+
+        return events
+
+
+# ===========================================================================
+# Class:    Batched beat detector for several signals at once (stereo channels, several input streams)
+#           One rFFT over all rows, one band energy pass and one threshold pass over a (rows x sub bands) history,
+#           then the bass/clap/hihat gating of each row. Row i gives the same events a Detector fed only row i would
+#           (the clap/hihat energies of a gate are only updated on chunks where its row had a beat in a gated sub band).
+#           A row marked invalid (e.g. a stream that delivered nothing) is skipped: it reports no beat, its gate is left
+#           alone and its history gets back the energy it is about to drop (the oldest row, or the newest one while
+#           warming up), so its max, mean and variance stay exactly what they were instead of being dragged to silence.
+# Input:    Number of rows, audio parameters, first clap and hihat sub bands, FFT precision,
+#           LiveStats to record the latency of every stage into (None = off, no timing at all),
+#           (rows x input rows) matrix of real weights to mix the spectra of the input rows into the analysed rows
+#           (e.g. [[1, 1], [1, -1]] for mid/side, the FFT is linear so this is the same as mixing the samples
+#           but only touches the bins in the frequency range), None = analyse the input rows as they are
+class MultiDetector:
+    def __init__(self, rows, rate=RATE, chunk_size=CHUNK_SIZE, history_seconds=HISTORY_SECONDS,
+                 clap_range_low=CLAP_RANGE_LOW, hihat_range_low=HIHAT_RANGE_LOW, total_sub_bands=TOTAL_SUB_BANDS,
+                 dtype=np.float64, stats=None, mix=None):
+        self.rows = rows
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.total_sub_bands = total_sub_bands
+        self.stats = stats
+
+        self.fft_front_end = FFTFrontEnd(rate, chunk_size, dtype=dtype)
+        self.sub_band_energy = SubBandEnergy(makeSubBandEdges(self.fft_front_end.num_bins, total_sub_bands))
+        self.history_len = history_seconds * int(rate / chunk_size)
+        self.energy_history = EnergyHistory(self.history_len, (rows, total_sub_bands))
+
+        # Mixing matrix and the buffer the mixed spectra go into
+        self.mix = None
+        self._mixed = None
+        if mix is not None:
+            complex_dtype = np.complex64 if np.dtype(dtype) == np.float32 else np.complex128
+            self.mix = np.asarray(mix, dtype=dtype)
+            if self.mix.ndim != 2 or self.mix.shape[0] != rows:
+                raise ValueError(f"mix needs one row of weights per analysed row ({rows}), got shape {self.mix.shape}")
+            self._mixed = np.empty((rows, self.fft_front_end.num_bins), dtype=complex_dtype)
+        self.beat_threshold = BeatThreshold(self.energy_history)
+
+        # Gating state of every row, the FFT and thresholds above are shared
+        self.gates = [BeatGate(clap_range_low, hihat_range_low) for _ in range(rows)]
+
+        # Sub bands the gating looks at, a row with no beat in any of them cannot report anything so it is not gated
+        self._gate_bands = np.zeros(total_sub_bands, dtype=bool)
+        self._gate_bands[[0] + [clap_range_low + band for band in CLAP_BANDS]
+                         + [hihat_range_low + band for band in HIHAT_BANDS]] = True
+
+        self.chunks_processed = 0
+        self.spectrum = None
+        self.instant_energy = np.zeros((rows, total_sub_bands))
+        self.sub_band_beat = np.zeros((rows, total_sub_bands), dtype=bool)
+
+    # =======================================================================
+    # Function: Checks if the energy history has been filled and beats can be reported
+    # Input:    None
+    # Return:   True once history_seconds of chunks have been processed
+    def isWarmedUp(self):
+        return self.energy_history.isFull()
+
+    # =======================================================================
+    # Function: Runs one chunk of every row through the whole pipeline
+    # Input:    (rows x CHUNK_SIZE) samples (int16 or float, any strides, e.g. a transposed view of interleaved audio),
+    #           boolean mask of the rows that hold real audio (None = all of them)
+    # Return:   List of BeatEvents, one per row
+    def process(self, chunks, valid=None):
+        if self.stats is not None:
+            return self._processTimed(chunks, valid)
+
+        self.spectrum = self._takeFFT(chunks)
+        self.sub_band_energy.compute(self.spectrum, out=self.instant_energy)
+
+        return self.processEnergy(self.instant_energy, valid)
+
+    # =======================================================================
+    # Function: Same as process, recording how long each stage took (for all rows together) into the live stats
+    # Input:    (rows x CHUNK_SIZE) samples, mask of the valid rows (None = all)
+    # Return:   List of BeatEvents, one per row
+    def _processTimed(self, chunks, valid=None):
+        start_time = time.perf_counter()
+        self.spectrum = self._takeFFT(chunks)
+        fft_time = time.perf_counter()
+        self.sub_band_energy.compute(self.spectrum, out=self.instant_energy)
+        energy_time = time.perf_counter()
+        self.stats.record("fft", fft_time - start_time)
+        self.stats.record("energy", energy_time - fft_time)
+
+        if not self.isWarmedUp():
+            return self.processEnergy(self.instant_energy, valid)
+
+        missing = self._fillMissingRows(self.instant_energy, valid)
+        self.sub_band_beat = self.beat_threshold.check(self.instant_energy)
+        if missing is not None:
+            self.sub_band_beat[missing] = False
+        threshold_time = time.perf_counter()
+        events = self._gate(self.instant_energy, self.sub_band_beat)
+        gating_time = time.perf_counter()
+        self.beat_threshold.push(self.instant_energy)
+        self.chunks_processed += 1
+        end_time = time.perf_counter()
+
+        self.stats.record("threshold", threshold_time - energy_time)
+        self.stats.record("gating", gating_time - threshold_time)
+        self.stats.record("push", end_time - gating_time)
+
+        return events
+
+    # =======================================================================
+    # Function: Takes the FFT of every input row and mixes the spectra if the detector has a mixing matrix
+    # Input:    (input rows x CHUNK_SIZE) samples
+    # Return:   (rows x bins) complex amplitudes in the frequency range, overwritten by the next call
+    def _takeFFT(self, chunks):
+        spectrum = self.fft_front_end.process(chunks)
+        if self.mix is None:
+            return spectrum
+
+        # Real weights mix the real and imaginary parts alike, so mix the float view (interleaved re, im) of every row
+        np.matmul(self.mix, spectrum.view(self.mix.dtype), out=self._mixed.view(self.mix.dtype))
+        return self._mixed
+
+    # =======================================================================
+    # Function: Runs the threshold and gating stages on precomputed sub band energies of every row
+    # Input:    (rows x sub bands) instant energies (the rows of invalid rows are overwritten), mask of the valid rows
+    # Return:   List of BeatEvents, one per row
+    def processEnergy(self, instant_energy, valid=None):
+        chunk = self.chunks_processed
+        missing = self._fillMissingRows(instant_energy, valid)
+        if not self.isWarmedUp():
+            self.beat_threshold.push(instant_energy)
+            self.chunks_processed += 1
+            return [BeatEvents(False, False, False, chunk)] * self.rows
+
+        self.sub_band_beat = self.beat_threshold.check(instant_energy)
+        if missing is not None:
+            self.sub_band_beat[missing] = False
+        events = self._gate(instant_energy, self.sub_band_beat)
+
+        self.beat_threshold.push(instant_energy)
+        self.chunks_processed += 1
+
+        return events
+
+    # =======================================================================
+    # Function: Replaces the energies of invalid rows with ones that leave their history statistics unchanged
+    #           (the row the push will drop, or the newest one while the history is still filling)
+    # Input:    (rows x sub bands) instant energies, mask of the valid rows (None = all)
+    # Return:   Mask of the invalid rows, or None if every row is valid
+    def _fillMissingRows(self, instant_energy, valid):
+        if valid is None:
+            return None
+        missing = ~np.asarray(valid, dtype=bool)
+        if not missing.any():
+            return None
+
+        if self.energy_history.isFull():
+            instant_energy[missing] = self.energy_history.oldest()[missing]
+        elif len(self.energy_history) > 0:
+            instant_energy[missing] = self.energy_history.window()[-1][missing]
+        else:
+            instant_energy[missing] = 0
+
+        return missing
+
+    # =======================================================================
+    # Function: Runs the gating of every row that had a beat in a sub band the gating looks at
+    #           The rows go to the gates as lists, indexing a list is far cheaper than indexing a numpy row
+    # Input:    (rows x sub bands) instant energies and sub band beats of the current chunk
+    # Return:   List of BeatEvents, one per row
+    def _gate(self, instant_energy, sub_band_beat):
+        chunk = self.chunks_processed
+        events = [BeatEvents(False, False, False, chunk)] * self.rows
+        rows = np.flatnonzero(np.dot(sub_band_beat, self._gate_bands))
+        if len(rows) == 0:
+            return events
+
+        instant_energy_rows = instant_energy.tolist()
+        sub_band_beat_rows = sub_band_beat.tolist()
+        for row in rows.tolist():
+            events[row] = self.gates[row].decide(instant_energy_rows[row], sub_band_beat_rows[row], chunk)
+
+        return events
+
+
+# ===========================================================================
+# Function: Merges the events of several rows into one (a beat in any row counts)
+# Input:    List of BeatEvents of the same chunk
+# Return:   BeatEvents
+def mergeEvents(events):
+    # Nothing to merge when every row agrees (rows without a beat share one BeatEvents, so this is cheap)
+    if events.count(events[0]) == len(events):
+        return events[0]
+
+    bass, clap, hihat, chunk = zip(*events)
+    return BeatEvents(any(bass), any(clap), any(hihat), chunk[0])
@@ -0,0 +1,76 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+# np.fft only takes an out= array from numpy 2.0
+FFT_HAS_OUT         = np.lib.NumpyVersion(np.__version__) >= "2.0.0"
+
+
+# ===========================================================================
+# Class:    Cached FFT front end for one (RATE, CHUNK_SIZE)
+#           Builds the Hanning window, the band range (a slice instead of a boolean mask) and the output buffers once,
+#           so each chunk is a multiply into a preallocated buffer, an rFFT into a preallocated buffer and a view
+# Input:    Sample rate, chunk size, frequency range kept, float64 or float32 (complex64 output, half the buffer memory)
+class FFTFrontEnd:
+    def __init__(self, rate, chunk_size, low_freq=30, high_freq=9010, dtype=np.float64):
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError("FFTFrontEnd only supports float32 and float64")
+
+        # np.fft passes the default "backward" scale as a Python int, which picks pocketfft's float64 loop and upcasts
+        # a float32 chunk into temporaries. "forward" passes a float32 1/n instead, so the window is scaled by n to undo it
+        self.norm = "forward" if self.dtype == np.float32 else "backward"
+        self.window = np.hanning(chunk_size).astype(self.dtype)
+        if self.norm == "forward":
+            self.window *= chunk_size
+
+        # Frequency range between low_freq and high_freq as one contiguous slice of the rFFT bins
+        freq_values = np.fft.rfftfreq(chunk_size, d=1/rate)
+        band_bins = np.flatnonzero((freq_values >= low_freq) & (freq_values <= high_freq))
+        if len(band_bins) == 0:
+            raise ValueError(f"No FFT bins between {low_freq}Hz and {high_freq}Hz")
+
+        self.band_slice = slice(int(band_bins[0]), int(band_bins[-1]) + 1)
+        self.freq_values = freq_values[self.band_slice]
+        self.num_bins = len(self.freq_values)
+
+        self._windowed = None
+        self._spectrum = None
+        self._row_window = None  # Window repeated for every row, a full size multiply is faster than a broadcast one
+
+    # =======================================================================
+    # Function: Takes the FFT of the audio data for 1 CHUNK_SIZE (or one chunk per row)
+    # Input:    Audio samples, last axis is CHUNK_SIZE long (int16 or float, any strides)
+    # Return:   Complex amplitudes in the frequency range, a view that is overwritten by the next call
+    def process(self, audio_data):
+        windowed, spectrum = self._getBuffers(np.shape(audio_data))
+        window = self.window if windowed.ndim == 1 else self._row_window
+
+        # Apply Hanning window to audio data (cast in place first, a mixed int16 * float multiply allocates a cast buffer)
+        np.copyto(windowed, audio_data, casting="unsafe")
+        np.multiply(windowed, window, out=windowed)
+
+        # Calculate the FFT of the audio data
+        if FFT_HAS_OUT:
+            np.fft.rfft(windowed, axis=-1, norm=self.norm, out=spectrum)
+        else:
+            spectrum[...] = np.fft.rfft(windowed, axis=-1, norm=self.norm)
+
+        return spectrum[..., self.band_slice]
+
+    # =======================================================================
+    # Function: Returns the window and spectrum buffers, only reallocating when the input shape changes
+    # Input:    Shape of the audio data
+    # Return:   Windowed samples buffer and full rFFT buffer (the row window is rebuilt with them)
+    def _getBuffers(self, shape):
+        if shape[-1] != self.chunk_size:
+            raise ValueError(f"Expected {self.chunk_size} samples per chunk, got {shape[-1]}")
+
+        if self._windowed is None or self._windowed.shape != shape:
+            complex_dtype = np.complex64 if self.dtype == np.float32 else np.complex128
+            self._windowed = np.empty(shape, dtype=self.dtype)
+            self._spectrum = np.empty(shape[:-1] + (self.chunk_size // 2 + 1,), dtype=complex_dtype)
+            self._row_window = np.ascontiguousarray(np.broadcast_to(self.window, shape))
+
+        return self._windowed, self._spectrum
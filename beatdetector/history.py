@@ -0,0 +1,65 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+# ===========================================================================
+# Class:    Fixed size energy history backed by a preallocated (2 * history_len x bands) array
+#           Every row is written twice (at i and i + history_len) so the last history_len rows are always
+#           one contiguous slice in time order. Push is O(1) and window/column views never copy.
+# Input:    Number of chunks kept and the shape of one instant energy row (e.g. TOTAL_SUB_BANDS)
+class EnergyHistory:
+    def __init__(self, history_len, shape, dtype=np.float64):
+        if history_len < 1:
+            raise ValueError("history_len must be at least 1")
+
+        self.history_len = history_len
+        self.shape = (shape,) if isinstance(shape, (int, np.integer)) else tuple(shape)
+        self.count = 0  # Number of valid rows, saturates at history_len
+        self.total_pushed = 0  # Number of rows ever pushed
+        self._next = 0  # Primary slot the next row goes into
+        self._buffer = np.zeros((2 * history_len,) + self.shape, dtype=dtype)
+
+    def __len__(self):
+        return self.count
+
+    # =======================================================================
+    # Function: Slots in the new instant energy, dropping the oldest row once the history is full
+    # Input:    Instant energy for all sub bands
+    # Return:   None
+    def push(self, instant_energy):
+        self._buffer[self._next] = instant_energy
+        self._buffer[self._next + self.history_len] = instant_energy
+
+        self._next = (self._next + 1) % self.history_len
+        self.count = min(self.count + 1, self.history_len)
+        self.total_pushed += 1
+
+    # =======================================================================
+    # Function: Checks if the history has been filled (warm up finished)
+    # Input:    None
+    # Return:   True once history_len rows have been pushed
+    def isFull(self):
+        return self.count == self.history_len
+
+    # =======================================================================
+    # Function: Zero-copy view of the history, oldest row first
+    # Input:    None
+    # Return:   (count x bands) view, only valid until the next push
+    def window(self):
+        return self._buffer[self._next + self.history_len - self.count : self._next + self.history_len]
+
+    # =======================================================================
+    # Function: Zero-copy view of the history of one sub band, oldest first
+    # Input:    Sub band index
+    # Return:   1D strided view, only valid until the next push
+    def column(self, sub_band):
+        return self.window()[:, sub_band]
+
+    # =======================================================================
+    # Function: Zero-copy view of the row the next push will drop
+    # Input:    None
+    # Return:   Oldest row if the history is full, otherwise None
+    def oldest(self):
+        if not self.isFull():
+            return None
+
+        return self._buffer[self._next]
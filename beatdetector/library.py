@@ -0,0 +1,126 @@
+import hashlib  # Stable per track output names
+import json  # Progress log
+import os  # Paths, atomic renames
+import time  # Throughput
+from concurrent.futures import ProcessPoolExecutor, as_completed  # One track per worker process
+
+from beatdetector.offline import analyzeWav
+from beatdetector.timeline import BEAT_TYPES, saveTimeline
+
+
+AUDIO_EXTENSIONS    = (".wav",)
+PROGRESS_FILE       = "progress.jsonl"  # One line per finished track, appended as tracks complete
+
+
+# ===========================================================================
+# Function: Lists the audio files to analyse
+# Input:    A directory (searched recursively) or a manifest file with one path per line (# starts a comment)
+# Return:   Sorted list of absolute paths
+def findTracks(source):
+    if os.path.isdir(source):
+        tracks = [os.path.join(folder, name)
+                  for folder, _, names in os.walk(source)
+                  for name in names if name.lower().endswith(AUDIO_EXTENSIONS)]
+    else:
+        manifest_dir = os.path.dirname(os.path.abspath(source))
+        with open(source, encoding="utf-8") as manifest:
+            lines = [line.strip() for line in manifest]
+        tracks = [os.path.join(manifest_dir, line) for line in lines if line and not line.startswith("#")]
+
+    return sorted(set(os.path.abspath(track) for track in tracks))
+
+
+# ===========================================================================
+# Function: Gives every track its own timeline file, named after the track plus a hash of its full path
+#           so two songs with the same file name in different folders never overwrite each other
+# Input:    Output folder and the track path
+# Return:   Path of the track's .npz timeline
+def getTimelinePath(out_dir, track):
+    name = os.path.splitext(os.path.basename(track))[0]
+    digest = hashlib.sha1(track.encode("utf-8")).hexdigest()[:10]
+
+    return os.path.join(out_dir, f"{name}-{digest}.npz")
+
+
+# ===========================================================================
+# Function: Reads which tracks a previous (possibly crashed) run already finished
+# Input:    Output folder
+# Return:   Set of track paths with a saved timeline
+def loadFinishedTracks(out_dir):
+    finished = set()
+    progress_path = os.path.join(out_dir, PROGRESS_FILE)
+    if not os.path.exists(progress_path):
+        return finished
+
+    with open(progress_path, encoding="utf-8") as progress:
+        for line in progress:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Last line cut off by a crash
+
+            if entry.get("status") == "ok" and os.path.exists(entry["timeline"]):
+                finished.add(entry["track"])
+
+    return finished
+
+
+# ===========================================================================
+# Function: Worker, analyses one track and saves its timeline (written to a temp file and renamed so a crash
+#           never leaves a half written timeline behind)
+# Input:    Track path and where to save its timeline
+# Return:   Progress entry for the track
+def analyzeTrack(track, timeline_path):
+    start_time = time.perf_counter()
+    try:
+        timeline = analyzeWav(track)
+        temp_path = timeline_path + ".tmp"
+        saveTimeline(temp_path, timeline)
+        os.replace(temp_path, timeline_path)
+    except Exception as error:
+        return {"track": track, "status": "error", "error": f"{type(error).__name__}: {error}"}
+
+    entry = {"track": track, "status": "ok", "timeline": timeline_path,
+             "audio_seconds": timeline.total_chunks * timeline.chunk_size / timeline.rate,
+             "elapsed": time.perf_counter() - start_time}
+    for beat_type in BEAT_TYPES:
+        entry[beat_type] = len(getattr(timeline, beat_type))
+
+    return entry
+
+
+# ===========================================================================
+# Function: Analyses every track across a pool of worker processes, skipping the ones a previous run finished
+# Input:    Track paths, output folder, number of workers (None = one per core), callback for each finished entry
+# Return:   Summary dict with counts and throughput (tracks/min, audio hours/min)
+def analyzeLibrary(tracks, out_dir, workers=None, on_entry=None):
+    os.makedirs(out_dir, exist_ok=True)
+    finished = loadFinishedTracks(out_dir)
+    pending = [track for track in tracks if track not in finished]
+
+    summary = {"total": len(tracks), "skipped": len(tracks) - len(pending), "ok": 0, "failed": 0, "audio_seconds": 0.0}
+    start_time = time.perf_counter()
+
+    with open(os.path.join(out_dir, PROGRESS_FILE), "a", encoding="utf-8") as progress:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(analyzeTrack, track, getTimelinePath(out_dir, track)) for track in pending]
+            for future in as_completed(futures):
+                entry = future.result()
+                progress.write(json.dumps(entry) + "\n")
+                progress.flush()
+
+                if entry["status"] == "ok":
+                    summary["ok"] += 1
+                    summary["audio_seconds"] += entry["audio_seconds"]
+                else:
+                    summary["failed"] += 1
+                if on_entry is not None:
+                    on_entry(entry)
+
+    elapsed = time.perf_counter() - start_time
+    minutes = elapsed / 60
+    summary["elapsed"] = elapsed
+    summary["tracks_per_minute"] = summary["ok"] / minutes if minutes > 0 else 0.0
+    summary["audio_hours_per_minute"] = summary["audio_seconds"] / 3600 / minutes if minutes > 0 else 0.0
+
+    return summary
@@ -0,0 +1,102 @@
+# ===========================================================================
+# Light envelopes, same fade as the C++ Beat_Tracking GUI: every redraw multiplies the color by the decay rate
+FRAME_MS            = 13  # Redraw every ~13ms like the WM_TIMER of the C++ GUI
+
+BLACK               = "#000000"
+
+
+# ===========================================================================
+# Function: Converts a "#RRGGBB" color to a list of ints
+# Input:    Hex color string
+# Return:   [red, green, blue]
+def hexToRgb(color):
+    return [int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)]
+
+
+# ===========================================================================
+# Function: Converts red, green, blue values to a "#RRGGBB" color
+# Input:    [red, green, blue] (floats are truncated like the C++ int color)
+# Return:   Hex color string
+def rgbToHex(rgb):
+    return "#{:02X}{:02X}{:02X}".format(*(min(255, max(0, int(value))) for value in rgb))
+
+
+# ===========================================================================
+# Class:    Non-blocking flash/fade scheduler on top of Tk's after() timer
+#           The detection side only calls flash(), which swaps in a new envelope and returns straight away
+#           (safe to call from the audio thread). A redraw every FRAME_MS on the Tk thread decays the current
+#           envelope and calls paint(color, flash_color) only when the visible color changes, so the UI never
+#           blocks detection and detection never waits for a redraw.
+# Input:    Any Tk widget (for after()), paint callback run on the Tk thread, redraw interval in ms
+class FlashEngine:
+    def __init__(self, widget, paint, frame_ms=FRAME_MS):
+        self.widget = widget
+        self.paint = paint
+        self.frame_ms = frame_ms
+
+        self.frames = 0  # Redraws since the current envelope started
+        self.flash_color = BLACK  # Color the current envelope started at
+        self._rgb = [0.0, 0.0, 0.0]
+        self._decay = 0.0
+        self._pending = None  # Envelope queued by flash(), picked up on the next redraw
+        self._painted = None
+        self._timer = None
+
+    # =======================================================================
+    # Function: Queues a flash that starts at color and fades by decay every redraw
+    # Input:    Hex color, decay rate per redraw (0.45 fast .. 0.92 slow),
+    #           redraws the current envelope must have run before this one may replace it (C++ redrawCounter > 3)
+    # Return:   True if the flash was queued
+    def flash(self, color, decay, min_frames=0):
+        if min_frames > 0 and (self._pending is not None or self.frames < min_frames):
+            return False
+
+        self._pending = (color, decay)
+        return True
+
+    # =======================================================================
+    # Function: Starts the redraw timer
+    # Input:    None
+    # Return:   None
+    def start(self):
+        if self._timer is None:
+            self._timer = self.widget.after(self.frame_ms, self._redraw)
+
+    # =======================================================================
+    # Function: Stops the redraw timer and goes dark
+    # Input:    None
+    # Return:   None
+    def stop(self):
+        if self._timer is not None:
+            self.widget.after_cancel(self._timer)
+            self._timer = None
+        self._pending = None
+        self._rgb = [0.0, 0.0, 0.0]
+        self._show()
+
+    # =======================================================================
+    # Function: One redraw, picks up a queued flash or decays the current one (runs on the Tk thread)
+    # Input:    None
+    # Return:   None
+    def _redraw(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            self.flash_color, self._decay = pending
+            self._rgb = hexToRgb(self.flash_color)
+            self.frames = 0
+
+        self._rgb = [value * self._decay for value in self._rgb]
+        self.frames += 1
+        self._show()
+
+        self._timer = self.widget.after(self.frame_ms, self._redraw)
+
+    # =======================================================================
+    # Function: Paints the current color if it changed since the last redraw
+    # Input:    None
+    # Return:   None
+    def _show(self):
+        color = rgbToHex(self._rgb)
+        if color != self._painted:
+            self._painted = color
+            self.paint(color, self.flash_color)
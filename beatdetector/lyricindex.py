@@ -0,0 +1,190 @@
+import json  # The index file
+import os  # Atomic renames
+import threading  # Rate limiter shared by the workers
+import time  # Rate limiting, checkpoints and throughput
+from concurrent.futures import ThreadPoolExecutor, as_completed  # Network bound, threads are enough
+
+from beatdetector.lyrics import SYNCED_LINE, normalizeKey
+
+
+INDEX_VERSION       = 1
+CHECKPOINT_SECONDS  = 10  # The index is rewritten at most this often while indexing (and once at the end)
+
+# What a provider had for a song
+SYNCED              = "synced"
+PLAIN               = "plain"  # Lyrics without time stamps, no use for Lyric_Room
+MISSING             = "none"
+FAILED              = "error"  # Network error, the song is checked again on the next run
+
+
+# ===========================================================================
+# Class:    Token bucket rate limiter, safe to share between threads
+# Input:    Requests per second, requests that can go out back to back
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    # =======================================================================
+    # Function: Blocks until a request may go out
+    # Input:    None
+    # Return:   None
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ===========================================================================
+# Function: Reads the songs to index
+# Input:    Text file with one "ARTIST_NAMES - SONG_NAME" per line (getUserTracks.py output)
+# Return:   List of (artist names, song name), duplicates removed, in file order
+def readSongs(path):
+    songs = []
+    seen = set()
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if " - " not in line:
+                continue
+            artists, song_name = line.strip("\n").split(" - ", 1)
+            key = getSongKey(artists, song_name)
+            if key not in seen:
+                seen.add(key)
+                songs.append((artists, song_name))
+
+    return songs
+
+
+# ===========================================================================
+# Function: Index key of a song, the same normalization the lyrics cache uses
+# Input:    Artist names and song name
+# Return:   Key string
+def getSongKey(artists, song_name):
+    return normalizeKey(artists) + " - " + normalizeKey(song_name)
+
+
+# ===========================================================================
+# Function: Loads the index a previous (possibly interrupted) run wrote
+# Input:    Index path
+# Return:   Index dict ({"version", "providers", "songs": {key: entry}}), empty if there is none yet
+def loadIndex(path):
+    if not os.path.exists(path):
+        return {"version": INDEX_VERSION, "providers": [], "songs": {}}
+
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+# ===========================================================================
+# Function: Writes the index to a temp file and renames it, so a crash never leaves a half written index
+# Input:    Index path and index dict
+# Return:   None
+def saveIndex(path, index):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(index, file, ensure_ascii=False, indent=1)
+    os.replace(temp_path, path)
+
+
+# ===========================================================================
+# Function: Worker, asks every provider for one song (each provider through its own rate limiter)
+# Input:    search(artists, song_name, provider) returning LRC text or None, providers in priority order,
+#           rate limiter per provider, artist names, song name
+# Return:   (index entry, best synced LRC or None)
+def checkSong(search, providers, limiters, artists, song_name):
+    statuses = {}
+    best_lrc = None
+    for provider in providers:
+        limiters[provider].acquire()
+        try:
+            lrc = search(artists, song_name, provider)
+        except Exception:
+            statuses[provider] = FAILED
+            continue
+
+        if lrc and SYNCED_LINE.search(lrc):
+            statuses[provider] = SYNCED
+            if best_lrc is None:
+                best_lrc = lrc
+        elif lrc:
+            statuses[provider] = PLAIN
+        else:
+            statuses[provider] = MISSING
+
+    best = next((provider for provider in providers if statuses[provider] == SYNCED), None)
+    entry = {"artists": artists, "song": song_name, "providers": statuses, "best": best, "checked_at": time.time()}
+
+    return entry, best_lrc
+
+
+# ===========================================================================
+# Function: Checks whether an index entry is finished (every provider answered)
+# Input:    Index entry, providers
+# Return:   True if the song does not need checking again
+def isIndexed(entry, providers):
+    return entry is not None and all(entry["providers"].get(provider) not in (None, FAILED) for provider in providers)
+
+
+# ===========================================================================
+# Function: Classifies the lyrics of every song for every provider on a pool of threads
+#           Songs a previous run finished are skipped, songs with provider errors are checked again.
+#           The index is checkpointed atomically every CHECKPOINT_SECONDS and at the end (also on Ctrl+C).
+#           Synced lyrics found (and songs nobody has lyrics for) go into the lyrics cache too if one is given.
+# Input:    Songs [(artists, song name)], search(artists, song_name, provider), providers in priority order,
+#           index path, number of threads, requests per second per provider, LyricsCache or None,
+#           callback for each finished entry
+# Return:   Summary dict with counts per provider and throughput (songs/min)
+def indexLibrary(songs, search, providers, index_path, workers=16, rate=4.0, cache=None, on_entry=None):
+    index = loadIndex(index_path)
+    index["version"] = INDEX_VERSION
+    index["providers"] = list(providers)
+    pending = [(artists, song_name) for artists, song_name in songs
+               if not isIndexed(index["songs"].get(getSongKey(artists, song_name)), providers)]
+    limiters = {provider: RateLimiter(rate) for provider in providers}
+
+    summary = {"total": len(songs), "skipped": len(songs) - len(pending), "indexed": 0, "with_lyrics": 0,
+               "failed": 0, "synced": {provider: 0 for provider in providers}}
+    start_time = time.perf_counter()
+    last_checkpoint = start_time
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(checkSong, search, providers, limiters, artists, song_name) for artists, song_name in pending]
+        for future in as_completed(futures):
+            entry, best_lrc = future.result()
+            index["songs"][getSongKey(entry["artists"], entry["song"])] = entry
+
+            summary["indexed"] += 1
+            summary["with_lyrics"] += entry["best"] is not None
+            summary["failed"] += not isIndexed(entry, providers)
+            for provider in providers:
+                summary["synced"][provider] += entry["providers"][provider] == SYNCED
+
+            if cache is not None and (best_lrc is not None or isIndexed(entry, providers)):
+                cache.put(entry["artists"], entry["song"], best_lrc)
+            if on_entry is not None:
+                on_entry(entry)
+
+            if time.perf_counter() - last_checkpoint > CHECKPOINT_SECONDS:
+                saveIndex(index_path, index)
+                last_checkpoint = time.perf_counter()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        saveIndex(index_path, index)
+
+    elapsed = time.perf_counter() - start_time
+    minutes = elapsed / 60
+    summary["elapsed"] = elapsed
+    summary["songs_per_minute"] = summary["indexed"] / minutes if minutes > 0 else 0.0
+
+    return summary
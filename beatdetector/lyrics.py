@@ -0,0 +1,444 @@
+import bisect  # Word lookup in the lyric timeline
+import json  # Parsed lyrics in the cache
+import re  # Telling synced from plain lyrics
+import sqlite3  # On-disk lyrics cache
+import threading  # One connection shared by the detection and prefetch threads
+import time  # Last use and negative entry expiry
+import unicodedata  # Normalizing cache keys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor  # Prefetching lyrics of the upcoming songs, racing the providers
+
+from beatdetector.detector import CHUNK_SIZE, RATE
+
+
+LYRICS_CACHE_PATH   = "lyrics_cache.db"
+CACHE_MAX_BYTES     = 64 * 1024 * 1024  # Least recently used songs are dropped past this much lyrics
+NEGATIVE_TTL        = 7 * 24 * 60 * 60  # Seconds a "no lyrics found" is trusted before searching again
+
+LAST_LINE_CHUNKS    = 50  # The last line has no next time stamp, its words are spread over this many chunks
+
+PROVIDER_TIMEOUT    = 6.0  # Seconds each provider gets to answer, they all run at once
+
+PREFETCH_DEPTH      = 5  # Upcoming songs to fetch lyrics for
+PREFETCH_WORKERS    = 2  # Searches running at once
+
+
+# A line of synced lyrics starts with a [mm:ss.xx] time stamp
+SYNCED_LINE = re.compile(r"^\[\d\d:\d\d\.\d\d\]", re.MULTILINE)
+
+# Time stamp at the start of one line, [mm:ss.xx] (minutes and fraction of any length)
+TIME_STAMP = re.compile(r"\[(\d+):(\d\d(?:\.\d+)?)\]")
+
+# Every word prefix of a song in time order: starts[i] is the chunk (counted from the start of the song) texts[i]
+# shows from, until the next start
+LyricTimeline = namedtuple("LyricTimeline", ["starts", "texts"])
+
+# Lyrics of one song from the cache. lrc is None when no provider had lyrics, times/lines are parseLyrics output
+CachedLyrics = namedtuple("CachedLyrics", ["lrc", "times", "lines"])
+
+
+# ===========================================================================
+# Function: Given a string, remove the () brakcets and its contents
+# Input:    The string with the brackets
+# Return:   The string without the brackets
+def removeBrackets(input_string):
+    if input_string == "":
+        return input_string
+    
+    result = []
+    open_brackets_count = 0
+    brackets_count = 0
+    brackets_index = []
+
+    if input_string[0] == '(' and input_string[-1] == ')':
+        return input_string[1:-1]
+    
+    if input_string[0] == '[' and input_string[-1] == ']':
+        return input_string[1:-1]
+    
+    for index, char in enumerate(input_string):
+        if char == '(' or char == ')':
+            brackets_index.append(index)
+            brackets_count += 1
+    
+    if brackets_count == 0:
+        return input_string
+    elif brackets_count == 1:
+        for char in input_string:
+            if char != '(' and char != ')':
+                result.append(char)
+    else:
+        for char in input_string:
+            if char == '(':
+                open_brackets_count += 1
+            elif char == ')':
+                open_brackets_count = max(0, open_brackets_count - 1)
+            elif open_brackets_count == 0:
+                result.append(char)
+
+    return ''.join(result)
+
+
+# ===========================================================================
+# Function: Parse the lyrics of the song
+#           Lines without a time stamp (blank lines, [ar:...]/[ti:...] tags) are skipped
+# Input:    The big string with the time stamps and the lyrics, sample rate and chunk size the times are counted in
+# Return:   The time stamps in chunks and the lines by lines lyrics
+def parseLyrics(lrc, rate=RATE, chunk_size=CHUNK_SIZE):
+    all_text = lrc.split("\n")
+    all_lines = []
+    time_stamps = []
+    chunk_in_ms = (chunk_size / rate) * 1000
+
+    # Split the time and the line
+    for text in all_text:
+        time_stamp = TIME_STAMP.match(text)
+        if time_stamp is None:
+            continue
+
+        line = removeBrackets(text[time_stamp.end():].rstrip("\r"))
+        minutes = int(time_stamp.group(1))
+        seconds = float(time_stamp.group(2))
+        time_stamps.append(round((minutes * 60 * 1000 + seconds * 1000) / chunk_in_ms))
+        all_lines.append(line)
+    
+    return time_stamps, all_lines
+
+
+# ===========================================================================
+# Function: Given a line, calculate the time for each word
+# Input:    The line and the chunks for the line
+# Return:   The line with the time for each word
+def timeWords(line, chunks_for_line):
+    words = line.split(" ")
+    char_sum = 0
+    timed_line = []
+    total_chunks = 0
+    total_words = ""
+    for i in range(len(words)):
+        char_sum += len(words[i])
+    if char_sum == 0:
+        timed_line.append([" ", chunks_for_line])
+    else:
+        for i in range(len(words)):
+            total_chunks += int((len(words[i]) / char_sum) * chunks_for_line)
+            if i == len(words) - 1:
+                total_words += words[i]
+            else:
+                total_words += words[i] + " "
+            timed_line.append([total_words, total_chunks])
+    return timed_line
+
+
+# ===========================================================================
+# Function: Precompiles the word by word display of a song, the same timing timeWords gives line by line
+#           Word prefix k of a line shows from the line start plus the chunks of words 0 to k - 1.
+#           Words that get no chunks are left out, the display jumps straight past them like before.
+# Input:    The time stamps in chunks and the lines (parseLyrics output)
+# Return:   LyricTimeline
+def makeWordTimeline(times, lines):
+    starts = []
+    texts = []
+    for i in range(min(len(times), len(lines))):
+        next_time = times[i + 1] if i + 1 < len(times) else times[i] + LAST_LINE_CHUNKS
+        word_start = times[i]
+        for text, word_end in timeWords(lines[i], next_time - times[i]):
+            if starts and starts[-1] == word_start:
+                texts[-1] = text  # The previous prefix got no chunks
+            else:
+                starts.append(word_start)
+                texts.append(text)
+            word_start = times[i] + word_end
+
+    return LyricTimeline(starts, texts)
+
+
+# ===========================================================================
+# Function: Finds the word prefix to show, O(log n) so seeking or joining a song late costs nothing
+# Input:    LyricTimeline, chunks since the start of the song
+# Return:   Index into the timeline, -1 before the first line
+def getLyricIndex(timeline, lyrics_chunks):
+    return bisect.bisect_right(timeline.starts, lyrics_chunks) - 1
+
+
+# ===========================================================================
+# Function: Asks every provider at once and returns the first synced lyrics in priority order
+#           A provider's answer is used as soon as every provider before it has come back empty, so the worst case
+#           is one timeout instead of the sum of all of them. Providers still running when the result is known are
+#           abandoned (they finish on the executor in the background and are ignored), ones not started are cancelled.
+#           The executor belongs to the caller and is shared by every race, so abandoned searches never pile up threads.
+# Input:    search(provider) returning LRC text or None, providers in priority order, ThreadPoolExecutor to run them on,
+#           seconds each provider gets
+# Return:   LRC text, None if every provider answered without synced lyrics
+#           Raises TimeoutError if none had lyrics and at least one timed out or failed (so it is not cached as missing)
+def raceProviders(search, providers, executor, timeout=PROVIDER_TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    futures = [executor.submit(search, provider) for provider in providers]
+    try:
+        unanswered = []
+        for provider, future in zip(providers, futures):
+            try:
+                lrc = future.result(timeout=max(0, deadline - time.perf_counter()))
+            except Exception:  # Out of time, or a network error inside the provider
+                unanswered.append(provider)
+                continue
+
+            if lrc and SYNCED_LINE.search(lrc):
+                return lrc
+    finally:
+        for future in futures:
+            future.cancel()
+
+    if unanswered:
+        raise TimeoutError(f"No lyrics found and no answer from {', '.join(unanswered)}")
+
+    return None
+
+
+# ===========================================================================
+# Function: Normalizes an artist or title for the cache key (unicode form, case and whitespace do not matter)
+# Input:    Artist or title
+# Return:   Normalized string
+def normalizeKey(text):
+    return " ".join(unicodedata.normalize("NFKC", text or "").casefold().split())
+
+
+# ===========================================================================
+# Class:    On-disk synced lyrics cache keyed by normalized (artist, title), in one SQLite file
+#           Keeps the raw LRC and its parseLyrics output, so a hit is one indexed lookup and a json decode.
+#           Songs without lyrics are cached too (counted as the size of their key) and searched again after
+#           negative_ttl seconds. Once the cache passes max_bytes the expired "no lyrics" entries are deleted,
+#           then the least recently used songs are dropped.
+#           Safe to share between threads.
+# Input:    Cache file path, sample rate and chunk size the parsed times are counted in, size cap in bytes,
+#           seconds a "no lyrics found" is kept
+class LyricsCache:
+    def __init__(self, path=LYRICS_CACHE_PATH, rate=RATE, chunk_size=CHUNK_SIZE, max_bytes=CACHE_MAX_BYTES,
+                 negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS lyrics (artist TEXT, title TEXT, lrc TEXT, parsed TEXT, "
+                                 "rate INTEGER, chunk_size INTEGER, size INTEGER, stored_at REAL, last_used REAL, "
+                                 "PRIMARY KEY (artist, title))")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS lyrics_last_used ON lyrics (last_used)")
+        self._total_bytes = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM lyrics").fetchone()[0]
+
+    # =======================================================================
+    # Function: Looks up the lyrics of a song
+    # Input:    Artist names and song name as Spotify gives them
+    # Return:   CachedLyrics (lrc None = known to have no lyrics), None if the song is not cached or its
+    #           "no lyrics found" expired
+    def get(self, artist, title):
+        key = (normalizeKey(artist), normalizeKey(title))
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT lrc, parsed, rate, chunk_size, stored_at FROM lyrics "
+                                           "WHERE artist = ? AND title = ?", key).fetchone()
+            if row is None or (row[0] is None and now - row[4] > self.negative_ttl):
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE lyrics SET last_used = ? WHERE artist = ? AND title = ?", (now,) + key)
+            self.hits += 1
+
+        lrc, parsed, rate, chunk_size, _ = row
+        if lrc is None:
+            return CachedLyrics(None, [], [])
+        if (rate, chunk_size) != (self.rate, self.chunk_size):
+            return self.put(artist, title, lrc)  # Cached by a front end with other chunk timing
+
+        times, lines = json.loads(parsed)
+        return CachedLyrics(lrc, times, lines)
+
+    # =======================================================================
+    # Function: Stores the lyrics of a song (or that it has none) and drops old songs past the size cap
+    # Input:    Artist names, song name, LRC text from syncedlyrics (None or "" = no lyrics found)
+    # Return:   CachedLyrics of what was stored
+    def put(self, artist, title, lrc):
+        key = (normalizeKey(artist), normalizeKey(title))
+        now = time.time()
+        if lrc:
+            times, lines = parseLyrics(lrc, self.rate, self.chunk_size)
+            parsed = json.dumps([times, lines])
+            size = len(lrc.encode("utf-8")) + len(parsed.encode("utf-8"))
+        else:
+            lrc, parsed, times, lines = None, None, [], []
+            size = len(key[0].encode("utf-8")) + len(key[1].encode("utf-8"))
+
+        with self._lock:
+            old_size = self._connection.execute("SELECT size FROM lyrics WHERE artist = ? AND title = ?", key).fetchone()
+            self._connection.execute("INSERT OR REPLACE INTO lyrics VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                     key + (lrc, parsed, self.rate, self.chunk_size, size, now, now))
+            self._total_bytes += size - (old_size[0] if old_size else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+        return CachedLyrics(lrc, times, lines)
+
+    # =======================================================================
+    # Function: Deletes the expired "no lyrics" entries, then drops the least recently used songs until the cache
+    #           fits in max_bytes (lock held by the caller)
+    # Input:    None
+    # Return:   None
+    def _evict(self):
+        expired = time.time() - self.negative_ttl
+        self._total_bytes -= self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM lyrics "
+                                                      "WHERE lrc IS NULL AND stored_at < ?", (expired,)).fetchone()[0]
+        self._connection.execute("DELETE FROM lyrics WHERE lrc IS NULL AND stored_at < ?", (expired,))
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        rows = self._connection.execute("SELECT artist, title, size FROM lyrics ORDER BY last_used")
+        dropped = []
+        for artist, title, size in rows:
+            if self._total_bytes <= self.max_bytes:
+                break
+            dropped.append((artist, title))
+            self._total_bytes -= size
+
+        self._connection.executemany("DELETE FROM lyrics WHERE artist = ? AND title = ?", dropped)
+
+    # =======================================================================
+    # Function: Closes the cache file
+    # Input:    None
+    # Return:   None
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# ===========================================================================
+# Class:    Fetches the lyrics of upcoming songs into the cache ahead of time on a small thread pool
+#           refresh() looks up the upcoming songs (queue or playlist) on its own thread, then searches up to depth
+#           of them that the cache does not have on the pool. Searches for songs that dropped out of the upcoming list (the user
+#           skipped around) are cancelled if they have not started, ones already running still fill the cache.
+#           getLyrics() finds the lyrics of the song that just started: cache hit, else waits for a running prefetch
+#           of the song, else searches right away. requestLyrics() runs the same lookup on a thread of its own and
+#           returns a Future at once, so a front end's audio loop never waits on the network or the cache.
+# Input:    LyricsCache, search(artist_names, song_name) returning LRC text or None,
+#           upcoming() returning [(artist_names, song_name), ...] in play order, songs to look ahead, threads
+class LyricsPrefetcher:
+    def __init__(self, cache, search, upcoming, depth=PREFETCH_DEPTH, workers=PREFETCH_WORKERS):
+        self.cache = cache
+        self.search = search
+        self.upcoming = upcoming
+        self.depth = depth
+        self.prefetched = 0
+        self.cancelled = 0
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._look_ahead = ThreadPoolExecutor(max_workers=1)  # Never queued behind the searches it may cancel
+        self._current = ThreadPoolExecutor(max_workers=1)  # Lookups of the song that is playing now
+        self._request = None  # Future of the last requestLyrics lookup
+        self._lock = threading.Lock()
+        self._pending = {}  # Normalized (artist, title) -> Future of its search
+
+    # =======================================================================
+    # Function: Looks ahead again, call on every song change (returns at once)
+    # Input:    None
+    # Return:   None
+    def refresh(self):
+        self._look_ahead.submit(self._refresh)
+
+    # =======================================================================
+    # Function: Starts looking up the lyrics of the song that just started without waiting for them (returns at once)
+    #           Even the cache lookup runs on the lookup thread, so the caller never waits on SQLite or its lock.
+    #           The lookup of the previous song is cancelled if it has not started, so skipping through songs
+    #           never queues up searches.
+    # Input:    Artist names and song name
+    # Return:   Future of the CachedLyrics, poll done() every chunk
+    def requestLyrics(self, artist, title):
+        if self._request is not None:
+            self._request.cancel()
+
+        self._request = self._current.submit(self.getLyrics, artist, title)
+
+        return self._request
+
+    # =======================================================================
+    # Function: Lyrics of the song that just started (blocks until they are found, use requestLyrics on the audio thread)
+    # Input:    Artist names and song name
+    # Return:   CachedLyrics
+    def getLyrics(self, artist, title):
+        lyrics = self.cache.get(artist, title)
+        if lyrics is not None:
+            return lyrics
+
+        with self._lock:
+            future = self._pending.get((normalizeKey(artist), normalizeKey(title)))
+        # A prefetch still waiting for a thread is cancelled and searched here instead of queueing behind the others
+        if future is not None and not future.cancel():
+            try:
+                lyrics = future.result()
+            except Exception:
+                lyrics = None  # The prefetch failed, search again below
+            if lyrics is not None:
+                return lyrics
+
+        try:
+            lrc = self.search(artist, title)
+        except Exception:
+            return CachedLyrics(None, [], [])  # Providers down or too slow, not cached so the next play tries again
+
+        return self._store(artist, title, lrc)
+
+    # =======================================================================
+    # Function: Stops the threads, searches that have not started are dropped
+    # Input:    None
+    # Return:   None
+    def close(self):
+        self._look_ahead.shutdown(wait=False, cancel_futures=True)
+        self._current.shutdown(wait=False, cancel_futures=True)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # =======================================================================
+    # Function: Look ahead task, cancels the searches nobody needs any more and starts the new ones
+    # Input:    None
+    # Return:   None
+    def _refresh(self):
+        upcoming = self.upcoming()[:self.depth]
+        wanted = {(normalizeKey(artist), normalizeKey(title)): (artist, title) for artist, title in upcoming}
+
+        with self._lock:
+            for key in list(self._pending):
+                future = self._pending[key]
+                if future.done():
+                    del self._pending[key]
+                elif key not in wanted and future.cancel():
+                    self.cancelled += 1
+                    del self._pending[key]
+
+            for key, (artist, title) in wanted.items():
+                if key not in self._pending and self.cache.get(artist, title) is None:
+                    self._pending[key] = self._executor.submit(self._prefetch, artist, title)
+
+    # =======================================================================
+    # Function: Pool task, searches one song and stores it in the cache
+    # Input:    Artist names and song name
+    # Return:   CachedLyrics
+    def _prefetch(self, artist, title):
+        lyrics = self._store(artist, title, self.search(artist, title))
+        self.prefetched += 1
+
+        return lyrics
+
+    # =======================================================================
+    # Function: Parses and caches the lyrics of a song, lyrics that cannot be parsed are cached as missing
+    #           so the Future a front end reads never raises
+    # Input:    Artist names, song name, LRC text (None = no lyrics found)
+    # Return:   CachedLyrics
+    def _store(self, artist, title, lrc):
+        try:
+            return self.cache.put(artist, title, lrc)
+        except (ValueError, IndexError):
+            return self.cache.put(artist, title, None)
@@ -0,0 +1,190 @@
+import threading  # The poller runs on its own thread
+import time  # Poll timing and progress extrapolation
+from collections import namedtuple
+
+
+# Poll timing, in seconds
+MIN_INTERVAL        = 0.5  # Right after a change (new song, pause, seek)
+MAX_INTERVAL        = 2.0  # Interval grows towards this while nothing changes
+INTERVAL_GROWTH     = 1.5
+PAUSED_INTERVAL     = 3.0  # Nothing playing
+TRACK_END_MARGIN    = 0.25  # Poll this long after the current song should end so the next one shows up at once
+MAX_BACKOFF         = 30.0  # Longest wait between retries after errors
+SEEK_TOLERANCE_MS   = 1500  # Progress this far from the extrapolated progress counts as a seek
+PLAYLIST_PAGE       = 100  # Playlist items per request when looking ahead in a playlist
+STOP_TIMEOUT        = 5.0  # Seconds stop() waits for a request in flight to finish
+
+
+# Latest playback state. fetched_at is the time.perf_counter() the request returned, progress_ms is the progress then
+PlaybackState = namedtuple("PlaybackState", ["song_name", "artist_names", "track_id", "is_playing", "progress_ms",
+                                             "duration_ms", "fetched_at", "errors"])
+
+NOT_PLAYING = PlaybackState(None, None, None, False, 0, 0, 0.0, 0)
+
+
+# ===========================================================================
+# Function: Turns a spotipy current_playback() reply into a PlaybackState
+# Input:    Reply (None when nothing is playing), time.perf_counter() when it returned
+# Return:   PlaybackState, NOT_PLAYING fields when nothing is playing
+def makePlaybackState(currently_playing, fetched_at):
+    if not currently_playing or not currently_playing.get('is_playing') or not currently_playing.get('item'):
+        return NOT_PLAYING._replace(fetched_at=fetched_at)
+
+    item = currently_playing['item']
+    artist_names = ', '.join([artist['name'] for artist in item['artists']])
+    return PlaybackState(item['name'], artist_names, item.get('id'), True, currently_playing.get('progress_ms') or 0,
+                         item.get('duration_ms') or 0, fetched_at, 0)
+
+
+# ===========================================================================
+# Function: Extrapolates how far into the song playback is now
+# Input:    PlaybackState, time.perf_counter() to extrapolate to (None = now)
+# Return:   Progress in ms
+def getProgressMs(state, now=None):
+    if not state.is_playing:
+        return state.progress_ms
+
+    now = time.perf_counter() if now is None else now
+    return state.progress_ms + (now - state.fetched_at) * 1000
+
+
+# ===========================================================================
+# Function: Lists the songs that will play next, from the player queue or else from the playlist being played
+# Input:    Spotify client, number of songs wanted
+# Return:   [(artist names, song name), ...] in play order
+def getUpcomingTracks(sp, depth):
+    items = (sp.queue() or {}).get('queue') or []
+    if not items:
+        items = getPlaylistUpcoming(sp, depth)
+
+    upcoming = []
+    for item in items:
+        if item and item.get('type', 'track') == 'track' and item.get('name'):
+            upcoming.append((', '.join([artist['name'] for artist in item['artists']]), item['name']))
+        if len(upcoming) == depth:
+            break
+
+    return upcoming
+
+
+# ===========================================================================
+# Function: Lists the tracks after the current one in the playlist being played
+# Input:    Spotify client, number of tracks wanted
+# Return:   List of track objects, empty when not playing from a playlist
+def getPlaylistUpcoming(sp, depth):
+    currently_playing = sp.current_playback()
+    if not currently_playing or not currently_playing.get('item'):
+        return []
+    context = currently_playing.get('context') or {}
+    if context.get('type') != 'playlist':
+        return []
+
+    track_id = currently_playing['item'].get('id')
+    tracks = []
+    found = False
+    page = sp.playlist_items(context['uri'], limit=PLAYLIST_PAGE, additional_types=('track',))
+    while page:
+        for entry in page['items']:
+            track = entry.get('track')
+            if found and track:
+                tracks.append(track)
+            elif track and track.get('id') == track_id:
+                found = True
+        if len(tracks) >= depth or not page.get('next'):
+            break
+        page = sp.next(page)
+
+    return tracks
+
+
+# ===========================================================================
+# Class:    Background Spotify now-playing poller
+#           A daemon thread calls sp.current_playback() and publishes the result as one immutable PlaybackState.
+#           Publishing is a single attribute assignment, so the audio loop reads the latest state in O(1)
+#           without a lock and an HTTP stall can only make the state older, never block the loop.
+#           The interval starts at MIN_INTERVAL after a change and grows to MAX_INTERVAL while nothing changes,
+#           is cut short to catch the end of the current song, is PAUSED_INTERVAL while nothing plays and
+#           backs off exponentially (up to MAX_BACKOFF) while requests fail.
+# Input:    Spotify client (anything with current_playback()), interval limits in seconds
+class NowPlayingPoller:
+    def __init__(self, sp, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, paused_interval=PAUSED_INTERVAL,
+                 max_backoff=MAX_BACKOFF):
+        self.sp = sp
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.paused_interval = paused_interval
+        self.max_backoff = max_backoff
+
+        self.state = NOT_PLAYING
+        self.polls = 0
+        self.last_error = None
+        self._interval = min_interval
+        self._stop = None  # Event of the running thread, every thread gets its own so a stopped one never restarts
+        self._thread = None
+
+    # =======================================================================
+    # Function: Starts polling on a daemon thread
+    # Input:    None
+    # Return:   None
+    def start(self):
+        if self._thread is None:
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True)
+            self._thread.start()
+
+    # =======================================================================
+    # Function: Stops polling, waits up to timeout for a request in flight to finish and the thread to exit
+    # Input:    Seconds to wait
+    # Return:   None
+    def stop(self, timeout=STOP_TIMEOUT):
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    # =======================================================================
+    # Function: Polls once and publishes the new state
+    # Input:    None
+    # Return:   Seconds to wait before the next poll
+    def poll(self):
+        self.polls += 1
+        try:
+            currently_playing = self.sp.current_playback()
+        except Exception as e:  # spotipy/requests errors, timeouts, expired tokens
+            self.last_error = e
+            errors = self.state.errors + 1
+            self.state = self.state._replace(errors=errors)
+            return min(self.max_backoff, self.min_interval * 2 ** errors)
+
+        new_state = makePlaybackState(currently_playing, time.perf_counter())
+        self._interval = self._getInterval(self.state, new_state)
+        self.state = new_state
+
+        if not new_state.is_playing:
+            return self.paused_interval
+        if new_state.duration_ms:
+            remaining = (new_state.duration_ms - new_state.progress_ms) / 1000 + TRACK_END_MARGIN
+            return max(self.min_interval / 2, min(self._interval, remaining))
+        return self._interval
+
+    # =======================================================================
+    # Function: Resets the interval on a change (new song, pause/resume, seek) and grows it otherwise
+    # Input:    Previous and new PlaybackState
+    # Return:   Interval in seconds
+    def _getInterval(self, old_state, new_state):
+        changed = (old_state.track_id != new_state.track_id or old_state.is_playing != new_state.is_playing
+                   or abs(getProgressMs(old_state, new_state.fetched_at) - new_state.progress_ms) > SEEK_TOLERANCE_MS)
+        if changed:
+            return self.min_interval
+
+        return min(self.max_interval, self._interval * INTERVAL_GROWTH)
+
+    # =======================================================================
+    # Function: Poller thread
+    # Input:    Event that stops this thread
+    # Return:   None
+    def _run(self, stop):
+        while not stop.is_set():
+            stop.wait(self.poll())
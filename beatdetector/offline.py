@@ -0,0 +1,94 @@
+import struct  # Reading the RIFF chunk headers
+import wave  # Reading the .wav format
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector.detector import CHUNK_SIZE, CLAP_RANGE_LOW, HIHAT_RANGE_LOW, HISTORY_SECONDS, TOTAL_SUB_BANDS, Detector
+from beatdetector.timeline import makeTimeline
+
+
+# Chunks pushed through the batched FFT at once, bounds the memory of the window/spectrum buffers (~33 MB)
+BATCH_CHUNKS        = 1024
+
+
+# ===========================================================================
+# Function: Finds where the sample data starts in a RIFF/WAVE file
+# Input:    Path of the .wav file
+# Return:   Byte offset and size of the data chunk
+def findDataChunk(path):
+    with open(path, "rb") as file:
+        riff, riff_size, wave_id = struct.unpack("<4sI4s", file.read(12))
+        if riff != b"RIFF" or wave_id != b"WAVE":
+            raise ValueError(f"{path} is not a RIFF/WAVE file")
+
+        while True:
+            header = file.read(8)
+            if len(header) < 8:
+                raise ValueError(f"{path} has no data chunk")
+
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+            if chunk_id == b"data":
+                return file.tell(), chunk_size
+
+            file.seek(chunk_size + (chunk_size & 1), 1)  # Chunks are padded to an even size
+
+
+# ===========================================================================
+# Function: Memory maps the samples of a 16 bit PCM .wav file (nothing is read until it is used)
+# Input:    Path of the .wav file
+# Return:   Sample rate and a read only (frames x channels) int16 memmap
+def openWav(path):
+    with wave.open(path, "rb") as wav_file:
+        channels = wav_file.getnchannels()
+        sample_width = wav_file.getsampwidth()
+        rate = wav_file.getframerate()
+        total_frames = wav_file.getnframes()
+
+    if sample_width != 2:
+        raise ValueError(f"Only 16 bit PCM .wav files are supported, {path} has {sample_width * 8} bit samples")
+
+    offset, size = findDataChunk(path)
+    total_frames = min(total_frames, size // (sample_width * channels))
+
+    return rate, np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(total_frames, channels))
+
+
+# ===========================================================================
+# Function: Frames one channel of the samples into consecutive CHUNK_SIZE chunks, a strided view with no copy
+# Input:    (frames x channels) samples, chunk size, channel to analyse (0 is left like the live loop)
+# Return:   (chunks x chunk_size) view, the partial chunk at the end is dropped
+def frameChannel(samples, chunk_size, channel=0):
+    total_chunks = len(samples) // chunk_size
+    return samples[:total_chunks * chunk_size].reshape(total_chunks, chunk_size, samples.shape[1])[:, :, channel]
+
+
+# ===========================================================================
+# Function: Computes the sub band energies of every chunk with batched rFFTs
+# Input:    Detector (for its FFT front end and band energy engine), (chunks x chunk_size) frames
+# Return:   (chunks x sub bands) instant energies
+def getAllInstantEnergies(detector, frames):
+    instant_energies = np.empty((len(frames), detector.total_sub_bands))
+
+    for start in range(0, len(frames), BATCH_CHUNKS):
+        spectrum = detector.fft_front_end.process(frames[start:start + BATCH_CHUNKS])
+        detector.sub_band_energy.compute(spectrum, out=instant_energies[start:start + BATCH_CHUNKS])
+
+    return instant_energies
+
+
+# ===========================================================================
+# Function: Analyses a whole .wav file faster than real time
+#           Same maths as the live loop: the batched FFT and band energies are bit-identical to the per chunk ones,
+#           and the thresholds and gating run through the same Detector, so the timeline matches a live run
+# Input:    Path of the .wav file, channel, Detector parameters
+# Return:   BeatTimeline of the track
+def analyzeWav(path, channel=0, chunk_size=CHUNK_SIZE, history_seconds=HISTORY_SECONDS,
+               clap_range_low=CLAP_RANGE_LOW, hihat_range_low=HIHAT_RANGE_LOW, total_sub_bands=TOTAL_SUB_BANDS):
+    rate, samples = openWav(path)
+    detector = Detector(rate, chunk_size, history_seconds, clap_range_low, hihat_range_low, total_sub_bands)
+
+    instant_energies = getAllInstantEnergies(detector, frameChannel(samples, chunk_size, channel))
+    all_events = [detector.processEnergy(instant_energy) for instant_energy in instant_energies]
+
+    return makeTimeline(rate, chunk_size, all_events)
+
@@ -0,0 +1,49 @@
+import inspect  # Finding the provider classes
+import syncedlyrics.providers  # The provider classes, called directly so their errors are not swallowed
+
+
+# HTTP statuses that mean the provider could not answer (not that it has no lyrics), they raise instead of coming back as None
+SERVER_ERROR_STATUS = 500
+RATE_LIMITED_STATUS = 429
+
+
+# ===========================================================================
+# Function: Response hook for a provider's session, raises on server errors and rate limiting
+#           Some providers return None on any failed request, which would look the same as a song without lyrics
+# Input:    requests Response (and the hook arguments requests passes along)
+# Return:   None
+def raiseServerError(response, *args, **kwargs):
+    if response.status_code >= SERVER_ERROR_STATUS or response.status_code == RATE_LIMITED_STATUS:
+        response.raise_for_status()
+
+
+# ===========================================================================
+# Function: Finds a syncedlyrics provider class by name (case does not matter, like syncedlyrics.search)
+# Input:    Provider name, e.g. "Musixmatch"
+# Return:   Provider class, None if syncedlyrics has no provider of that name
+def getProviderClass(name):
+    for class_name, provider_class in inspect.getmembers(syncedlyrics.providers, inspect.isclass):
+        if class_name.lower() == name.lower():
+            return provider_class
+
+    return None
+
+
+# ===========================================================================
+# Function: Asks one provider for the lyrics of a song
+#           Unlike syncedlyrics.search (which logs and swallows every provider error) network errors, server errors
+#           and rate limiting raise, so callers can tell "no lyrics" from "no answer" and retry the latter
+# Input:    Provider name, search term ("[SONG_NAME] [ARTIST_NAMES]")
+# Return:   LRC text (synced if the provider has it, else plain), None if the provider has no lyrics for the song
+def searchProvider(name, search_term):
+    provider_class = getProviderClass(name)
+    if provider_class is None:
+        raise ValueError(f"syncedlyrics has no provider called {name}")
+
+    provider = provider_class()
+    provider.session.hooks["response"].append(raiseServerError)
+    lyrics = provider.get_lrc(search_term)
+    if lyrics is None or isinstance(lyrics, str):
+        return lyrics or None
+
+    return lyrics.synced or lyrics.unsynced or None
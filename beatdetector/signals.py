@@ -0,0 +1,44 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+# Default parameters for the synthetic drum loop
+RATE                = 94618
+BPM                 = 120
+
+
+# ===========================================================================
+# Function: Makes a reproducible drum loop to benchmark and test the detector with
+#           Kick (pitch swept 140Hz -> 60Hz sine) on every beat, clap (noise burst) on beats 2 and 4,
+#           hihat (high passed noise tick) on every eighth note shifted by a sixteenth (the "e" and "a" of each beat),
+#           over a low noise floor
+# Input:    Length in seconds, sample rate, tempo, random seed, number of (identical) channels
+# Return:   (frames x channels) int16 array, like the interleaved data the mic stream delivers
+def makeDrumSignal(seconds, rate=RATE, bpm=BPM, seed=0, channels=2):
+    rng = np.random.default_rng(seed)
+    total_frames = int(seconds * rate)
+    signal = rng.normal(0, 300, total_frames)
+    beat_frames = 60 / bpm * rate
+
+    kick_time = np.arange(int(0.15 * rate)) / rate
+    kick = 12000 * np.sin(2 * np.pi * (60 + 80 * np.exp(-kick_time * 30)) * kick_time) * np.exp(-kick_time * 20)
+    clap_envelope = np.exp(-np.arange(int(0.08 * rate)) / rate * 40)
+    hihat_envelope = np.exp(-np.arange(int(0.03 * rate)) / rate * 150)
+
+    for beat in range(int(total_frames / beat_frames)):
+        start = int(beat * beat_frames)
+        length = min(total_frames - start, len(kick))
+        signal[start:start + length] += kick[:length]
+
+        if beat % 2 == 1:
+            length = min(total_frames - start, len(clap_envelope))
+            signal[start:start + length] += rng.normal(0, 6000, length) * clap_envelope[:length]
+
+    for eighth in range(int(total_frames / (beat_frames / 2))):
+        start = int(eighth * beat_frames / 2) + int(beat_frames / 4)
+        length = min(total_frames - start, len(hihat_envelope))
+        if length > 0:
+            signal[start:start + length] += np.diff(rng.normal(0, 4000, length + 1)) * hihat_envelope[:length]
+
+    signal = np.clip(signal, -32768, 32767).astype(np.int16)
+
+    return np.repeat(signal[:, np.newaxis], channels, axis=1)
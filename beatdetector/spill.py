@@ -0,0 +1,90 @@
+import os  # File sizes
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+GROW_ROWS           = 4096  # Rows the file grows by when it fills up (~90 s of chunks)
+
+
+# ===========================================================================
+# Class:    Append-only array of fixed size rows spilled to a memory mapped file
+#           Rows are written straight into the mapped file, so RAM stays flat however long the recording runs
+#           (the OS writes dirty pages back and can drop them). The file grows GROW_ROWS rows at a time.
+# Input:    File path (created or overwritten), shape of one row, dtype, rows to grow by
+class SpillArray:
+    def __init__(self, path, row_shape, dtype, grow_rows=GROW_ROWS):
+        self.path = path
+        self.row_shape = (row_shape,) if isinstance(row_shape, (int, np.integer)) else tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.grow_rows = grow_rows
+        self.row_bytes = int(np.prod(self.row_shape)) * self.dtype.itemsize
+
+        self.count = 0
+        self.capacity = 0
+        self._file = open(path, "w+b")
+        self._map = None
+
+    def __len__(self):
+        return self.count
+
+    # =======================================================================
+    # Function: Appends one row
+    # Input:    Row (anything that broadcasts to row_shape)
+    # Return:   None
+    def append(self, row):
+        if self.count == self.capacity:
+            self._grow()
+
+        self._map[self.count] = row
+        self.count += 1
+
+    # =======================================================================
+    # Function: Read-only memory mapped view of the rows appended so far (nothing is read until it is used)
+    # Input:    None
+    # Return:   (count x row_shape) np.memmap
+    def array(self):
+        self.flush()
+        return np.memmap(self.path, dtype=self.dtype, mode="r", shape=(self.count,) + self.row_shape) if self.count else \
+            np.empty((0,) + self.row_shape, dtype=self.dtype)
+
+    # =======================================================================
+    # Function: Writes the dirty pages of the map back to the file
+    # Input:    None
+    # Return:   None
+    def flush(self):
+        if self._map is not None:
+            self._map.flush()
+
+    # =======================================================================
+    # Function: Flushes, unmaps and trims the file to the rows actually appended
+    # Input:    None
+    # Return:   None
+    def close(self):
+        if self._file.closed:
+            return
+
+        self.flush()
+        self._map = None
+        self._file.truncate(self.count * self.row_bytes)
+        self._file.close()
+
+    # =======================================================================
+    # Function: Makes the file grow_rows rows longer and maps the bigger file
+    # Input:    None
+    # Return:   None
+    def _grow(self):
+        self.flush()
+        self.capacity += self.grow_rows
+        self._file.truncate(self.capacity * self.row_bytes)
+        self._map = np.memmap(self._file, dtype=self.dtype, mode="r+", shape=(self.capacity,) + self.row_shape)
+
+
+# ===========================================================================
+# Function: Opens a closed spill file again, read-only and lazily
+# Input:    File path, shape of one row, dtype
+# Return:   (rows x row_shape) np.memmap
+def openSpill(path, row_shape, dtype):
+    row_shape = (row_shape,) if isinstance(row_shape, (int, np.integer)) else tuple(row_shape)
+    rows = os.path.getsize(path) // (int(np.prod(row_shape)) * np.dtype(dtype).itemsize)
+
+    return np.memmap(path, dtype=dtype, mode="r", shape=(rows,) + row_shape)
@@ -0,0 +1,176 @@
+import argparse  # Command line interface
+import json  # Results and baselines
+import platform  # Recorded with the results, timings only compare on the same machine
+import sys  # Exit code on regression
+import time  # For timing each stage
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector.capture import CaptureRing
+from beatdetector.detector import CHUNK_SIZE, RATE, Detector, compareBeat
+from beatdetector.signals import makeDrumSignal
+
+
+SECONDS             = 60  # Length of the synthetic drum loop, ~2800 chunks
+PASSES              = 3  # Times the loop is run through a fresh detector, more samples for the p99
+THRESHOLD           = 0.25  # A stage regresses when its metric is this much slower than the baseline
+METRIC              = "p50_ms"
+
+# Stages in pipeline order
+STAGES              = ["capture", "fft", "sub_band_energy", "threshold", "compare_beat", "gating", "push", "total"]
+
+
+# ===========================================================================
+# Function: Runs the synthetic drum loop through the pipeline stage by stage and times every stage of every chunk
+#           Same steps as Detector.process, split up so each one can be timed on its own:
+#           capture         - PyAudio callback bytes into the capture ring and the left channel view back out
+#           fft             - windowed rFFT (takeFFT)
+#           sub_band_energy - band energies (getSubBandInstantEnergyofChunk)
+#           threshold       - adaptive sub band thresholds (checkBeatInChunk)
+#           compare_beat    - one compareBeat call on a copy of the clap history
+#           gating          - bass/clap/hihat decisions (clap/hihat energies, gaps and compareBeat)
+#           push            - energy history and running statistics update
+# Input:    Seconds of audio, passes, random seed
+# Return:   Dictionary of stage name -> array of ms per chunk
+def timeStages(seconds=SECONDS, passes=PASSES, seed=0):
+    signal = makeDrumSignal(seconds, RATE, seed=seed)
+    total_chunks = len(signal) // CHUNK_SIZE
+    blocks = [signal[i * CHUNK_SIZE:(i + 1) * CHUNK_SIZE].tobytes() for i in range(total_chunks)]
+    timings = {stage: [] for stage in STAGES}
+
+    for _ in range(passes):
+        capture = CaptureRing(CHUNK_SIZE, signal.shape[1], RATE)
+        detector = Detector(RATE, CHUNK_SIZE)
+        beat_threshold = detector.beat_threshold
+
+        for block in blocks:
+            start_time = time.perf_counter()
+            capture.callback(block, CHUNK_SIZE, None, 0)
+            chunk = capture.readChunk(channel=0, timeout=0)
+            capture_time = time.perf_counter()
+            spectrum = detector.fft_front_end.process(chunk)
+            fft_time = time.perf_counter()
+            instant_energy = detector.sub_band_energy.compute(spectrum, out=detector.instant_energy)
+            energy_time = time.perf_counter()
+
+            if not detector.isWarmedUp():
+                beat_threshold.push(instant_energy)
+                detector.chunks_processed += 1
+                continue
+
+            sub_band_beat = beat_threshold.check(instant_energy)
+            threshold_time = time.perf_counter()
+            detector.decide(instant_energy, sub_band_beat, detector.chunks_processed)
+            gating_time = time.perf_counter()
+            beat_threshold.push(instant_energy)
+            detector.chunks_processed += 1
+            end_time = time.perf_counter()
+
+            # compareBeat on its own, on a copy so the detector's clap history is left alone
+            clap_history = list(detector.beat_history[1])
+            compare_time = time.perf_counter()
+            if clap_history:
+                compareBeat(detector.clap_energy * 1.6, clap_history)
+            compare_end_time = time.perf_counter()
+
+            timings["capture"].append(capture_time - start_time)
+            timings["fft"].append(fft_time - capture_time)
+            timings["sub_band_energy"].append(energy_time - fft_time)
+            timings["threshold"].append(threshold_time - energy_time)
+            timings["compare_beat"].append(compare_end_time - compare_time)
+            timings["gating"].append(gating_time - threshold_time)
+            timings["push"].append(end_time - gating_time)
+            timings["total"].append(end_time - start_time)
+
+    return {stage: np.array(times) * 1000 for stage, times in timings.items()}
+
+
+# ===========================================================================
+# Function: Summarizes the per chunk timings of every stage
+# Input:    Dictionary of stage name -> array of ms per chunk
+# Return:   Dictionary of stage name -> p50/p99/max/mean in ms and p99 as a % of the chunk budget
+def summarizeStages(timings):
+    budget_ms = CHUNK_SIZE / RATE * 1000
+    summary = {}
+    for stage in STAGES:
+        times = timings[stage]
+        p50, p99 = np.percentile(times, [50, 99])
+        summary[stage] = {"p50_ms": float(p50), "p99_ms": float(p99), "max_ms": float(np.max(times)),
+                          "mean_ms": float(np.mean(times)), "p99_budget_pct": float(p99 / budget_ms * 100)}
+
+    return summary
+
+
+# ===========================================================================
+# Function: Runs the whole benchmark
+# Input:    Seconds of audio, passes, random seed
+# Return:   Results dictionary (what gets saved as JSON)
+def runBenchmark(seconds=SECONDS, passes=PASSES, seed=0):
+    timings = timeStages(seconds, passes, seed)
+
+    return {
+        "rate": RATE, "chunk_size": CHUNK_SIZE, "budget_ms": CHUNK_SIZE / RATE * 1000,
+        "seconds": seconds, "passes": passes, "seed": seed, "chunks": len(timings["total"]),
+        "machine": platform.platform(), "python": platform.python_version(), "numpy": np.__version__,
+        "stages": summarizeStages(timings),
+    }
+
+
+# ===========================================================================
+# Function: Compares results against a stored baseline
+# Input:    Results, baseline results, allowed slowdown (0.25 = 25%), metric to compare (p50_ms, p99_ms, max_ms, mean_ms)
+# Return:   List of (stage, baseline ms, current ms) for every stage that regressed
+def findRegressions(results, baseline, threshold=THRESHOLD, metric=METRIC):
+    regressions = []
+    for stage, stats in results["stages"].items():
+        if stage not in baseline["stages"]:
+            continue
+
+        baseline_ms = baseline["stages"][stage][metric]
+        if stats[metric] > baseline_ms * (1 + threshold):
+            regressions.append((stage, baseline_ms, stats[metric]))
+
+    return regressions
+
+
+# ===========================================================================
+# Function: Prints the per stage table
+# Input:    Results
+# Return:   None
+def printResults(results):
+    print(f"{results['chunks']} chunks of synthetic kick/clap/hihat, budget {results['budget_ms']:.3f} ms per chunk")
+    print(f"{'stage':<16}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'p99 % budget':>14}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<16}{stats['p50_ms']:>10.4f}{stats['p99_ms']:>10.4f}{stats['max_ms']:>10.4f}{stats['p99_budget_pct']:>13.2f}%")
+
+
+# ===========================================================================
+# Start program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per stage latency benchmark on a synthetic drum loop")
+    parser.add_argument("--seconds", type=float, default=SECONDS, help="Length of the synthetic drum loop")
+    parser.add_argument("--passes", type=int, default=PASSES, help="Times the loop is run through a fresh detector")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the drum loop")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--baseline", help="Fail if a stage regressed against the results stored in this file")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--metric", default=METRIC, choices=["p50_ms", "p99_ms", "max_ms", "mean_ms"], help="Statistic compared with the baseline")
+    args = parser.parse_args()
+
+    results = runBenchmark(args.seconds, args.passes, args.seed)
+    printResults(results)
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved results to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = findRegressions(results, baseline, args.threshold, args.metric)
+        for stage, baseline_ms, current_ms in regressions:
+            print(f"REGRESSION {stage}: {args.metric} {current_ms:.4f} ms vs baseline {baseline_ms:.4f} ms (+{(current_ms / baseline_ms - 1) * 100:.0f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"No stage regressed more than {args.threshold * 100:.0f}% against {args.baseline}")
@@ -0,0 +1,168 @@
+import bisect  # Histogram bin lookup without numpy overhead per sample
+import os  # Opt-in through an environment variable
+import time  # Stage timings
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+STATS_ENV           = "BEATDETECTOR_STATS"  # Set to the report interval in seconds (e.g. 5) to turn the stats on
+REPORT_SECONDS      = 5.0
+
+# Log spaced latency bins from 1us to 1s (in ms), everything above lands in the last bin
+HISTOGRAM_EDGES     = np.geomspace(0.001, 1000, 61).tolist()
+
+
+# ===========================================================================
+# Function: Creates the live stats if they were turned on through the environment
+# Input:    Sample rate, chunk size, capture ring to report overruns/overflows/waiting for (optional)
+# Return:   LiveStats, or None when off so the hot path only pays for an "is None" check
+def makeLiveStats(rate, chunk_size, capture=None):
+    report_seconds = os.environ.get(STATS_ENV)
+    if not report_seconds:
+        return None
+
+    return LiveStats(chunk_size / rate, float(report_seconds) or REPORT_SECONDS, capture)
+
+
+# ===========================================================================
+# Class:    Opt-in instrumentation of the live loop
+#           Per stage latency histograms, chunks whose processing took longer than the chunk budget (CHUNK_SIZE / RATE),
+#           and from the capture ring: overruns, input overflows, time spent waiting for audio and the backlog.
+#           Prints a one-line summary every report_seconds, and printTotals() at the end of the run.
+# Input:    Chunk budget in seconds, seconds between summaries, capture ring (optional)
+class LiveStats:
+    def __init__(self, budget_seconds, report_seconds=REPORT_SECONDS, capture=None):
+        self.budget_seconds = budget_seconds
+        self.report_seconds = report_seconds
+        self.capture = capture
+
+        self.chunks = 0
+        self.deadline_misses = 0
+        self.histograms = {}  # Stage -> bin counts since the last summary
+        self.total_histograms = {}  # Stage -> bin counts for the whole run
+
+        self._chunk_start = None
+        self._lap_start = None
+        self._period_chunks = 0
+        self._period_misses = 0
+        self._period_start = time.perf_counter()
+        self._next_report = self._period_start + report_seconds
+        self._last_capture = capture.getStats() if capture is not None else None
+
+    # =======================================================================
+    # Function: Adds one latency sample to a stage's histogram
+    # Input:    Stage name, duration in seconds
+    # Return:   None
+    def record(self, stage, seconds):
+        index = bisect.bisect_left(HISTOGRAM_EDGES, seconds * 1000, 0, len(HISTOGRAM_EDGES) - 1)
+        if stage not in self.histograms:
+            self.histograms[stage] = [0] * len(HISTOGRAM_EDGES)
+            self.total_histograms.setdefault(stage, [0] * len(HISTOGRAM_EDGES))
+        self.histograms[stage][index] += 1
+
+    # =======================================================================
+    # Function: Marks the start of a chunk's processing (call right after the audio for it arrived)
+    # Input:    None
+    # Return:   None
+    def beginChunk(self):
+        self._chunk_start = time.perf_counter()
+        self._lap_start = self._chunk_start
+
+    # =======================================================================
+    # Function: Records the time since beginChunk or the last lap as a stage (for work outside the detector)
+    # Input:    Stage name
+    # Return:   None
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.record(stage, now - self._lap_start)
+        self._lap_start = now
+
+    # =======================================================================
+    # Function: Marks the end of a chunk's processing, counts deadline misses and prints the periodic summary
+    # Input:    None
+    # Return:   None
+    def endChunk(self):
+        now = time.perf_counter()
+        processing = now - self._chunk_start
+        self.record("total", processing)
+
+        self.chunks += 1
+        self._period_chunks += 1
+        if processing > self.budget_seconds:
+            self.deadline_misses += 1
+            self._period_misses += 1
+
+        if now >= self._next_report:
+            print(self.getSummary(now))
+            self._resetPeriod(now)
+
+    # =======================================================================
+    # Function: One-line summary of the current period
+    # Input:    Time of the summary (perf_counter)
+    # Return:   Summary string
+    def getSummary(self, now=None):
+        now = time.perf_counter() if now is None else now
+        period = now - self._period_start
+        line = f"[stats {period:.1f}s] {self._period_chunks} chunks, {self._period_misses} late (>{self.budget_seconds * 1000:.1f}ms)"
+
+        if self.capture is not None:
+            capture_stats = self.capture.getStats()
+            last = self._last_capture
+            waiting = capture_stats["wait_seconds"] - last["wait_seconds"]
+            line += (f", {capture_stats['input_overflows'] - last['input_overflows']} overflows"
+                     f", {capture_stats['overruns'] - last['overruns']} overruns"
+                     f", waiting {waiting / period * 100:.0f}%"
+                     f", backlog {capture_stats['backlog_frames'] / self.capture.chunk_size:.1f} chunks")
+
+        stages = " | ".join(f"{stage} {getPercentile(counts, 50):.2f}/{getPercentile(counts, 99):.2f}"
+                            for stage, counts in self.histograms.items() if sum(counts) > 0)
+
+        return f"{line} | p50/p99 ms: {stages}"
+
+    # =======================================================================
+    # Function: Prints the whole run's stage percentiles and counters
+    # Input:    None
+    # Return:   None
+    def printTotals(self):
+        self._resetPeriod(time.perf_counter())
+        print(f"[stats] {self.chunks} chunks, {self.deadline_misses} late (>{self.budget_seconds * 1000:.1f}ms)")
+        for stage, counts in self.total_histograms.items():
+            print(f"[stats] {stage:<16} p50 {getPercentile(counts, 50):.3f} ms, p99 {getPercentile(counts, 99):.3f} ms, "
+                  f"max <= {getPercentile(counts, 100):.3f} ms")
+
+    # =======================================================================
+    # Function: Folds the period histograms into the run totals and starts a new period
+    # Input:    Time the new period starts (perf_counter)
+    # Return:   None
+    def _resetPeriod(self, now):
+        for stage, counts in self.histograms.items():
+            totals = self.total_histograms[stage]
+            for index, count in enumerate(counts):
+                totals[index] += count
+                counts[index] = 0
+
+        self._period_chunks = 0
+        self._period_misses = 0
+        self._period_start = now
+        self._next_report = now + self.report_seconds
+        if self.capture is not None:
+            self._last_capture = self.capture.getStats()
+
+
+# ===========================================================================
+# Function: Approximate percentile from histogram bin counts (upper edge of the bin it falls in)
+# Input:    Bin counts, percentile (0 - 100)
+# Return:   Latency in ms, 0 for an empty histogram
+def getPercentile(counts, percentile):
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+
+    target = percentile / 100 * total
+    running = 0
+    for index, count in enumerate(counts):
+        running += count
+        if count and running >= target:
+            return HISTOGRAM_EDGES[index]
+
+    return HISTOGRAM_EDGES[-1]
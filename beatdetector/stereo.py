@@ -0,0 +1,87 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+from beatdetector.detector import RATE, CHUNK_SIZE, HISTORY_SECONDS, CLAP_RANGE_LOW, HIHAT_RANGE_LOW, TOTAL_SUB_BANDS
+from beatdetector.detector import Detector, MultiDetector, mergeEvents
+
+
+# What each mode analyses out of the interleaved (chunk x 2) capture
+#   left     = left channel only (what the scripts always did)
+#   mono     = L + R in one signal, one rFFT
+#   midside  = L + R and L - R (side catches hard panned drums), mixed from the L and R spectra of channels
+#   channels = L and R as two rows of one batched rFFT, straight from a transposed view of the ring
+STEREO_MODES        = ("left", "mono", "midside", "channels")
+
+# Spectra of (L, R) -> spectra of (mid, side), mixing after the FFT only touches the bins in the frequency range
+MID_SIDE_MIX        = [[1, 1], [1, -1]]
+
+
+# ===========================================================================
+# Class:    Stereo aware front end over Detector/MultiDetector
+#           Takes the (chunk x channels) int16 view of the capture ring and builds the signals of the mode from
+#           strided views (no interleaved copy), a beat in any analysed signal counts as a beat
+# Input:    Stereo mode, audio parameters, first clap and hihat sub bands, FFT precision,
+#           LiveStats to record the latency of every stage into (None = off)
+class StereoDetector:
+    def __init__(self, mode="left", rate=RATE, chunk_size=CHUNK_SIZE, history_seconds=HISTORY_SECONDS,
+                 clap_range_low=CLAP_RANGE_LOW, hihat_range_low=HIHAT_RANGE_LOW, total_sub_bands=TOTAL_SUB_BANDS,
+                 dtype=np.float64, stats=None):
+        if mode not in STEREO_MODES:
+            raise ValueError(f"Unknown stereo mode {mode}, expected one of {', '.join(STEREO_MODES)}")
+
+        self.mode = mode
+        if mode in ("left", "mono"):
+            self.detector = Detector(rate, chunk_size, history_seconds, clap_range_low, hihat_range_low, total_sub_bands,
+                                     dtype=dtype, stats=stats)
+            self.gates = [self.detector]
+        else:
+            self.detector = MultiDetector(2, rate, chunk_size, history_seconds, clap_range_low, hihat_range_low,
+                                          total_sub_bands, dtype=dtype, stats=stats,
+                                          mix=MID_SIDE_MIX if mode == "midside" else None)
+            self.gates = self.detector.gates
+
+        # L + R is summed straight into this, in float (int16 + int16 would wrap before landing in the buffer)
+        self._mono = np.empty(chunk_size, dtype=dtype) if mode == "mono" else None
+
+        # Events of every analysed signal for the last chunk
+        self.events = []
+
+    # =======================================================================
+    # Function: Checks if the energy history has been filled and beats can be reported
+    # Input:    None
+    # Return:   True once history_seconds of chunks have been processed
+    def isWarmedUp(self):
+        return self.detector.isWarmedUp()
+
+    @property
+    def chunks_processed(self):
+        return self.detector.chunks_processed
+
+    @property
+    def clap_chunk(self):
+        return max(gate.clap_chunk for gate in self.gates)
+
+    @property
+    def hihat_chunk(self):
+        return max(gate.hihat_chunk for gate in self.gates)
+
+    @property
+    def clap_energy(self):
+        return max(gate.clap_energy for gate in self.gates)
+
+    @property
+    def hihat_energy(self):
+        return max(gate.hihat_energy for gate in self.gates)
+
+    # =======================================================================
+    # Function: Runs one stereo chunk through the detector of the mode
+    # Input:    (CHUNK_SIZE x channels) samples, e.g. capture.readChunk(channel=None)
+    # Return:   BeatEvents for the chunk (a beat in any analysed signal)
+    def process(self, frames):
+        if self.mode == "left":
+            self.events = [self.detector.process(frames[:, 0])]
+        elif self.mode == "mono":
+            np.add(frames[:, 0], frames[:, 1], out=self._mono, dtype=self._mono.dtype)
+            self.events = [self.detector.process(self._mono)]
+        else:
+            self.events = self.detector.process(frames[:, :2].T)
+
+        return self.events[0] if len(self.events) == 1 else mergeEvents(self.events)
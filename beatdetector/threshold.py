@@ -0,0 +1,159 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+
+# Decisions closer to the threshold than this (scaled by the history size and how much energy went through the
+# running sums) are re-checked with the exact per band rule, so float drift can never flip a beat
+DRIFT_TOLERANCE     = 64 * np.finfo(np.float64).eps
+
+
+# ===========================================================================
+# Function:  Checks if a beat has occurred in one sub band (the exact, O(history) reference rule)
+# Algorithm: First normalize by dividing by max energy of the history
+#            Then check if the instant energy is greater than a certain threshold based on variance
+# Input:     Instant energy of the sub band, energy history of the sub band (oldest first), beat floor
+# Return:    True if a beat occurred, otherwise False
+def checkSubBandBeat(instant_energy, energy_history, floor=0.15):
+    max_energy = np.max(energy_history)
+    norm_energy_history = energy_history / max_energy
+    norm_instant_energy = instant_energy / max_energy
+
+    # Calculate the average energy and the threshold for the sub band
+    sub_band_threshold = -15 * np.var(norm_energy_history) + 1.40
+    norm_avg_energy = np.mean(norm_energy_history)
+
+    return bool(norm_instant_energy > sub_band_threshold * norm_avg_energy / 1.15 or norm_instant_energy > floor)
+
+
+# ===========================================================================
+# Class:    Incremental statistics for the adaptive beat threshold, O(1) per sub band per chunk
+#           - Sliding max: van Herk/Gil-Werman blocks, suffix max of the previous block + prefix max of the current one
+#           - Running sum and sum of squares give the normalized mean and variance algebraically
+#           - Everything is recomputed from the history once every history_len chunks to stop drift building up
+#           Owns the pushes into the EnergyHistory it is given, so always push through this class.
+# Input:    EnergyHistory to keep statistics for, beat floor on the normalized instant energy
+class BeatThreshold:
+    def __init__(self, energy_history, floor=0.15):
+        self.history = energy_history
+        self.floor = floor
+
+        shape = energy_history.shape
+        self._sum = np.zeros(shape)
+        self._sum_squares = np.zeros(shape)
+        self._mass = np.zeros(shape)  # Energy added to/removed from the running sums since the last resync
+        self._mass_squares = np.zeros(shape)
+        self._suffix_max = np.zeros((energy_history.history_len,) + shape)
+        self._prefix_max = np.zeros(shape)
+        self._block_fill = 0
+        self._tolerance = DRIFT_TOLERANCE * (energy_history.history_len + 2)
+
+        if energy_history.isFull():
+            self._resync()
+
+    # =======================================================================
+    # Function: Slots the instant energy into the history and updates the running statistics
+    # Input:    Instant energy for all sub bands
+    # Return:   None
+    def push(self, instant_energy):
+        if not self.history.isFull():
+            self.history.push(instant_energy)
+            if self.history.isFull():
+                self._resync()
+            return
+
+        oldest = self.history.oldest()
+        self._sum += instant_energy
+        self._sum -= oldest
+        self._sum_squares += np.square(instant_energy)
+        self._sum_squares -= np.square(oldest)
+        self._mass += np.abs(instant_energy)
+        self._mass += np.abs(oldest)
+        self._mass_squares += np.square(instant_energy)
+        self._mass_squares += np.square(oldest)
+        self.history.push(instant_energy)
+
+        self._block_fill += 1
+        if self._block_fill == self.history.history_len:
+            self._resync()
+        else:
+            np.maximum(self._prefix_max, instant_energy, out=self._prefix_max)
+
+    # =======================================================================
+    # Function: Max energy of each sub band over the history
+    # Input:    None
+    # Return:   Array of max energies
+    def getMaxEnergy(self):
+        return np.maximum(self._suffix_max[self._block_fill], self._prefix_max)
+
+    # =======================================================================
+    # Function: Un-normalized threshold of each sub band (threshold * average energy / 1.15), for plotting
+    # Input:    None
+    # Return:   Array of thresholds
+    def getConditions(self):
+        history_len = self.history.history_len
+        with np.errstate(divide='ignore', invalid='ignore'):
+            max_energy = self.getMaxEnergy()
+            norm_avg_energy = self._sum / max_energy / history_len
+            norm_var = self._sum_squares / np.square(max_energy) / history_len - np.square(norm_avg_energy)
+
+        return (-15 * norm_var + 1.40) * (self._sum / history_len) / 1.15
+
+    # =======================================================================
+    # Function:  Checks which sub bands have a beat, same decisions as checkSubBandBeat on the full history
+    # Algorithm: Evaluate the rule from the running statistics, then redo any band that lands within the
+    #            drift tolerance of the threshold with the exact rule
+    # Input:     Instant energy for all sub bands
+    # Return:    Boolean array, True for each sub band where a beat occurred
+    def check(self, instant_energy):
+        instant_energy = np.asarray(instant_energy)
+        if not self.history.isFull():
+            return self._checkExact(instant_energy, np.ones(self.history.shape, dtype=bool), np.zeros(self.history.shape, dtype=bool))
+
+        history_len = self.history.history_len
+        with np.errstate(divide='ignore', invalid='ignore'):
+            max_energy = self.getMaxEnergy()
+            max_energy_squared = np.square(max_energy)
+            norm_instant_energy = instant_energy / max_energy
+            norm_avg_energy = self._sum / max_energy / history_len
+            norm_var = self._sum_squares / max_energy_squared / history_len - np.square(norm_avg_energy)
+            threshold_energy = (-15 * norm_var + 1.40) * norm_avg_energy / 1.15
+
+            above_floor = norm_instant_energy > self.floor
+            sub_band_beat = (norm_instant_energy > threshold_energy) | above_floor
+
+            # The floor test is exact, only the threshold test can be off by float drift
+            tolerance = self._tolerance * (1 + (self._mass / max_energy + self._mass_squares / max_energy_squared) / history_len)
+            uncertain = ~above_floor & ~(np.abs(norm_instant_energy - threshold_energy) > tolerance)
+
+            # A silent history (max of 0) makes the threshold NaN both ways, so it never needs redoing
+            uncertain &= max_energy != 0
+
+        if uncertain.any():
+            sub_band_beat = self._checkExact(instant_energy, uncertain, sub_band_beat)
+
+        return sub_band_beat
+
+    # =======================================================================
+    # Function: Runs the exact per band rule on the selected sub bands
+    # Input:    Instant energy, mask of sub bands to redo, current beat array
+    # Return:   Beat array with the selected sub bands replaced
+    def _checkExact(self, instant_energy, mask, sub_band_beat):
+        window = self.history.window()
+        for index in zip(*np.nonzero(mask)):
+            sub_band_beat[index] = checkSubBandBeat(instant_energy[index], window[(slice(None),) + index], self.floor)
+
+        return sub_band_beat
+
+    # =======================================================================
+    # Function: Recomputes the sums and starts a new sliding max block from the full history, O(history) once per block
+    # Input:    None
+    # Return:   None
+    def _resync(self):
+        window = self.history.window()
+        self._suffix_max[:] = np.maximum.accumulate(window[::-1], axis=0)[::-1]
+        self._prefix_max.fill(-np.inf)
+        self._block_fill = 0
+
+        np.sum(window, axis=0, out=self._sum)
+        np.sum(np.square(window), axis=0, out=self._sum_squares)
+        self._mass[:] = self._sum
+        self._mass_squares[:] = self._sum_squares
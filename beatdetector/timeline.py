@@ -0,0 +1,64 @@
+from collections import namedtuple
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector.detector import BeatEvents
+
+
+# Beat timeline of a whole track: chunk indices (int32 arrays) of every bass, clap and hihat
+BeatTimeline = namedtuple("BeatTimeline", ["rate", "chunk_size", "total_chunks", "bass", "clap", "hihat"])
+
+BEAT_TYPES          = ["bass", "clap", "hihat"]
+
+
+# ===========================================================================
+# Function: Builds a beat timeline from the per chunk events of a detector
+# Input:    Sample rate, chunk size, list of BeatEvents (one per chunk)
+# Return:   BeatTimeline
+def makeTimeline(rate, chunk_size, all_events):
+    bass = [events.chunk for events in all_events if events.bass]
+    clap = [events.chunk for events in all_events if events.clap]
+    hihat = [events.chunk for events in all_events if events.hihat]
+
+    return BeatTimeline(rate, chunk_size, len(all_events),
+                        np.array(bass, dtype=np.int32), np.array(clap, dtype=np.int32), np.array(hihat, dtype=np.int32))
+
+
+# ===========================================================================
+# Function: Converts the chunk indices of one beat type into seconds from the start of the track
+# Input:    BeatTimeline and the beat type ("bass", "clap" or "hihat")
+# Return:   Array of times in seconds
+def getBeatTimes(timeline, beat_type):
+    return getattr(timeline, beat_type) * (timeline.chunk_size / timeline.rate)
+
+
+# ===========================================================================
+# Function: Turns a beat timeline back into the per chunk events the live loop would have produced
+# Input:    BeatTimeline
+# Return:   List of BeatEvents in chunk order, only for chunks where something was detected
+def getTimelineEvents(timeline):
+    chunks = np.union1d(np.union1d(timeline.bass, timeline.clap), timeline.hihat)
+    bass = np.isin(chunks, timeline.bass)
+    clap = np.isin(chunks, timeline.clap)
+    hihat = np.isin(chunks, timeline.hihat)
+
+    return [BeatEvents(bool(bass[i]), bool(clap[i]), bool(hihat[i]), int(chunk)) for i, chunk in enumerate(chunks)]
+
+
+# ===========================================================================
+# Function: Saves a beat timeline as a compressed .npz file
+# Input:    Path to save to and the BeatTimeline
+# Return:   None
+def saveTimeline(path, timeline):
+    with open(path, "wb") as file:
+        np.savez_compressed(file, **timeline._asdict())
+
+
+# ===========================================================================
+# Function: Loads a beat timeline saved with saveTimeline
+# Input:    Path of the .npz file
+# Return:   BeatTimeline
+def loadTimeline(path):
+    with np.load(path) as data:
+        return BeatTimeline(data["rate"].item(), data["chunk_size"].item(), data["total_chunks"].item(),
+                            data["bass"], data["clap"], data["hihat"])
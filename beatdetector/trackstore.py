@@ -0,0 +1,194 @@
+import os  # Atomic renames
+import sqlite3  # Local track store
+import time  # Sync times
+from concurrent.futures import ThreadPoolExecutor  # Playlist pages fetched concurrently
+
+
+TRACK_STORE_PATH    = "tracks.db"
+PLAYLISTS_PAGE      = 50  # Most playlists the API returns per request
+ITEMS_PAGE          = 100  # Most playlist items the API returns per request
+SYNC_WORKERS        = 8  # Playlist pages in flight at once
+ITEM_FIELDS         = "items(track(id,uri,name,type,duration_ms,artists(name))),total"
+
+
+# ===========================================================================
+# Class:    Local store of the user's playlists and tracks in one SQLite file
+#           Tracks are keyed by Spotify track ID, so a song in many playlists is stored once.
+#           Every playlist remembers the snapshot_id it was synced at, so unchanged playlists are skipped,
+#           and its position in the user's playlist list, so the song order does not depend on which ones were re-synced.
+# Input:    Store path
+class TrackStore:
+    def __init__(self, path=TRACK_STORE_PATH):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS playlists (id TEXT PRIMARY KEY, name TEXT, snapshot_id TEXT, synced_at REAL,
+                                                  position INTEGER);
+            CREATE TABLE IF NOT EXISTS tracks (id TEXT PRIMARY KEY, name TEXT, artists TEXT, duration_ms INTEGER);
+            CREATE TABLE IF NOT EXISTS playlist_tracks (playlist_id TEXT, position INTEGER, track_id TEXT,
+                                                        PRIMARY KEY (playlist_id, position));
+            CREATE INDEX IF NOT EXISTS playlist_tracks_track ON playlist_tracks (track_id);
+        """)
+
+        # Stores made before playlists had a position get the column, sync fills it in
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(playlists)")]
+        if "position" not in columns:
+            self._connection.execute("ALTER TABLE playlists ADD COLUMN position INTEGER")
+
+    # =======================================================================
+    # Function: Snapshot IDs of the playlists synced so far
+    # Input:    None
+    # Return:   Dict of playlist ID -> snapshot_id
+    def getSnapshots(self):
+        return dict(self._connection.execute("SELECT id, snapshot_id FROM playlists"))
+
+    # =======================================================================
+    # Function: Replaces the contents of one playlist and upserts its tracks, in one transaction
+    # Input:    Playlist ID, name and snapshot_id, list of track objects in playlist order
+    # Return:   None
+    def savePlaylist(self, playlist_id, name, snapshot_id, tracks):
+        rows = [(getTrackId(track), track["name"], ", ".join([artist["name"] for artist in track["artists"]]),
+                 track.get("duration_ms")) for track in tracks]
+        with self._connection:
+            self._connection.executemany("INSERT INTO tracks VALUES (?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                                         "name = excluded.name, artists = excluded.artists, duration_ms = excluded.duration_ms", rows)
+            self._connection.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+            self._connection.executemany("INSERT INTO playlist_tracks VALUES (?, ?, ?)",
+                                         [(playlist_id, position, row[0]) for position, row in enumerate(rows)])
+            self._connection.execute("INSERT INTO playlists (id, name, snapshot_id, synced_at) VALUES (?, ?, ?, ?) "
+                                     "ON CONFLICT (id) DO UPDATE SET name = excluded.name, snapshot_id = excluded.snapshot_id, "
+                                     "synced_at = excluded.synced_at", (playlist_id, name, snapshot_id, time.time()))
+
+    # =======================================================================
+    # Function: Stores where every playlist is in the user's playlist list (the order getSongs follows)
+    # Input:    Playlist IDs in the order the user has them
+    # Return:   None
+    def setPlaylistOrder(self, playlist_ids):
+        with self._connection:
+            self._connection.executemany("UPDATE playlists SET position = ? WHERE id = ?",
+                                         [(position, playlist_id) for position, playlist_id in enumerate(playlist_ids)])
+
+    # =======================================================================
+    # Function: Drops playlists the user no longer has, and tracks no playlist holds any more
+    # Input:    IDs of the playlists the user has now
+    # Return:   Number of playlists dropped
+    def removeOtherPlaylists(self, playlist_ids):
+        playlist_ids = set(playlist_ids)
+        gone = [(playlist_id,) for playlist_id in self.getSnapshots() if playlist_id not in playlist_ids]
+        with self._connection:
+            self._connection.executemany("DELETE FROM playlist_tracks WHERE playlist_id = ?", gone)
+            self._connection.executemany("DELETE FROM playlists WHERE id = ?", gone)
+            self._connection.execute("DELETE FROM tracks WHERE id NOT IN (SELECT track_id FROM playlist_tracks)")
+
+        return len(gone)
+
+    # =======================================================================
+    # Function: Lists every track once, in the order it first shows up going through the playlists in the user's
+    #           order, each from its first track to its last
+    # Input:    None
+    # Return:   List of (artist names, song name)
+    def getSongs(self):
+        return self._connection.execute("SELECT tracks.artists, tracks.name FROM tracks JOIN "
+                                        "(SELECT playlist_tracks.track_id, ROW_NUMBER() OVER "
+                                        "(ORDER BY playlists.position, playlist_tracks.position) AS appearance "
+                                        "FROM playlist_tracks JOIN playlists ON playlists.id = playlist_tracks.playlist_id) "
+                                        "AS appearances ON appearances.track_id = tracks.id GROUP BY tracks.id "
+                                        "ORDER BY MIN(appearances.appearance)").fetchall()
+
+    # =======================================================================
+    # Function: Writes songs.txt ("ARTIST_NAMES - SONG_NAME" per line, what filterSongs.py reads), atomically
+    # Input:    Output path
+    # Return:   Number of songs written
+    def exportSongs(self, path):
+        songs = self.getSongs()
+        temp_path = path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            for artist_names, track_name in songs:
+                file.write(f"{artist_names} - {track_name}\n")
+        os.replace(temp_path, path)
+
+        return len(songs)
+
+    # =======================================================================
+    # Function: Closes the store
+    # Input:    None
+    # Return:   None
+    def close(self):
+        self._connection.close()
+
+
+# ===========================================================================
+# Function: Key of a track, local files have no ID so their URI is used
+# Input:    Track object
+# Return:   Track ID or URI
+def getTrackId(track):
+    return track.get("id") or track["uri"]
+
+
+# ===========================================================================
+# Function: Lists all of the user's playlists, following every page
+# Input:    Spotify client
+# Return:   List of playlist objects
+def getAllPlaylists(sp):
+    playlists = []
+    page = sp.current_user_playlists(limit=PLAYLISTS_PAGE)
+    while page:
+        playlists.extend(playlist for playlist in page["items"] if playlist)
+        page = sp.next(page) if page.get("next") else None
+
+    return playlists
+
+
+# ===========================================================================
+# Function: Starts fetching every page of a playlist on the pool
+# Input:    Spotify client, playlist object (its tracks.total says how many pages there are), thread pool
+# Return:   List of futures of the pages, in playlist order
+def fetchPlaylistPages(sp, playlist, executor):
+    total = playlist["tracks"]["total"]
+    return [executor.submit(sp.playlist_items, playlist["id"], fields=ITEM_FIELDS, limit=ITEMS_PAGE, offset=offset,
+                            additional_types=("track",))
+            for offset in range(0, max(total, 1), ITEMS_PAGE)]
+
+
+# ===========================================================================
+# Function: Collects the tracks of a playlist from its fetched pages
+# Input:    Futures of the pages in order
+# Return:   List of track objects in playlist order (episodes and removed tracks left out)
+def getPageTracks(pages):
+    tracks = []
+    for page in pages:
+        for item in page.result()["items"]:
+            track = item.get("track")
+            if track and track.get("type", "track") == "track" and (track.get("id") or track.get("uri")):
+                tracks.append(track)
+
+    return tracks
+
+
+# ===========================================================================
+# Function: Brings the track store up to date with the user's playlists
+#           One paged request lists the playlists with their snapshot_id, only playlists whose snapshot_id changed
+#           are fetched again (all their pages concurrently), playlists that were deleted are dropped.
+# Input:    Spotify client, TrackStore, pages fetched at once, callback for each synced playlist (name, tracks)
+# Return:   Summary dict (playlists, synced, unchanged, removed, tracks, elapsed)
+def syncLibrary(sp, store, workers=SYNC_WORKERS, on_playlist=None):
+    start_time = time.perf_counter()
+    playlists = getAllPlaylists(sp)
+    snapshots = store.getSnapshots()
+    changed = [playlist for playlist in playlists if snapshots.get(playlist["id"]) != playlist["snapshot_id"]]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Every page of every changed playlist goes into the pool up front, results are saved playlist by playlist
+        fetches = [(playlist, fetchPlaylistPages(sp, playlist, executor)) for playlist in changed]
+        for playlist, pages in fetches:
+            tracks = getPageTracks(pages)
+            store.savePlaylist(playlist["id"], playlist["name"], playlist["snapshot_id"], tracks)
+            if on_playlist is not None:
+                on_playlist(playlist["name"], len(tracks))
+
+    playlist_ids = [playlist["id"] for playlist in playlists]
+    store.setPlaylistOrder(playlist_ids)
+    removed = store.removeOtherPlaylists(playlist_ids)
+
+    return {"playlists": len(playlists), "synced": len(changed), "unchanged": len(playlists) - len(changed),
+            "removed": removed, "tracks": len(store.getSongs()), "elapsed": time.perf_counter() - start_time}
@@ -0,0 +1,327 @@
+import multiprocessing  # Spawned render workers, forking next to the audio thread can deadlock
+import os  # Pipes for ffmpeg and the temporary .wav
+import shutil  # Finding ffmpeg
+import subprocess  # The single pass ffmpeg muxer
+import tempfile  # ffmpeg's error log
+import threading  # Feeding the audio pipe while the frames are written
+import wave  # Audio for ffmpeg on platforms without extra pipes
+from collections import deque  # Frame blocks in flight, in chunk order
+from concurrent.futures import ProcessPoolExecutor  # Rendering ranges of frames on every core
+from multiprocessing import shared_memory  # Read-only feature arrays shared with the render workers
+
+import cv2 as cv  # Writing the frames into a movie
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+from matplotlib.backends.backend_agg import FigureCanvasAgg  # Off screen canvas, no pyplot state or GUI backend
+from matplotlib.figure import Figure
+
+
+# Same look as the old makePlotsWithThreshold frames (default 6.4 x 4.8 inch figure at 100 dpi = 640 x 480)
+FIGURE_SIZE         = (6.4, 4.8)
+DPI                 = 100
+FFT_XLIM            = [4000, 9000]
+FFT_YLIM            = [0, 1e13]
+FOURCC              = "mp4v"
+FFMPEG_VIDEO_CODEC  = "mpeg4"  # Same codec as the mp4v OpenCV writer, built into every ffmpeg
+
+FRAME_BLOCK         = 16  # Frames a worker renders per task (~15 MB of raw frames)
+AUDIO_BLOCK_CHUNKS  = 1024  # Chunks of audio copied out per pipe/wav write
+
+_frame_worker = None  # (renderer, amplitudes, their shared memory, conditions, their shared memory) of a render worker
+
+
+# ===========================================================================
+# Function: Turns the per sub band thresholds into one value per FFT bin so they plot over the spectrum
+# Input:    Thresholds (sub bands,) or (chunks x sub bands), FFT bins per sub band
+# Return:   Thresholds repeated band_width times along the last axis
+def expandConditions(conditions, band_width):
+    return np.repeat(conditions, band_width, axis=-1)
+
+
+# ===========================================================================
+# Class:    Reusable frame renderer for the FFT video
+#           The figure, axes, ticks and labels are drawn once and saved as a background. Every frame restores the
+#           background, updates the y data of the spectrum and threshold lines, draws only those artists (blitting)
+#           and converts the RGBA canvas buffer to a BGR frame for cv.VideoWriter. No pyplot and no PNGs.
+# Input:    Frequency values (x axis), number of FFT bins per sub band, axis limits
+class FrameRenderer:
+    def __init__(self, freq_values, band_width, xlim=FFT_XLIM, ylim=FFT_YLIM, figure_size=FIGURE_SIZE, dpi=DPI):
+        self.freq_values = np.asarray(freq_values)
+        self.band_width = band_width
+        self.figure = Figure(figsize=figure_size, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+
+        self.axes.set_xlim(xlim)
+        self.axes.set_ylim(ylim)
+        self.axes.set_xlabel("Frequency (Hz)")
+        self.axes.set_ylabel("Amplitude")
+
+        # Thresholds cover the bins of the TOTAL_SUB_BANDS bands, leftover bins at the top have none
+        self._threshold_bins = None
+        zeros = np.zeros(len(self.freq_values))
+        self.spectrum_line, = self.axes.plot(self.freq_values, zeros, animated=True)
+        self.threshold_line, = self.axes.plot(self.freq_values, zeros, color='orange', animated=True)
+        self.frame_label = self.axes.text(0.98, 0.97, "", transform=self.axes.transAxes, ha="right", va="top", animated=True)
+
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.width, self.height = self.canvas.get_width_height()
+        self._frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    # =======================================================================
+    # Function: Renders one frame
+    # Input:    Frame number (shown in the corner), spectrum amplitudes, sub band thresholds
+    # Return:   (height x width x 3) BGR frame, reused by the next call
+    def render(self, index, amplitudes, conditions):
+        threshold = expandConditions(conditions, self.band_width)
+        if self._threshold_bins != len(threshold):
+            self._threshold_bins = len(threshold)
+            self.threshold_line.set_xdata(self.freq_values[:self._threshold_bins])
+
+        self.canvas.restore_region(self.background)
+        self.spectrum_line.set_ydata(amplitudes)
+        self.threshold_line.set_ydata(threshold)
+        self.frame_label.set_text(f"{index}")
+        self.axes.draw_artist(self.spectrum_line)
+        self.axes.draw_artist(self.threshold_line)
+        self.axes.draw_artist(self.frame_label)
+
+        cv.cvtColor(np.asarray(self.canvas.buffer_rgba()), cv.COLOR_RGBA2BGR, dst=self._frame)
+
+        return self._frame
+
+
+# ===========================================================================
+# Function: Size of the rendered frames
+# Input:    None
+# Return:   (width, height) in pixels
+def getFrameSize():
+    return int(round(FIGURE_SIZE[0] * DPI)), int(round(FIGURE_SIZE[1] * DPI))
+
+
+# ===========================================================================
+# Function: Opens a video writer, raising instead of silently writing nothing
+# Input:    Output path, FPS, frame width and height
+# Return:   cv.VideoWriter
+def openVideoWriter(output_path, fps, width, height):
+    video_writer = cv.VideoWriter(output_path, cv.VideoWriter_fourcc(*FOURCC), fps, (width, height))
+    if not video_writer.isOpened():
+        raise RuntimeError(f"Could not open a {FOURCC} video writer for {output_path}")
+
+    return video_writer
+
+
+# ===========================================================================
+# Function: Makes an array readable by the render workers without pickling it to each of them
+#           Memory mapped arrays are reopened from their file, anything else is copied once into shared memory
+# Input:    Array, or list of equally long rows
+# Return:   (spec the workers open the array from, shared memory to unlink when done or None)
+def shareArray(array):
+    if isinstance(array, np.memmap) and array.filename is not None and array.flags.c_contiguous:
+        # A slice of a memmap keeps the offset of the whole map, work out where the slice starts in the file
+        root = array
+        while isinstance(root.base, np.memmap):
+            root = root.base
+        offset = root.offset + array.ctypes.data - root.ctypes.data
+        return ("memmap", array.filename, offset, array.shape, array.dtype.str), None
+
+    array = array if isinstance(array, np.ndarray) else np.asarray(array)
+    memory = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    shared = np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)
+    shared[...] = array
+    del shared
+
+    return ("shm", memory.name, 0, array.shape, array.dtype.str), memory
+
+
+# ===========================================================================
+# Function: Opens an array shared with shareArray (read-only)
+# Input:    Spec from shareArray
+# Return:   (array, shared memory to close when done or None)
+def openSharedArray(spec):
+    kind, name, offset, shape, dtype = spec
+    if kind == "memmap":
+        return np.memmap(name, dtype=dtype, mode="r", offset=offset, shape=shape), None
+
+    memory = shared_memory.SharedMemory(name=name)
+    array = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    array.flags.writeable = False
+
+    return array, memory
+
+
+# ===========================================================================
+# Function: Worker initializer, opens the shared arrays and builds one renderer per process
+# Input:    Frequency values, shared specs of the amplitudes and thresholds, FFT bins per sub band
+# Return:   None
+def initFrameWorker(freq_values, amplitudes_spec, conditions_spec, band_width):
+    global _frame_worker
+    # The shared memory handles are kept too, the arrays point into them
+    _frame_worker = (FrameRenderer(freq_values, band_width),) + openSharedArray(amplitudes_spec) + openSharedArray(conditions_spec)
+
+
+# ===========================================================================
+# Function: Worker, renders the frames of chunks start to stop
+# Input:    First and last (exclusive) chunk
+# Return:   Raw BGR frames of the block, back to back
+def renderFrameBlock(start, stop):
+    renderer, all_amplitudes, _, all_conditions, _ = _frame_worker
+    return b"".join(renderer.render(i, all_amplitudes[i], all_conditions[i]).tobytes() for i in range(start, stop))
+
+
+# ===========================================================================
+# Function: Renders the FFT frames in chunk order, on a pool of worker processes when there is more than one
+#           Only workers * 2 blocks are ever in flight, so memory stays flat however long the video is
+#           The workers are spawned, not forked, so they never inherit locks or pipe ends from the muxer's threads
+# Input:    Frequency values, per chunk amplitudes and thresholds, FFT bins per sub band,
+#           number of workers (None = one per core)
+# Return:   Generator of raw BGR frames (bytes-like), one frame or one block of frames at a time
+def iterFftFrames(freq_values, all_amplitudes, all_conditions, band_width, workers=None):
+    total_frames = len(all_amplitudes)
+    workers = min(workers or os.cpu_count() or 1, max(1, total_frames))
+    if workers == 1:
+        renderer = FrameRenderer(freq_values, band_width)
+        for i in range(total_frames):
+            yield renderer.render(i, all_amplitudes[i], all_conditions[i])
+        return
+
+    amplitudes_spec, amplitudes_memory = shareArray(all_amplitudes)
+    conditions_spec, conditions_memory = shareArray(all_conditions)
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=initFrameWorker,
+                                 initargs=(np.asarray(freq_values), amplitudes_spec, conditions_spec, band_width)) as executor:
+            pending = deque()
+            for start in range(0, total_frames, FRAME_BLOCK):
+                pending.append(executor.submit(renderFrameBlock, start, min(start + FRAME_BLOCK, total_frames)))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    finally:
+        for memory in (amplitudes_memory, conditions_memory):
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+
+
+# ===========================================================================
+# Function: Renders the FFT video without audio straight into a video file (when there is no ffmpeg to mux with)
+#           Same frames and worker pool as muxFftVideo, only the blocks go into cv.VideoWriter instead of ffmpeg
+# Input:    Output path, FPS, frequency values, per chunk amplitudes and thresholds, FFT bins per sub band,
+#           number of render workers (None = one per core)
+# Return:   Number of frames written
+def writeFftVideo(output_path, fps, freq_values, all_amplitudes, all_conditions, band_width, workers=None):
+    width, height = getFrameSize()
+    video_writer = openVideoWriter(output_path, fps, width, height)
+
+    frames_written = 0
+    try:
+        for frames in iterFftFrames(freq_values, all_amplitudes, all_conditions, band_width, workers):
+            for frame in np.frombuffer(frames, dtype=np.uint8).reshape(-1, height, width, 3):
+                video_writer.write(frame)
+                frames_written += 1
+    finally:
+        video_writer.release()
+
+    return frames_written
+
+
+# ===========================================================================
+# Function: Writer thread, streams the audio into ffmpeg's audio pipe then closes it so ffmpeg sees the end
+# Input:    Audio file object, int16 samples (chunks x CHUNK_SIZE, any array or list of chunks)
+# Return:   None
+def writeAudioPipe(audio_pipe, audio_data):
+    try:
+        for start in range(0, len(audio_data), AUDIO_BLOCK_CHUNKS):
+            audio_pipe.write(np.ascontiguousarray(audio_data[start:start + AUDIO_BLOCK_CHUNKS], dtype=np.int16).tobytes())
+    except BrokenPipeError:
+        pass  # ffmpeg stopped reading, its exit code says why
+    finally:
+        try:
+            audio_pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+# ===========================================================================
+# Function: Writes the audio to a .wav file (platforms without extra pipes for ffmpeg, or no ffmpeg at all)
+# Input:    Output path, int16 samples (chunks x CHUNK_SIZE), sample rate, number of channels
+# Return:   None
+def writeWav(output_path, audio_data, rate, channels=1):
+    with wave.open(output_path, "wb") as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(rate)
+        for start in range(0, len(audio_data), AUDIO_BLOCK_CHUNKS):
+            wav_file.writeframes(np.ascontiguousarray(audio_data[start:start + AUDIO_BLOCK_CHUNKS], dtype=np.int16).tobytes())
+
+
+# ===========================================================================
+# Function: Renders the FFT video and muxes it with the recorded audio in one ffmpeg pass
+#           Raw BGR frames go into ffmpeg's stdin and the 16-bit PCM audio into a second pipe from a writer thread,
+#           so nothing but the final file is written. On platforms without pass_fds (Windows) the audio goes through
+#           a temporary .wav instead. Raises if ffmpeg is missing or exits with an error.
+# Input:    Output path, FPS, frequency values, per chunk amplitudes and thresholds, FFT bins per sub band,
+#           int16 audio (chunks x CHUNK_SIZE), sample rate, number of render workers (None = one per core)
+# Return:   Number of frames written
+def muxFftVideo(output_path, fps, freq_values, all_amplitudes, all_conditions, band_width, audio_data, rate, workers=None):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg was not found on the PATH")
+
+    width, height = getFrameSize()
+    frame_bytes = width * height * 3
+
+    audio_read = audio_write = wav_path = None
+    if os.name == "posix":
+        audio_read, audio_write = os.pipe()
+        audio_input = ["-f", "s16le", "-ar", f"{rate}", "-ac", "1", "-i", f"pipe:{audio_read}"]
+    else:
+        wav_path = output_path + ".audio.wav"
+        writeWav(wav_path, audio_data, rate)
+        audio_input = ["-i", wav_path]
+
+    command = ([ffmpeg, "-y", "-loglevel", "error",
+                "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", f"{fps}", "-i", "pipe:0"]
+               + audio_input
+               + ["-map", "0:v", "-map", "1:a", "-c:v", FFMPEG_VIDEO_CODEC, "-q:v", "3", "-c:a", "aac", output_path])
+
+    frames_written = 0
+    audio_thread = None
+    with tempfile.TemporaryFile() as error_log:
+        try:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=error_log,
+                                       pass_fds=() if audio_read is None else (audio_read,))
+            if audio_read is not None:
+                os.close(audio_read)
+                audio_read = None
+                audio_thread = threading.Thread(target=writeAudioPipe, args=(os.fdopen(audio_write, "wb"), audio_data), daemon=True)
+                audio_write = None
+                audio_thread.start()
+
+            try:
+                for frames in iterFftFrames(freq_values, all_amplitudes, all_conditions, band_width, workers):
+                    process.stdin.write(frames)
+                    frames_written += memoryview(frames).nbytes // frame_bytes
+            except BrokenPipeError:
+                pass  # ffmpeg stopped reading, its exit code says why
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                return_code = process.wait()
+                if audio_thread is not None:
+                    audio_thread.join()
+        finally:
+            for fd in (audio_read, audio_write):
+                if fd is not None:
+                    os.close(fd)
+            if wav_path is not None and os.path.exists(wav_path):
+                os.remove(wav_path)
+
+        if return_code != 0:
+            error_log.seek(0)
+            raise subprocess.CalledProcessError(return_code, command, stderr=error_log.read().decode(errors="replace"))
+
+    return frames_written
@@ -1,80 +1,56 @@
-import syncedlyrics
-
-def addToFile(lyrics, provider, song_index_f):
-    first_index = lyrics.index("\n")
-    second_index = lyrics.index("\n", first_index + 1)
-    third_index = lyrics.index("\n", second_index + 1)
-    fourth_index = lyrics.index("\n", third_index + 1)
-    fifth_index = lyrics.index("\n", fourth_index + 1)
-    sixth_index = lyrics.index("\n", fifth_index + 1)
-    print(lyrics[:sixth_index])
-    print()
-
-    goodFile = None
-
-    check = input("Keep or Stop? (y/n) or S: ")
-
-    if (check == 'y'):
-        goodFile = open("Songs_To_Try.txt", "a", encoding="utf-8")
-        goodFile.write(f"{provider}: {song}")
-        print("Added")
-        print()
-        return True
-    elif check == 'S':
-        goodFile = open("Songs_To_Try.txt", "a", encoding="utf-8")
-        goodFile.write(f"Stopped: {song_index_f}")
-        return 2
-    else:
-        return False
-
-index = 0
-# Go to end of file and see the index we left off at
-with open("Songs_To_Try.txt", "r", encoding="utf-8") as file:
-    lines = file.readlines()
-    if len(lines) != 0:
-        last_line = lines[-1]
-        index = int(last_line.split(": ")[1])
-    else:
-        index = 0
-
-# Open song.txt and read lines
-with open("songs.txt", "r", encoding="utf-8") as file:
-    songs = file.readlines()
-    check = False 
-
-    # Separate artist and song name
-    for song_index, song in enumerate(songs):
-        if song_index < index:
-            continue
-        else:
-            artists, song_name = song.split(" - ")
-
-            # Remove \n from song_name
-            song_name = song_name.strip("\n")
-            print(f"Artist: {artists}, Song: {song_name}")
-            print()
-
-            # Check Lyrics
-            lyrics = syncedlyrics.search(f"[{song_name}] [{artists}]", providers=["Musixmatch"])
-            if lyrics != None:
-                check = addToFile(lyrics, "Musixmatch", song_index)
-            if check == 2:
-                break
-            elif check == False:
-                lyrics = syncedlyrics.search(f"[{song_name}] [{artists}]", providers=["NetEase"])
-                if lyrics != None:
-                    check = addToFile(lyrics, "NetEase", song_index)
-                if lyrics == None or check == False:
-                    lyrics = syncedlyrics.search(f"[{song_name}] [{artists}]", providers=["Lyricsify"])
-                    if lyrics != None:
-                        check = addToFile(lyrics, "Lyricsify")
-                    if lyrics == None or check == False:
-                        lyrics = syncedlyrics.search(f"[{song_name}] [{artists}]", providers=["Megalobiz"])
-                        if lyrics != None:
-                            check = addToFile(lyrics, "Megalobiz", song_index)
-                        elif lyrics == None:
-                            print("No Lyrics Found")
-                            print()
-
-
-
+import argparse  # Command line interface
+from beatdetector import LyricsCache  # Lyrics found here are ready for Lyric_Room.py
+from beatdetector.lyricindex import indexLibrary, readSongs  # Concurrent, rate limited, resumable lyric index
+from beatdetector.providers import getProviderClass, searchProvider  # Provider errors raise, so failed songs are retried
+
+
+PROVIDERS = ["Musixmatch", "NetEase", "Lyricsify", "Megalobiz"]
+
+
+# ===========================================================================
+# Function: Searches one provider for the synced lyrics of a song
+# Input:    The artist names, the song name and the provider
+# Return:   The lyrics text, None if the provider has none (raises if the provider could not be reached)
+def searchSong(artists, song_name, provider):
+    return searchProvider(provider, f"[{song_name}] [{artists}]")
+
+
+# ===========================================================================
+# Function: Prints one indexed song
+# Input:    Index entry of the song
+# Return:   None
+def printEntry(entry):
+    statuses = ", ".join(f"{provider}: {status}" for provider, status in entry["providers"].items())
+    print(f"{entry['artists']} - {entry['song']}: {entry['best'] or 'No Lyrics Found'} ({statuses})")
+
+
+# ===========================================================================
+# Start program
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find which songs have synced lyrics, and on which provider")
+    parser.add_argument("--songs", default="songs.txt", help="One \"ARTIST_NAMES - SONG_NAME\" per line (getUserTracks.py output)")
+    parser.add_argument("--index", default="lyrics_index.json", help="Index of the results, a rerun picks up where it stopped")
+    parser.add_argument("--providers", nargs="+", default=PROVIDERS, help="Providers to check, in priority order")
+    parser.add_argument("--workers", type=int, default=16, help="Songs checked at once")
+    parser.add_argument("--rate", type=float, default=4.0, help="Requests per second to each provider")
+    parser.add_argument("--no-cache", action="store_true", help="Do not put the lyrics found into the Lyric_Room cache")
+    args = parser.parse_args()
+
+    # A misspelled provider would fail every song, leave it out instead
+    providers = [provider for provider in args.providers if getProviderClass(provider) is not None]
+    for provider in args.providers:
+        if provider not in providers:
+            print(f"Unknown provider {provider}, skipped")
+    if not providers:
+        parser.error("None of the providers exist in syncedlyrics")
+
+    songs = readSongs(args.songs)
+    cache = None if args.no_cache else LyricsCache()
+    summary = indexLibrary(songs, searchSong, providers, args.index, args.workers, args.rate, cache, on_entry=printEntry)
+    if cache is not None:
+        cache.close()
+
+    print(f"{summary['with_lyrics']} of {summary['indexed']} songs have synced lyrics, {summary['failed']} to retry, "
+          f"{summary['skipped']} already indexed of {summary['total']} songs")
+    print(", ".join(f"{provider}: {count}" for provider, count in summary["synced"].items()))
+    print(f"{summary['elapsed']:.1f} s total, {summary['songs_per_minute']:.1f} songs/min")
@@ -1,8 +1,9 @@
 import spotipy
 import spotipy.util as util
+from beatdetector.trackstore import TrackStore, syncLibrary  # Incremental playlist sync into a local SQLite store
 
 # Change these to your values
-redirect_uri = "https://www.google.com/" 
+redirect_uri = "https://www.google.com/"
 client_id = "client_id"
 client_secret = "client_secret"
 username = "username"
@@ -15,18 +16,15 @@ token = util.prompt_for_user_token(username, scope, client_id=client_id, client_
 
 if token:
     sp = spotipy.Spotify(auth=token)
-    playlists = sp.current_user_playlists(limit=50)
 
-    # Loop through all tracks and put in songs.txt
-    with open("songs.txt", "w", encoding="utf-8") as file:
-        for playlist in playlists["items"]:
-            playlist_name = playlist['name']
-            results = sp.playlist_tracks(playlist["id"], fields="items(track(name,artists(name)))")
-            for idx, item in enumerate(results["items"]):
-                track_name = item["track"]["name"]
-                artist_names = ", ".join([artist["name"] for artist in item["track"]["artists"]])
-                song_line = f"{artist_names} - {track_name}\n"
-                file.write(song_line)
+    # Sync every playlist that changed since the last run into tracks.db, then put all tracks (once each) in songs.txt
+    store = TrackStore("tracks.db")
+    summary = syncLibrary(sp, store, on_playlist=lambda name, tracks: print(f"Synced {name}: {tracks} tracks"))
+    songs = store.exportSongs("songs.txt")
+    store.close()
+
+    print(f"{summary['synced']} playlists synced, {summary['unchanged']} unchanged, {summary['removed']} removed "
+          f"in {summary['elapsed']:.1f} s, {songs} songs in songs.txt")
 
 else:
     print("Could not get token for:", username)
@@ -0,0 +1,128 @@
+import threading  # Counting the threads races leave behind
+import time  # Slow fake provider
+from concurrent.futures import ThreadPoolExecutor
+
+from beatdetector import LyricsCache, LyricsPrefetcher, parseLyrics, raceProviders
+
+
+LRC = "[ar:Someone]\n[ti:Something]\n[00:01.00] first line\n\n[00:02.50] second (line)\n"
+
+
+# ===========================================================================
+# Function: Tag lines and blank lines are skipped instead of raising
+def test_parse_skips_lines_without_time_stamp():
+    times, lines = parseLyrics(LRC, rate=1000, chunk_size=10)
+
+    assert times == [100, 250]
+    assert lines == [" first line", " second "]
+
+
+# ===========================================================================
+# Function: Lyrics the parser chokes on come back (and are cached) as missing, the Future never raises
+def test_prefetcher_caches_unparsable_lyrics_as_missing(tmp_path, monkeypatch):
+    cache = LyricsCache(str(tmp_path / "lyrics.db"))
+    prefetcher = LyricsPrefetcher(cache, lambda artist, title: LRC, lambda: [])
+
+    def failParse(lrc, rate, chunk_size):
+        raise ValueError("bad time stamp")
+    monkeypatch.setattr("beatdetector.lyrics.parseLyrics", failParse)
+
+    lyrics = prefetcher.requestLyrics("Artist", "Song").result(timeout=5)
+    prefetcher.close()
+
+    assert lyrics.lrc is None
+    assert cache.get("Artist", "Song").lrc is None
+    cache.close()
+
+
+# ===========================================================================
+# Function: Artist and title match whatever their case, spacing and unicode form
+def test_cache_keys_are_normalized(tmp_path):
+    cache = LyricsCache(str(tmp_path / "lyrics.db"))
+    cache.put("Beyoncé", "Halo", LRC)
+
+    assert cache.get("  BEYONCÉ ", "halo").lrc == LRC
+    assert cache.get("Beyonce", "Halo") is None
+    cache.close()
+
+
+# ===========================================================================
+# Function: A "no lyrics found" is trusted until negative_ttl runs out, then the song is searched again
+def test_cache_negative_entries_expire(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("beatdetector.lyrics.time.time", lambda: now[0])
+    cache = LyricsCache(str(tmp_path / "lyrics.db"), negative_ttl=60)
+    cache.put("Artist", "No Lyrics", None)
+    cache.put("Artist", "Lyrics", LRC)
+
+    now[0] += 59
+    assert cache.get("Artist", "No Lyrics").lrc is None
+    now[0] += 2
+    assert cache.get("Artist", "No Lyrics") is None
+    assert cache.get("Artist", "Lyrics").lrc == LRC
+    cache.close()
+
+
+# ===========================================================================
+# Function: Past max_bytes the least recently used songs are dropped, a lookup counts as a use
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("beatdetector.lyrics.time.time", lambda: now[0])
+    cache = LyricsCache(str(tmp_path / "lyrics.db"))
+    cache.put("Artist", "Size", LRC)
+    song_bytes = cache._total_bytes
+    cache.close()
+
+    cache = LyricsCache(str(tmp_path / "lru.db"), max_bytes=3 * song_bytes)
+    for song in ("A", "B", "C"):
+        now[0] += 1
+        cache.put("Artist", song, LRC)
+    now[0] += 1
+    cache.get("Artist", "A")
+
+    now[0] += 1
+    cache.put("Artist", "D", LRC)
+
+    assert cache.get("Artist", "B") is None
+    assert all(cache.get("Artist", song) is not None for song in ("A", "C", "D"))
+    assert cache._total_bytes <= cache.max_bytes
+    cache.close()
+
+
+# ===========================================================================
+# Function: "No lyrics" entries count against max_bytes and expired ones are deleted before any lyrics are dropped
+def test_cache_negative_entries_count_and_are_purged(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("beatdetector.lyrics.time.time", lambda: now[0])
+    cache = LyricsCache(str(tmp_path / "lyrics.db"), max_bytes=280, negative_ttl=60)
+    cache.put("Artist", "Lyrics", LRC)
+    for song in range(10):
+        cache.put("Artist", f"Missing {song}", None)
+    assert cache._total_bytes > 0
+    assert cache._total_bytes <= cache.max_bytes
+
+    now[0] += 61
+    cache.put("Artist", "Missing again", None)
+    rows = cache._connection.execute("SELECT COUNT(*) FROM lyrics WHERE lrc IS NULL").fetchone()[0]
+
+    assert rows == 1
+    assert cache.get("Artist", "Lyrics").lrc == LRC
+    cache.close()
+
+
+# ===========================================================================
+# Function: Races run on the caller's executor, an abandoned provider is ignored and no thread is left behind per race
+def test_race_uses_the_callers_executor():
+    def search(provider):
+        if provider == "slow":
+            time.sleep(0.05)
+            return "[00:01.00] late"
+        return "[00:01.00] first line"
+
+    executor = ThreadPoolExecutor(max_workers=4)
+    threads_before = threading.active_count()
+    for race in range(20):
+        assert raceProviders(search, ["fast", "slow"], executor, timeout=1) == "[00:01.00] first line"
+    assert threading.active_count() <= threads_before + 4
+
+    executor.shutdown(wait=True)
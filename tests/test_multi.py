@@ -0,0 +1,69 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector import CaptureRing, Detector, MultiCapture, MultiDetector
+from beatdetector.detector import CHUNK_SIZE
+from beatdetector.signals import makeDrumSignal
+
+
+# ===========================================================================
+# Function: Feeds frames into a capture ring the way the PortAudio callback does
+# Input:    CaptureRing, (frames x channels) int16 frames
+# Return:   None
+def feed(ring, frames):
+    ring.callback(frames.tobytes(), len(frames), None, 0)
+
+
+# ===========================================================================
+# Function: A stream that is late once is waited for, a dead stream is only waited for dead_after times
+#           and its stale backlog is skipped when it comes back
+def test_multi_capture_waits_for_late_streams_only():
+    rings = [CaptureRing(CHUNK_SIZE, 1, ring_seconds=1) for _ in range(2)]
+    capture = MultiCapture(rings, dead_after=2)
+    chunk = np.ones((CHUNK_SIZE, 1), dtype=np.int16)
+
+    feed(rings[0], chunk)
+    feed(rings[1], chunk)
+    capture.readChunks(timeout=0.0)
+    assert capture.live.all()
+
+    # Stream 1 misses twice, then counts as dead and is no longer read (no more underruns)
+    for reads in range(4):
+        feed(rings[0], chunk)
+        capture.readChunks(timeout=0.0)
+    assert capture.live.tolist() == [True, False]
+    assert rings[1].underruns == 2
+
+    # It comes back with a backlog, only the newest chunk is kept
+    feed(rings[0], chunk)
+    for value in range(3):
+        feed(rings[1], chunk * value)
+    chunks = capture.readChunks(timeout=0.0)
+    assert capture.live.all()
+    assert np.all(chunks[1] == 2)
+    assert rings[1].frames_skipped == 2 * CHUNK_SIZE
+
+
+# ===========================================================================
+# Function: A row marked invalid reports nothing, leaves the other row's beats alone
+#           and keeps the same energies in its history (no silence is pushed into it)
+def test_multi_detector_skips_invalid_rows():
+    signal = makeDrumSignal(8, seed=0, channels=1)[:, 0]
+    chunks = [signal[start:start + CHUNK_SIZE] for start in range(0, len(signal) - CHUNK_SIZE + 1, CHUNK_SIZE)]
+
+    detector = MultiDetector(2)
+    references = [Detector(), Detector()]
+    gap = range(len(chunks) // 2, len(chunks) // 2 + 5)
+    for index, chunk in enumerate(chunks):
+        valid = np.array([True, index not in gap])
+        if index == gap.start:
+            history_before = np.sort(detector.energy_history.window()[:, 1], axis=0)
+        events = detector.process(np.vstack([chunk, chunk]), valid)
+
+        assert events[0] == references[0].process(chunk)
+        if index in gap:
+            assert not any(events[1][:3])
+        elif index < gap.start:
+            assert events[1] == references[1].process(chunk)
+
+        if index == gap.stop - 1:
+            assert np.array_equal(np.sort(detector.energy_history.window()[:, 1], axis=0), history_before)
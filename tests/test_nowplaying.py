@@ -0,0 +1,41 @@
+import threading  # Counting the requests in flight at once
+import time  # Slow fake requests
+
+from beatdetector import NowPlayingPoller
+
+
+# ===========================================================================
+# Class:    Fake Spotify client whose requests take a while and that counts how many run at once
+class SlowClient:
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.running = 0
+        self.most_running = 0
+        self._lock = threading.Lock()
+
+    def current_playback(self):
+        with self._lock:
+            self.running += 1
+            self.most_running = max(self.most_running, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+        return None
+
+
+# ===========================================================================
+# Function: Restarting right after a stop with a request in flight never leaves two pollers running
+def test_restart_does_not_revive_the_old_thread():
+    sp = SlowClient(0.2)
+    poller = NowPlayingPoller(sp, min_interval=0.01, paused_interval=0.01)
+
+    for restart in range(3):
+        poller.start()
+        time.sleep(0.05)
+        poller.stop()
+    poller.start()
+    time.sleep(0.5)
+    poller.stop()
+
+    assert sp.most_running == 1
+    assert poller._thread is None
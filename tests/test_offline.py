@@ -0,0 +1,35 @@
+import wave  # Writing the test .wav file
+
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector import Detector, analyzeWav
+from beatdetector.detector import CHUNK_SIZE
+from beatdetector.signals import RATE, makeDrumSignal
+from beatdetector.timeline import makeTimeline
+
+
+# ===========================================================================
+# Function: The batched offline analysis gives the same timeline as feeding every chunk to Detector.process,
+#           for either channel and with batch boundaries and a partial last chunk in the file
+def test_offline_matches_chunk_by_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr("beatdetector.offline.BATCH_CHUNKS", 7)
+    frames = np.hstack([makeDrumSignal(6, seed=seed, channels=1) for seed in (0, 1)])[:-CHUNK_SIZE // 3]
+    path = str(tmp_path / "drums.wav")
+    with wave.open(path, "wb") as wav_file:
+        wav_file.setnchannels(2)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(RATE)
+        wav_file.writeframes(frames.tobytes())
+
+    for channel in (0, 1):
+        detector = Detector(RATE)
+        all_events = [detector.process(frames[start:start + CHUNK_SIZE, channel])
+                      for start in range(0, len(frames) - CHUNK_SIZE + 1, CHUNK_SIZE)]
+        expected = makeTimeline(RATE, CHUNK_SIZE, all_events)
+
+        timeline = analyzeWav(path, channel)
+
+        assert len(expected.bass) + len(expected.clap) + len(expected.hihat) > 0
+        assert timeline.total_chunks == expected.total_chunks
+        for beat_type in ("bass", "clap", "hihat"):
+            assert np.array_equal(getattr(timeline, beat_type), getattr(expected, beat_type))
@@ -0,0 +1,47 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector import Detector, StereoDetector
+from beatdetector.detector import CHUNK_SIZE
+from beatdetector.signals import makeDrumSignal
+
+
+# ===========================================================================
+# Function: Two different synthetic drum loops (so side is not silent) scaled so the loudest sample is near int16 full scale
+# Input:    Seconds of audio
+# Return:   (frames x 2) int16 array
+def makeLoudStereo(seconds):
+    signal = np.hstack([makeDrumSignal(seconds, seed=seed, channels=1) for seed in (0, 1)]).astype(np.float64)
+    return np.round(signal / np.max(np.abs(signal)) * 32000).astype(np.int16)
+
+
+# ===========================================================================
+# Function: L + R of a near full scale chunk lands in the float buffer without wrapping around
+def test_mono_does_not_wrap():
+    frames = np.full((CHUNK_SIZE, 2), 30000, dtype=np.int16)
+    frames[:, 1] = -30000
+    frames[::2, 1] = 30000
+
+    detector = StereoDetector("mono")
+    detector.process(frames)
+
+    assert np.array_equal(detector._mono, frames.astype(np.float64).sum(axis=1))
+
+
+# ===========================================================================
+# Function: mono and midside on loud stereo give the same beats as a Detector fed the sums computed in float
+def test_loud_stereo_matches_float_sums():
+    frames = makeLoudStereo(6)
+    left = frames[:, 0].astype(np.float64)
+    right = frames[:, 1].astype(np.float64)
+
+    mono = StereoDetector("mono")
+    mid_side = StereoDetector("midside")
+    references = [Detector(), Detector(), Detector()]
+    for start in range(0, len(frames) - CHUNK_SIZE + 1, CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        mono_events = mono.process(frames[chunk])
+        mid_side.process(frames[chunk])
+
+        assert mono_events == references[0].process(left[chunk] + right[chunk])
+        assert mid_side.events == [references[1].process(left[chunk] + right[chunk]),
+                                   references[2].process(left[chunk] - right[chunk])]
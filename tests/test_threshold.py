@@ -0,0 +1,90 @@
+import numpy as np  # Use numpy for as many calculations as possible bc FAST!
+
+from beatdetector import BeatThreshold, EnergyHistory
+
+
+HISTORY_LEN         = 43
+TOTAL_SUB_BANDS     = 6
+
+
+# ===========================================================================
+# Function: The original checkBeatInChunk, list based, kept as the reference the incremental threshold has to match
+# Input:    Instant energy of each sub band, energy history as a list of rows (oldest first)
+# Return:   List of sub band beats
+def checkBeatInChunkBaseline(instant_energy_sub_bands, energy_history_sub_bands):
+    sub_band_beat = [False for i in range(TOTAL_SUB_BANDS)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(TOTAL_SUB_BANDS):
+            max_energy = np.max([history[i] for history in energy_history_sub_bands])
+            norm_energy_history = [history[i] / max_energy for history in energy_history_sub_bands]
+            norm_instant_energy = instant_energy_sub_bands[i] / max_energy
+
+            sub_band_threshold = -15 * np.var(norm_energy_history) + 1.40
+            norm_avg_energy = np.mean(norm_energy_history)
+            if norm_instant_energy > sub_band_threshold * norm_avg_energy / 1.15 or norm_instant_energy > 0.15:
+                sub_band_beat[i] = True
+
+    return sub_band_beat
+
+
+# ===========================================================================
+# Function: Runs a sequence of instant energies through the main loop (check, then push) both ways
+#           The last chunks are set right on (and one ulp either side of) the threshold of the baseline rule
+# Input:    (chunks x sub bands) energies, number of chunks at the end to put on the threshold
+# Return:   Number of decisions compared
+def compareDecisions(energies, on_threshold=0):
+    beat_threshold = BeatThreshold(EnergyHistory(HISTORY_LEN, TOTAL_SUB_BANDS))
+    energy_history = []
+    for instant_energy in energies[:HISTORY_LEN]:
+        beat_threshold.push(instant_energy)
+        energy_history.append(list(instant_energy))
+
+    decisions = 0
+    for chunk, instant_energy in enumerate(energies[HISTORY_LEN:]):
+        if chunk >= len(energies) - HISTORY_LEN - on_threshold:
+            window = np.array(energy_history)
+            max_energy = window.max(axis=0)
+            norm_window = window / max_energy
+            threshold = (-15 * norm_window.var(axis=0) + 1.40) * norm_window.mean(axis=0) / 1.15 * max_energy
+            instant_energy = np.nextafter(threshold, threshold * [0, 1, 2][chunk % 3])
+
+        assert beat_threshold.check(instant_energy).tolist() == checkBeatInChunkBaseline(instant_energy, energy_history)
+        decisions += TOTAL_SUB_BANDS
+
+        beat_threshold.push(instant_energy)
+        energy_history.pop(0)
+        energy_history.append(list(instant_energy))
+
+    return decisions
+
+
+# ===========================================================================
+# Function: Random energies over a wide dynamic range give the same beats as the original rule
+def test_random_energies_match_baseline():
+    rng = np.random.default_rng(0)
+    for seed in range(4):
+        energies = rng.lognormal(40, 2 + 4 * seed, (HISTORY_LEN * 8, TOTAL_SUB_BANDS))
+        assert compareDecisions(energies, on_threshold=HISTORY_LEN) > 0
+
+
+# ===========================================================================
+# Function: Silence, constant energy, huge spikes and steps give the same beats as the original rule
+def test_adversarial_energies_match_baseline():
+    chunks = HISTORY_LEN * 6
+    rng = np.random.default_rng(1)
+
+    spikes = np.full((chunks, TOTAL_SUB_BANDS), 1e-3)
+    spikes[rng.integers(0, chunks, 20), rng.integers(0, TOTAL_SUB_BANDS, 20)] = 1e30
+
+    steps = np.repeat(10.0 ** rng.integers(-20, 20, (chunks // HISTORY_LEN + 1, TOTAL_SUB_BANDS)), HISTORY_LEN, axis=0)[:chunks]
+
+    sequences = [
+        np.zeros((chunks, TOTAL_SUB_BANDS)),
+        np.full((chunks, TOTAL_SUB_BANDS), 7.0),
+        spikes,
+        steps,
+        np.tile(np.linspace(0, 1e12, HISTORY_LEN + 1)[:, None], (chunks // HISTORY_LEN, TOTAL_SUB_BANDS)),
+    ]
+    for energies in sequences:
+        compareDecisions(energies)
+        compareDecisions(np.maximum(energies, 1e-300), on_threshold=HISTORY_LEN)
@@ -0,0 +1,34 @@
+from beatdetector.trackstore import TrackStore, syncLibrary
+
+
+# ===========================================================================
+# Class:    Fake Spotify client serving playlists of named tracks, one page each
+# Input:    Dict of playlist ID -> (snapshot_id, list of song names), in the user's playlist order
+class FakeClient:
+    def __init__(self, playlists):
+        self.playlists = playlists
+
+    def current_user_playlists(self, limit):
+        return {"items": [{"id": playlist_id, "name": playlist_id, "snapshot_id": snapshot_id, "tracks": {"total": len(songs)}}
+                          for playlist_id, (snapshot_id, songs) in self.playlists.items()], "next": None}
+
+    def playlist_items(self, playlist_id, fields, limit, offset, additional_types):
+        songs = self.playlists[playlist_id][1][offset:offset + limit]
+        return {"items": [{"track": {"id": song, "uri": f"spotify:track:{song}", "name": song, "type": "track",
+                                     "duration_ms": 1000, "artists": [{"name": "Artist"}]}} for song in songs]}
+
+
+# ===========================================================================
+# Function: Re-syncing one playlist does not move its songs behind the other playlists' songs
+def test_song_order_survives_resync(tmp_path):
+    sp = FakeClient({"p1": ("s1", ["a", "b"]), "p2": ("s1", ["c", "a"])})
+    store = TrackStore(str(tmp_path / "tracks.db"))
+    syncLibrary(sp, store)
+    assert [song for artists, song in store.getSongs()] == ["a", "b", "c"]
+
+    sp.playlists["p1"] = ("s2", ["a", "b", "x"])
+    summary = syncLibrary(sp, store)
+
+    assert summary["synced"] == 1
+    assert [song for artists, song in store.getSongs()] == ["a", "b", "x", "c"]
+    store.close()